@@ -1,19 +1,45 @@
+import os
+import time
 from sqlalchemy.ext.asyncio import AsyncSession, create_async_engine
 from sqlalchemy.orm import sessionmaker, declarative_base
+from sqlalchemy.pool import AsyncAdaptedQueuePool
 from app.config import settings
+from app.services import metrics, tracing
 
 DATABASE_URL = settings.DATABASE_URL
+SQL_ECHO = os.environ.get("SQL_ECHO", "").lower() in ("1", "true", "yes")
+
+# DB_POOL_BUDGET is the connection budget for the whole deployment. Every worker process has its
+# own pool, so the budget is split across WEB_CONCURRENCY workers instead of multiplied by it;
+# a third of each share stays open and the rest is overflow for bursts.
+DB_POOL_BUDGET = int(os.environ.get("DB_POOL_BUDGET", "30"))
+WORKER_COUNT = max(int(os.environ.get("WEB_CONCURRENCY", "1")), 1)
+WORKER_CONNECTIONS = max(DB_POOL_BUDGET // WORKER_COUNT, 2)
+POOL_SIZE = max(WORKER_CONNECTIONS // 3, 1)
+MAX_OVERFLOW = WORKER_CONNECTIONS - POOL_SIZE
+
+class TimedQueuePool(AsyncAdaptedQueuePool):
+    def _do_get(self):
+        started = time.perf_counter()
+        try:
+            return super()._do_get()
+        finally:
+            metrics.DB_POOL_WAIT_SECONDS.observe(time.perf_counter() - started)
 
 engine = create_async_engine(
     DATABASE_URL,
-    echo=True,
+    echo=SQL_ECHO,
     future=True,
-    pool_size=10,
-    max_overflow=20,
-    pool_timeout=30
+    pool_size=POOL_SIZE,
+    max_overflow=MAX_OVERFLOW,
+    pool_timeout=30,
+    poolclass=TimedQueuePool
 )
+metrics.register_pool(engine.sync_engine.pool)
+tracing.instrument_engine(engine.sync_engine)
 
-SessionLocal = sessionmaker(autocommit=False, autoflush=False, blind = engine, class_=AsyncSession)
+# Async sessions cannot lazy-load, so attributes stay readable after commit instead of expiring
+SessionLocal = sessionmaker(autocommit=False, autoflush=False, bind = engine, class_=AsyncSession, expire_on_commit=False)
 Base = declarative_base()
 
 async def get_db():
@@ -0,0 +1,174 @@
+import asyncio
+import gzip
+import logging
+import os
+from datetime import date, datetime, timedelta
+from sqlalchemy import text
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+PARTITION_PREFIX = "payment_history_"
+# Catches rows outside every monthly range (backfills, clock skew); see create_partition
+DEFAULT_PARTITION = "payment_history_default"
+MONTHS_AHEAD = 2
+RETENTION_MONTHS = 18
+# Pending checkout rows are only looked up this far back so the query prunes to recent partitions
+PENDING_PAYMENT_LOOKBACK = timedelta(days=30)
+ARCHIVE_DIR = os.environ.get("PAYMENT_HISTORY_ARCHIVE_DIR", "archive/payment_history")
+
+def add_months(month_start: date, months: int):
+    month_index = month_start.month - 1 + months
+    return date(month_start.year + month_index // 12, month_index % 12 + 1, 1)
+
+def partition_name(month_start: date):
+    return f"{PARTITION_PREFIX}{month_start:%Y_%m}"
+
+async def is_partitioned(conn):
+    result = await conn.execute(
+        text("SELECT 1 FROM pg_partitioned_table WHERE partrelid = 'payment_history'::regclass")
+    )
+    return result.first() is not None
+
+async def has_table(conn, name: str):
+    result = await conn.execute(text("SELECT to_regclass(:name) IS NOT NULL"), {"name": name})
+    return result.scalar()
+
+async def create_partition(conn, month_start: date):
+    name = partition_name(month_start)
+    if await has_table(conn, name):
+        return
+    month_end = add_months(month_start, 1)
+    bounds = f"FOR VALUES FROM ('{month_start}') TO ('{month_end}')"
+
+    if not await has_table(conn, DEFAULT_PARTITION):
+        await conn.execute(text(
+            f'CREATE TABLE "{name}" PARTITION OF payment_history {bounds} WITH (toast_tuple_target = 256)'
+        ))
+        return
+
+    # Postgres refuses a new partition while the default partition holds rows in its range, so
+    # those rows are moved into a standalone table first and the table is then attached
+    await conn.execute(text(
+        f'CREATE TABLE "{name}" (LIKE payment_history INCLUDING ALL) WITH (toast_tuple_target = 256)'
+    ))
+    moved = await conn.execute(
+        text(
+            f'WITH moved AS ('
+            f'DELETE FROM "{DEFAULT_PARTITION}" WHERE created_at >= :start AND created_at < :end RETURNING *'
+            f') INSERT INTO "{name}" SELECT * FROM moved'
+        ),
+        # asyncpg binds timestamp parameters from datetime only
+        {"start": datetime(month_start.year, month_start.month, 1), "end": datetime(month_end.year, month_end.month, 1)}
+    )
+    await conn.execute(text(f'ALTER TABLE payment_history ATTACH PARTITION "{name}" {bounds}'))
+    if moved.rowcount:
+        logger.info("Moved %s rows from %s into %s", moved.rowcount, DEFAULT_PARTITION, name)
+
+async def ensure_partitions(conn, months_ahead: int = MONTHS_AHEAD, months_back: int = 0):
+    if not await is_partitioned(conn):
+        return []
+
+    # Every prefork worker runs this at startup and the existence check in create_partition is not
+    # atomic with the CREATE, so concurrent creators are serialised until the caller's transaction ends
+    await conn.execute(text("SELECT pg_advisory_xact_lock(hashtext('payment_history_partitions'))"))
+
+    created = []
+    current = date.today().replace(day=1)
+
+    for offset in range(-months_back, months_ahead + 1):
+        month_start = add_months(current, offset)
+        await create_partition(conn, month_start)
+        created.append(partition_name(month_start))
+
+    return created
+
+async def list_partitions(conn):
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_inherits i "
+        "JOIN pg_class c ON c.oid = i.inhrelid "
+        "WHERE i.inhparent = 'payment_history'::regclass "
+        "ORDER BY c.relname"
+    ))
+    return [row.relname for row in result]
+
+async def list_detached_partitions(conn):
+    # Month tables detached from payment_history but never dropped (an interrupted or manual detach)
+    # would otherwise be invisible to list_partitions, so they are archived like attached ones
+    result = await conn.execute(text(
+        "SELECT c.relname FROM pg_class c "
+        "JOIN pg_namespace n ON n.oid = c.relnamespace AND n.nspname = current_schema() "
+        "WHERE c.relkind = 'r' AND c.relname LIKE :pattern "
+        "AND NOT EXISTS (SELECT 1 FROM pg_inherits i WHERE i.inhrelid = c.oid) "
+        "ORDER BY c.relname"
+    ), {"pattern": PARTITION_PREFIX.replace("_", "\\_") + "%"})
+    return [row.relname for row in result]
+
+async def export_partition(conn, name: str, archive_dir: str):
+    os.makedirs(archive_dir, exist_ok=True)
+    path = os.path.join(archive_dir, f"{name}.csv.gz")
+    # Written under a temporary name so a failed export never leaves a truncated archive in place
+    partial_path = f"{path}.part"
+    raw = await conn.get_raw_connection()
+
+    try:
+        with gzip.open(partial_path, "wb") as archive:
+            async def write_chunk(chunk: bytes):
+                archive.write(chunk)
+
+            await raw.driver_connection.copy_from_table(
+                name,
+                output=write_chunk,
+                format="csv",
+                header=True
+            )
+        os.replace(partial_path, path)
+    except BaseException:
+        if os.path.exists(partial_path):
+            os.unlink(partial_path)
+        raise
+
+    return path
+
+async def archive_partitions(retention_months: int = RETENTION_MONTHS, archive_dir: str = ARCHIVE_DIR):
+    cutoff = add_months(date.today().replace(day=1), -retention_months)
+    archived = []
+
+    async with engine.connect() as conn:
+        attached = await list_partitions(conn)
+        detached = await list_detached_partitions(conn)
+        await conn.commit()
+
+        for name in sorted(attached + detached):
+            suffix = name[len(PARTITION_PREFIX):]
+            try:
+                month_start = datetime.strptime(suffix, "%Y_%m").date()
+            except ValueError:
+                continue
+
+            if month_start >= cutoff:
+                continue
+
+            # Exported while still attached, so a failed export (disk full, permissions) leaves the
+            # partition in payment_history to be retried on the next run
+            path = await export_partition(conn, name, archive_dir)
+
+            async with conn.begin():
+                if name in attached:
+                    await conn.execute(text(f'ALTER TABLE payment_history DETACH PARTITION "{name}"'))
+                await conn.execute(text(f'DROP TABLE "{name}"'))
+
+            logger.info("Archived payment_history partition %s to %s", name, path)
+            archived.append(path)
+
+    return archived
+
+async def run():
+    async with engine.begin() as conn:
+        created = await ensure_partitions(conn)
+    logger.info("Ensured payment_history partitions: %s", created)
+    await archive_partitions()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
@@ -0,0 +1,181 @@
+import asyncio
+import json
+import logging
+import sys
+import time
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional, Tuple
+import httpx
+from fastapi import HTTPException
+from sqlalchemy import text
+from app.database import engine
+from app.services import paypal_client, stripe_gateway
+
+logger = logging.getLogger(__name__)
+
+MAX_CONCURRENCY = 8
+PAGE_SIZE = 100
+UPDATE_BATCH = 1000
+
+# Provider status -> users.subscription_status (enum names as stored by SQLAlchemy)
+STRIPE_STATUS_MAP = {
+    'active': "ACTIVE",
+    'past_due': "PAST_DUE",
+    'canceled': "CANCELLED",
+    'unpaid': "PAST_DUE",
+    'incomplete': "PENDING",
+    'incomplete_expired': "CANCELLED"
+}
+
+PAYPAL_STATUS_MAP = {
+    "ACTIVE": "ACTIVE",
+    "CANCELLED": "CANCELLED",
+    "EXPIRED": "INACTIVE",
+    "SUSPENDED": "PAST_DUE"
+}
+
+@dataclass
+class Correction:
+    user_id: int
+    subscription_id: str
+    provider: str
+    old_status: str
+    new_status: str
+
+@dataclass
+class ReconciliationReport:
+    checked: int = 0
+    unknown_subscriptions: int = 0
+    # PayPal lookups that failed and were skipped; those users keep their current status
+    fetch_errors: int = 0
+    corrections: List[Correction] = field(default_factory=list)
+    duration_seconds: float = 0.0
+
+async def load_local_subscriptions():
+    # subscription_id -> (user id, status, payment method); one streamed query instead of a lookup per subscription
+    index: Dict[str, Tuple[int, str, Optional[str]]] = {}
+    async with engine.connect() as conn:
+        result = await conn.stream(text(
+            "SELECT id, subscription_id, subscription_status::text AS status, payment_method "
+            "FROM users WHERE subscription_id IS NOT NULL"
+        ))
+        async for row in result:
+            index[row.subscription_id] = (row.id, row.status, row.payment_method)
+    return index
+
+async def fetch_stripe_statuses(semaphore: asyncio.Semaphore):
+    statuses: Dict[str, str] = {}
+
+    async def page_through(stripe_status: str):
+        starting_after = None
+        while True:
+            params = {"status": stripe_status, "limit": PAGE_SIZE}
+            if starting_after:
+                params["starting_after"] = starting_after
+            async with semaphore:
+                page = await stripe_gateway.list_subscriptions(params)
+            for subscription in page.data:
+                statuses[subscription.id] = subscription.status
+            if not page.has_more or not page.data:
+                break
+            starting_after = page.data[-1].id
+
+    # Stripe pages are cursor-chained, so concurrency comes from walking each status list in parallel
+    await asyncio.gather(*(page_through(stripe_status) for stripe_status in STRIPE_STATUS_MAP))
+    return statuses
+
+async def fetch_paypal_statuses(
+    subscription_ids: List[str],
+    semaphore: asyncio.Semaphore,
+    report: ReconciliationReport
+):
+    # PayPal has no list endpoint for subscriptions, so known ids are fetched with bounded concurrency.
+    # One failed lookup skips that id rather than aborting the whole run
+    statuses: Dict[str, str] = {}
+
+    async def fetch(subscription_id: str):
+        try:
+            async with semaphore:
+                response = await paypal_client.request("GET", f"/v1/billing/subscriptions/{subscription_id}")
+        except (httpx.HTTPError, HTTPException) as e:
+            logger.warning("PayPal subscription %s lookup failed: %r", subscription_id, e)
+            report.fetch_errors += 1
+            return
+        if response.status_code == 200:
+            statuses[subscription_id] = response.json().get("status")
+        elif response.status_code != 404:
+            logger.warning("PayPal subscription %s lookup failed: %s", subscription_id, response.status_code)
+            report.fetch_errors += 1
+
+    await asyncio.gather(*(fetch(subscription_id) for subscription_id in subscription_ids))
+    return statuses
+
+def diff_statuses(
+    provider: str,
+    remote: Dict[str, str],
+    status_map: Dict[str, str],
+    local: Dict[str, Tuple[int, str, Optional[str]]],
+    report: ReconciliationReport
+):
+    for subscription_id, remote_status in remote.items():
+        report.checked += 1
+        entry = local.get(subscription_id)
+        if entry is None:
+            report.unknown_subscriptions += 1
+            continue
+
+        user_id, local_status, _ = entry
+        new_status = status_map.get(remote_status)
+        if new_status and new_status != local_status:
+            report.corrections.append(
+                Correction(user_id, subscription_id, provider, local_status, new_status)
+            )
+
+async def apply_corrections(corrections: List[Correction]):
+    statement = text(
+        "UPDATE users u SET subscription_status = CAST(c.status AS subscriptionstatus), "
+        "updated_at = now() AT TIME ZONE 'utc' "
+        "FROM unnest(CAST(:ids AS integer[]), CAST(:statuses AS varchar[])) AS c (id, status) "
+        "WHERE u.id = c.id"
+    )
+    for start in range(0, len(corrections), UPDATE_BATCH):
+        batch = corrections[start:start + UPDATE_BATCH]
+        async with engine.begin() as conn:
+            await conn.execute(statement, {
+                "ids": [correction.user_id for correction in batch],
+                "statuses": [correction.new_status for correction in batch]
+            })
+
+async def run(dry_run: bool = False):
+    started = time.monotonic()
+    report = ReconciliationReport()
+    semaphore = asyncio.Semaphore(MAX_CONCURRENCY)
+
+    local = await load_local_subscriptions()
+    paypal_ids = [subscription_id for subscription_id, entry in local.items() if entry[2] == "paypal"]
+
+    stripe_statuses, paypal_statuses = await asyncio.gather(
+        fetch_stripe_statuses(semaphore),
+        fetch_paypal_statuses(paypal_ids, semaphore, report)
+    )
+
+    diff_statuses("stripe", stripe_statuses, STRIPE_STATUS_MAP, local, report)
+    diff_statuses("paypal", paypal_statuses, PAYPAL_STATUS_MAP, local, report)
+
+    if not dry_run:
+        await apply_corrections(report.corrections)
+
+    report.duration_seconds = round(time.monotonic() - started, 2)
+    return report
+
+async def main(dry_run: bool = False):
+    try:
+        report = await run(dry_run)
+    finally:
+        await paypal_client.close()
+        await stripe_gateway.close()
+    print(json.dumps(asdict(report), indent=2))
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(main(dry_run="--dry-run" in sys.argv))
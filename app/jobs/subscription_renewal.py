@@ -0,0 +1,88 @@
+import asyncio
+import logging
+import time
+from sqlalchemy import text
+from app.database import engine
+from app.services import entitlements
+
+logger = logging.getLogger(__name__)
+
+CHUNK_SIZE = 5000
+PERIOD_DAYS = entitlements.SUBSCRIPTION_PERIOD.days
+
+def plan_quota_rows():
+    rows = []
+    params = {}
+    for index, ((kind, plan_id), entitlement) in enumerate(entitlements.load_catalog().items()):
+        if kind != "plan":
+            continue
+        rows.append(
+            f"(CAST(:plan_{index} AS varchar), CAST(:chars_{index} AS integer), CAST(:voices_{index} AS integer))"
+        )
+        params[f"plan_{index}"] = plan_id
+        params[f"chars_{index}"] = entitlement.month_character_quota
+        params[f"voices_{index}"] = entitlement.month_voice_quota
+
+    if not rows:
+        rows.append("(CAST(NULL AS varchar), CAST(NULL AS integer), CAST(NULL AS integer))")
+    return ", ".join(rows), params
+
+def renewal_statement():
+    plan_rows, params = plan_quota_rows()
+    # Due users are claimed with SKIP LOCKED so concurrent runs split the work instead of
+    # blocking on or double-renewing the same rows. Missed periods are rolled forward in one step.
+    statement = text(f"""
+        WITH due AS (
+            SELECT
+                u.id,
+                plans.month_characters,
+                plans.month_voices,
+                u.subscription_end_date + make_interval(days => {PERIOD_DAYS}) * (
+                    floor(extract(epoch FROM (now() AT TIME ZONE 'utc' - u.subscription_end_date)) / {PERIOD_DAYS * 86400}) + 1
+                ) AS new_end_date
+            FROM users u
+            LEFT JOIN (VALUES {plan_rows}) AS plans (plan_id, month_characters, month_voices)
+                ON plans.plan_id = u.subscription_plan_id
+            WHERE u.subscription_end_date <= now() AT TIME ZONE 'utc'
+              AND u.subscription_status = 'ACTIVE'
+              AND u.subscription_cancel_at_period_end IS NOT TRUE
+            ORDER BY u.subscription_end_date
+            LIMIT :chunk_size
+            FOR UPDATE OF u SKIP LOCKED
+        )
+        UPDATE users u
+        SET month_character_balance = COALESCE(due.month_characters, u.month_character_balance),
+            month_voice_balance = COALESCE(due.month_voices, u.month_voice_balance),
+            subscription_end_date = due.new_end_date,
+            subsrciption_start_date = to_char(
+                due.new_end_date - make_interval(days => {PERIOD_DAYS}), 'YYYY-MM-DD"T"HH24:MI:SS.US'
+            ),
+            updated_at = now() AT TIME ZONE 'utc'
+        FROM due
+        WHERE u.id = due.id
+        RETURNING u.id
+    """)
+    return statement, params
+
+async def renew_chunk(statement, params, chunk_size: int = CHUNK_SIZE):
+    async with engine.begin() as conn:
+        result = await conn.execute(statement, {**params, "chunk_size": chunk_size})
+        return len(result.all())
+
+async def run(chunk_size: int = CHUNK_SIZE):
+    statement, params = renewal_statement()
+    started = time.monotonic()
+    total = 0
+
+    while True:
+        renewed = await renew_chunk(statement, params, chunk_size)
+        total += renewed
+        if renewed < chunk_size:
+            break
+
+    logger.info("Renewed %s subscriptions in %.2fs", total, time.monotonic() - started)
+    return total
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    asyncio.run(run())
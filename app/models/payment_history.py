@@ -1,4 +1,5 @@
-from sqlalchemy import Column, Integer, String, DateTime, ForeignKey
+from sqlalchemy import Column, Integer, String, DateTime, ForeignKey, Index
+from sqlalchemy.dialects.postgresql import JSONB
 from sqlalchemy.orm import relationship
 from app.database import Base
 from datetime import datetime
@@ -6,10 +7,18 @@ from datetime import datetime
 class PaymentHistory(Base):
     __tablename__ = 'payment_history'
     
-    id = Column(Integer, primary_key=True)
+    id = Column(Integer, primary_key=True, autoincrement=True)
     user_id = Column(Integer, ForeignKey('users.id'))
     event_type = Column(String, nullable=False)
-    event_data = Column(String, nullable=True)
-    created_at = Column(DateTime, default=datetime.utcnow)
+    provider = Column(String, nullable=True)
+    external_id = Column(String, nullable=True)
+    event_data = Column(JSONB, nullable=True)
+    created_at = Column(DateTime, primary_key=True, default=datetime.utcnow)
     
-    user = relationship("User", back_populates="subscription_history")
\ No newline at end of file
+    user = relationship("User", back_populates="subscription_history")
+    
+    __table_args__ = (
+        Index('ix_payment_history_provider_external_id', 'provider', 'external_id'),
+        Index('ix_payment_history_user_created_id', 'user_id', 'created_at', 'id'),
+        {'postgresql_partition_by': 'RANGE (created_at)'},
+    )
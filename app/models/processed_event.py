@@ -0,0 +1,15 @@
+from sqlalchemy import Column, Integer, String, DateTime, UniqueConstraint
+from app.database import Base
+from datetime import datetime
+
+class ProcessedEvent(Base):
+    __tablename__ = 'processed_events'
+    
+    id = Column(Integer, primary_key=True)
+    provider = Column(String, nullable=False)
+    event_id = Column(String, nullable=False)
+    processed_at = Column(DateTime, default=datetime.utcnow)
+    
+    __table_args__ = (
+        UniqueConstraint('provider', 'event_id', name='uq_processed_events_provider_event_id'),
+    )
@@ -0,0 +1,21 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Boolean, Index
+from app.database import Base
+from datetime import datetime
+
+class UsageRecord(Base):
+    __tablename__ = 'usage_records'
+    
+    id = Column(BigInteger, primary_key=True)
+    user_id = Column(Integer, nullable=False)
+    operation = Column(String, nullable=False)
+    voice_id = Column(String, nullable=True)
+    model = Column(String, nullable=True)
+    characters = Column(Integer, nullable=False, default=0)
+    audio_bytes = Column(Integer, nullable=False, default=0)
+    upstream_latency_ms = Column(Integer, nullable=True)
+    cache_hit = Column(Boolean, nullable=False, default=False)
+    created_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    
+    __table_args__ = (
+        Index('ix_usage_records_user_created', 'user_id', 'created_at'),
+    )
@@ -0,0 +1,26 @@
+from sqlalchemy import Column, BigInteger, Integer, String, DateTime, Date
+from app.database import Base
+
+class UsageHourly(Base):
+    __tablename__ = 'usage_hourly'
+    
+    user_id = Column(Integer, primary_key=True)
+    bucket_start = Column(DateTime, primary_key=True)
+    operation = Column(String, primary_key=True)
+    voice_id = Column(String, primary_key=True, default="")
+    model = Column(String, primary_key=True, default="")
+    requests = Column(Integer, nullable=False, default=0)
+    characters = Column(BigInteger, nullable=False, default=0)
+    audio_bytes = Column(BigInteger, nullable=False, default=0)
+    
+class UsageDaily(Base):
+    __tablename__ = 'usage_daily'
+    
+    user_id = Column(Integer, primary_key=True)
+    bucket_start = Column(Date, primary_key=True)
+    operation = Column(String, primary_key=True)
+    voice_id = Column(String, primary_key=True, default="")
+    model = Column(String, primary_key=True, default="")
+    requests = Column(Integer, nullable=False, default=0)
+    characters = Column(BigInteger, nullable=False, default=0)
+    audio_bytes = Column(BigInteger, nullable=False, default=0)
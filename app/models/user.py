@@ -31,10 +31,10 @@ class User(Base):
         default=SubscriptionStatus.INACTIVE,
         nullable=False
     )
-    subscription_id = Column(String, nullable=True)
+    subscription_id = Column(String, nullable=True, index=True)
     subscription_plan_id = Column(String, nullable=True)
     subsrciption_start_date = Column(String, nullable=True)
-    subscription_end_date = Column(DateTime, nullable=True)
+    subscription_end_date = Column(DateTime, nullable=True, index=True)
     subscription_cancel_at_period_end = Column(Boolean, default=False)
     subscription_auto_renew = Column(Boolean, default=True)
     payment_method = Column(String, nullable=True)
@@ -44,5 +44,5 @@ class User(Base):
     
     month_character_balance = Column(Integer, default=0)
     month_voice_balance = Column(Integer, default=0)
-    subscription_history = relationship("SubscriptionHistory", back_populates="user")
+    subscription_history = relationship("PaymentHistory", back_populates="user")
     
@@ -0,0 +1,24 @@
+from sqlalchemy import Column, Integer, String, DateTime, Index
+from sqlalchemy.dialects.postgresql import JSONB
+from app.database import Base
+from datetime import datetime
+
+class WebhookEvent(Base):
+    __tablename__ = 'webhook_events'
+    
+    id = Column(Integer, primary_key=True)
+    provider = Column(String, nullable=False)
+    event_id = Column(String, nullable=True)
+    event_type = Column(String, nullable=True)
+    payload = Column(JSONB, nullable=False)
+    status = Column(String, nullable=False, default="pending")
+    attempts = Column(Integer, nullable=False, default=0)
+    last_error = Column(String, nullable=True)
+    next_attempt_at = Column(DateTime, nullable=False, default=datetime.utcnow)
+    locked_at = Column(DateTime, nullable=True)
+    created_at = Column(DateTime, default=datetime.utcnow)
+    processed_at = Column(DateTime, nullable=True)
+    
+    __table_args__ = (
+        Index('ix_webhook_events_status_next_attempt', 'status', 'next_attempt_at'),
+    )
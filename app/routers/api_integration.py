@@ -1,4 +1,5 @@
-from datetime import datetime
+import asyncio
+from datetime import datetime, timezone
 from typing import Optional, List
 from pydantic import BaseModel, Field
 from io import BytesIO
@@ -10,7 +11,9 @@ from sqlalchemy.future import select
 from app.models.user import User
 from app.routers.auth import get_current_user
 from app.models.voice_id import Voice_ID
+from app.services import audio_store, minimax_client, tracing, usage_recorder
 import os
+import time
 
 from sqlalchemy.ext.asyncio import AsyncSession
 import requests
@@ -19,7 +22,9 @@ router = APIRouter()
 
 GROUP_ID = settings.GROUP_ID
 API_KEY = settings.API_KEY
-TTS_URL = f"https://api.minimax.io/v1/t2a_v2?GroupId={GROUP_ID}"
+TTS_URL = f"{minimax_client.MINIMAX_API_BASE}/v1/t2a_v2?GroupId={GROUP_ID}"
+
+TTS_COST_CHARACTERS = 1000
 
 SUPPORTED_FORMATS = {
     "mp3": "audio/mpeg",
@@ -88,6 +93,8 @@ class TTSRequest(BaseModel):
 
 @router.post("/generate")
 async def generate_tts(request: TTSRequest, user: User = Depends(get_current_user), db: AsyncSession = Depends(get_db)):
+    # Read before any commit, which would otherwise expire the loaded user
+    user_id = user.id
     char_count = len(request.text)
     if user.month_character_balance + user.character_balance < char_count:
         raise HTTPException(
@@ -107,8 +114,9 @@ async def generate_tts(request: TTSRequest, user: User = Depends(get_current_use
     
     request_voice_id = request.voice_settings.voice_id
     
-    result = await db.execute(select(Voice_ID).where(Voice_ID.voice_id == request_voice_id, Voice_ID.user_id == user.id))
-    db_voice = result.scalars().first()
+    with tracing.span("tts.voice_lookup"):
+        result = await db.execute(select(Voice_ID).where(Voice_ID.voice_id == request_voice_id, Voice_ID.user_id == user.id))
+        db_voice = result.scalars().first()
     
     if db_voice is None and request_voice_id not in system_voice:
         raise HTTPException(
@@ -122,37 +130,73 @@ async def generate_tts(request: TTSRequest, user: User = Depends(get_current_use
         }
         
         payload = {**request.dict(exclude_none=True)}
-        
-        response = requests.post(TTS_URL, headers=headers, json=payload)
+        # Links are signed and served by this API, so the upstream is always asked for the whole clip
+        # as hex; the response is buffered anyway to store it
+        payload["output_format"] = "hex"
+        payload["stream"] = False
+        
+        upstream_started = time.monotonic()
+        response = await minimax_client.request(
+            "t2a_v2",
+            TTS_URL,
+            user=user,
+            # Long texts take proportionally more of the shared upstream capacity
+            cost=1 + char_count / TTS_COST_CHARACTERS,
+            headers=headers,
+            json=payload
+        )
+        upstream_latency_ms = int((time.monotonic() - upstream_started) * 1000)
         response.raise_for_status()
+        audio = minimax_client.audio_content(response)
         
-        audio_buffer = BytesIO(response.content)
-        media_type = {
-            "mp3": "audio/mpeg",
-            "wav": "audio/wav",
-            "flac": "audio/flac",
-            "pcm": "audio/x-wav"
-        }.get(request.audio_settings.format, "audio/mpeg")
+        media_type = SUPPORTED_FORMATS.get(request.audio_settings.format, "audio/mpeg")
+        
+        # Kept so players can seek, resume and re-fetch from /audio without another generation
+        audio_name = await asyncio.to_thread(audio_store.save, audio, request.audio_settings.format)
         
         user.month_character_balance = user.month_character_balance - char_count
         if user.month_character_balance < 0:
             user.character_balance = user.character_balance - user.month_character_balance
             user.month_character_balance = 0
             
-        await db.commit()
+        with tracing.span("tts.commit"):
+            await db.commit()
+        
+        usage_recorder.record(
+            user_id=user_id,
+            operation="tts",
+            voice_id=request_voice_id,
+            model=request.model,
+            characters=char_count,
+            audio_bytes=len(audio),
+            upstream_latency_ms=upstream_latency_ms
+        )
+        
+        if request.output_format == "url":
+            audio_url, expires = audio_store.signed_url(audio_name)
+            return {
+                "audio_id": audio_name,
+                "audio_url": audio_url,
+                "expires_at": datetime.fromtimestamp(expires, timezone.utc).isoformat().replace("+00:00", "Z"),
+                "audio_bytes": len(audio)
+            }
         
+        # Re-fetches, seeking and resuming go through the signed /audio link, which needs no owner lookup
+        audio_url, _ = audio_store.signed_url(audio_name)
         return StreamingResponse(
-            audio_buffer,
+            BytesIO(audio),
             media_type=media_type,
             headers={
-                "Content-Disposition": f"attachment; filename=tts_audio.{request.audio_settings.format}"
+                "Content-Disposition": f"attachment; filename=tts_audio.{request.audio_settings.format}",
+                "Content-Location": audio_url,
+                "ETag": f'"{audio_name}"'
             }
         )
         
     except requests.exceptions.RequestException as e:
-        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Minimax API error: {str(e)}")
+        raise minimax_client.upstream_error(e)
     
-VOICE_DESING_URL = "https://api.minimax.io/v1/voice_design"
+VOICE_DESING_URL = f"{minimax_client.MINIMAX_API_BASE}/v1/voice_design"
 
 class VoiceDesignRequest(BaseModel):
     prompt: str = Field(..., min_length=10, max_length=1000, description="Detailed description of desired voice characteristics")
@@ -181,7 +225,8 @@ async def design_voice(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Don't have enough balance"
         )
-        
+    
+    user_id = user.id
     try:
         design_headers = {
             "Authorization": f"Bearer {API_KEY}",
@@ -193,8 +238,11 @@ async def design_voice(
             "preview_text": request.preview_text,
         }
         
-        design_response = requests.post(
+        upstream_started = time.monotonic()
+        design_response = await minimax_client.request(
+            "voice_design",
             VOICE_DESING_URL,
+            user=user,
             headers=design_headers,
             json=design_payload,
             timeout=30
@@ -213,14 +261,17 @@ async def design_voice(
             }
         }
         
-        activation_response = requests.post(
+        activation_response = await minimax_client.request(
+            "t2a_v2",
             TTS_URL,
+            user=user,
             headers=design_headers,
             json=activation_payload,
             timeout=30
         )
         
         activation_response.raise_for_status()
+        upstream_latency_ms = int((time.monotonic() - upstream_started) * 1000)
         
         if user.month_voice_balance > 0:
             user.month_voice_balance = user.month_voice_balance - 1
@@ -228,7 +279,7 @@ async def design_voice(
             user.voice_balance = user.voice_balance - 1
         
         voice = Voice_ID(
-            user_id = user.id,
+            user_id = user_id,
             voice_id = design_data["voice_id"],
             detail_info = "Voice Design"
         )
@@ -236,6 +287,15 @@ async def design_voice(
         db.add(voice)
         await db.commit()
         
+        usage_recorder.record(
+            user_id=user_id,
+            operation="design",
+            voice_id=design_data["voice_id"],
+            characters=len(request.prompt),
+            audio_bytes=len(activation_response.content),
+            upstream_latency_ms=upstream_latency_ms
+        )
+        
         return {
             "voice_id": design_data["voice_id"],
             "preview_audio": design_data.get("trial_audio", ""),
@@ -257,6 +317,8 @@ async def design_voice(
             status_code=status.HTTP_502_BAD_GATEWAY,
             detail=error_detail
         )
+    except HTTPException:
+        raise
     except Exception as e:
         raise HTTPException(
             status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
@@ -264,8 +326,8 @@ async def design_voice(
         )
 
 
-FILE_UPLOAD_URL = f"https://api.minimax.io/v1/files/upload?GroupId={GROUP_ID}"
-VOICE_CLONE_URL = f"https://api.minimax.io/v1/voice_clone?GroupId={GROUP_ID}"
+FILE_UPLOAD_URL = f"{minimax_client.MINIMAX_API_BASE}/v1/files/upload?GroupId={GROUP_ID}"
+VOICE_CLONE_URL = f"{minimax_client.MINIMAX_API_BASE}/v1/voice_clone?GroupId={GROUP_ID}"
 
 class FileUploadResponse(BaseModel):
     file_id: str
@@ -319,8 +381,10 @@ async def upload_voice_sample(
             "purpose": purpose
         }
         
-        response = requests.post(
+        response = await minimax_client.request(
+            "files/upload",
             FILE_UPLOAD_URL,
+            user=user,
             headers=headers,
             files=files,
             data=data
@@ -355,6 +419,7 @@ async def clone_voice(
             detail="Don't have enough balance"
         )
     
+    user_id = user.id
     try:
         headers = {
             "Authorization": f"Bearer {API_KEY}",
@@ -370,8 +435,11 @@ async def clone_voice(
                 detail="Voice ID already exists"
             )
             
-        response = requests.post(
+        upstream_started = time.monotonic()
+        response = await minimax_client.request(
+            "voice_clone",
             VOICE_CLONE_URL,
+            user=user,
             headers=headers,
             json=request.model_dump(exclude_none=True)
         )
@@ -385,7 +453,7 @@ async def clone_voice(
             user.voice_balance = user.voice_balance - 1
         
         voice = Voice(
-            user_id=user.id,
+            user_id=user_id,
             voice_id=request.voice_id,
             detail_info="Voice Clone",
         )
@@ -403,13 +471,25 @@ async def clone_voice(
             }
         }
         
-        activation_response = requests.post(
+        activation_response = await minimax_client.request(
+            "t2a_v2",
             TTS_URL,
+            user=user,
             headers=headers,
             json=activation_payload
         )
         activation_response.raise_for_status()
         
+        usage_recorder.record(
+            user_id=user_id,
+            operation="clone",
+            voice_id=request.voice_id,
+            model=request.model,
+            characters=len(request.text or ""),
+            audio_bytes=len(activation_response.content),
+            upstream_latency_ms=int((time.monotonic() - upstream_started) * 1000)
+        )
+        
         return VoiceCloneResponse(
             voice_id=request.voice_id,
             input_sensitive=clone_data.get("input_sensitive", False),
@@ -425,6 +505,9 @@ async def clone_voice(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=error_detail
         )
+    except HTTPException:
+        await db.rollback()
+        raise
     except Exception as e:
         await db.rollback()
         raise HTTPException(
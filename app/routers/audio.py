@@ -0,0 +1,30 @@
+from fastapi import APIRouter, HTTPException, Query, Request, status
+from app.routers.api_integration import SUPPORTED_FORMATS
+from app.services import audio_store
+from app.services.file_response import RangedFileResponse
+
+router = APIRouter()
+
+# Authorised by the URL signature alone: no token decoding, no user or DB lookup
+@router.api_route("/{audio_name}", methods=["GET", "HEAD"], include_in_schema=False)
+async def signed_audio(
+    audio_name: str,
+    request: Request,
+    expires: int = Query(...),
+    signature: str = Query(...)
+):
+    if not audio_store.verify(audio_name, expires, signature):
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Invalid or expired link")
+
+    path = audio_store.resolve(audio_name)
+    if path is None:
+        raise HTTPException(status_code=status.HTTP_404_NOT_FOUND, detail="Audio not found")
+
+    extension = audio_name.rsplit(".", 1)[1]
+    return RangedFileResponse(
+        path,
+        request.headers,
+        etag=audio_name,
+        media_type=SUPPORTED_FORMATS[extension],
+        headers={"Content-Disposition": f"inline; filename=tts_audio.{extension}"}
+    )
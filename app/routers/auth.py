@@ -9,6 +9,7 @@ from app.routers.security import oauth2_scheme, create_access_token, create_refr
 from app.database import get_db
 from app.models.user import User
 from app.config import settings
+from app.services import tracing
 from app.schemas.user import UserRead, UserInDB
 from fastapi.security import OAuth2PasswordRequestForm
 
@@ -44,7 +45,8 @@ async def get_current_user(
     )
     
     try:
-        payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
+        with tracing.span("auth.jwt"):
+            payload = jwt.decode(token, settings.SECRET_KEY, algorithms=[settings.ALGORITHM])
         email: str = payload.get("email")
         if email is None:
             raise credentials_exception
@@ -52,8 +54,9 @@ async def get_current_user(
     except JWTError:
         raise credentials_exception
     
-    result = await db.execute(select(User).where(User.email == token_data.email))
-    user = result.scalars().first()
+    with tracing.span("auth.user"):
+        result = await db.execute(select(User).where(User.email == token_data.email))
+        user = result.scalars().first()
     
     if user is None:
         raise credentials_exception
@@ -1,22 +1,27 @@
+from functools import lru_cache
 from fastapi import BackgroundTasks
-from fastapi_mail import FastMail, MessageSchema, ConnectionConfig
 from app.config import settings
+from app.lazy_import import lazy_import
 
-conf = ConnectionConfig(
-    MAIL_USERNAME=settings.MAIL_USERNAME,
-    MAIL_PASSWORD=settings.MAIL_PASSWORD,
-    MAIL_FROM=settings.MAIL_FROM,
-    MAIL_PORT=settings.MAIL_PORT,
-    MAIL_SERVER=settings.MAIL_SERVER,
-    MAIL_STARTTLS=True,
-    MAIL_SSL_TLS=False,
-    USE_CREDENTIALS=True,
-    VALIDATE_CERTS=True,
-)
+fastapi_mail = lazy_import("fastapi_mail")
+
+@lru_cache(maxsize=1)
+def mail_config():
+    return fastapi_mail.ConnectionConfig(
+        MAIL_USERNAME=settings.MAIL_USERNAME,
+        MAIL_PASSWORD=settings.MAIL_PASSWORD,
+        MAIL_FROM=settings.MAIL_FROM,
+        MAIL_PORT=settings.MAIL_PORT,
+        MAIL_SERVER=settings.MAIL_SERVER,
+        MAIL_STARTTLS=True,
+        MAIL_SSL_TLS=False,
+        USE_CREDENTIALS=True,
+        VALIDATE_CERTS=True,
+    )
 
 async def send_verification_email(background_tasks: BackgroundTasks, email: str, token: str):
     verfication_url = f"{settings.BASE_URL}/auth/verify-email?token={token}"
-    message = MessageSchema(
+    message = fastapi_mail.MessageSchema(
         subject = "Please verify your email address",
         recipients=[email],
         body=f"""
@@ -29,7 +34,7 @@ async def send_verification_email(background_tasks: BackgroundTasks, email: str,
         subtype="html"
     )
     
-    fm = FastMail(conf)
+    fm = fastapi_mail.FastMail(mail_config())
     background_tasks.add_task(
         fm.send_message, message, template_name="verification_email.html"
     )
\ No newline at end of file
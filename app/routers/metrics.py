@@ -0,0 +1,9 @@
+from fastapi import APIRouter, Response
+from prometheus_client import CONTENT_TYPE_LATEST, REGISTRY, generate_latest
+from app.services.metrics import registry
+
+router = APIRouter()
+
+@router.get("", include_in_schema=False)
+async def metrics():
+    return Response(content=generate_latest(registry() or REGISTRY), media_type=CONTENT_TYPE_LATEST)
@@ -1,24 +1,23 @@
 from fastapi import APIRouter, Request, HTTPException, Depends, status
 from fastapi.responses import JSONResponse
-import httpx
 from app.config import settings
+from app.services import paypal_client, checkout_cache, subscription_cache, webhook_queue, entitlements
+from app.services.paypal_webhook_verifier import verify_webhook, WebhookVerificationError
 from pydantic import BaseModel
 from datetime import datetime, timedelta
 from sqlalchemy.future import select
 from sqlalchemy.ext.asyncio import AsyncSession
 from app.database import get_db
+from app.jobs.payment_history_partitions import PENDING_PAYMENT_LOOKBACK
 from app.models.user import User
 from app.models.payment_history import PaymentHistory
 from app.schemas.user import SubscriptionStatus
 from typing import Optional, Literal
 import json
+import logging
 
 router = APIRouter()
-
-PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
-PAYPAL_SECRET = settings.PAYPAL_SECRET
-PAYPAL_BASE_URL = settings.PAYPAL_BASE_URL
-PAYPAL_WEBHOOK_ID = settings.PAYPAL_WEBHOOK_ID
+logger = logging.getLogger(__name__)
 
 class SubscriptionRequest(BaseModel):
     plan_id: str
@@ -26,23 +25,6 @@ class SubscriptionRequest(BaseModel):
     return_url: str
     cancel_url: str
     
-async def get_paypal_access_token():
-    auth = (PAYPAL_CLIENT_ID, PAYPAL_SECRET)
-    data = {"grant_type": "client_credentials"}
-    
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{PAYPAL_BASE_URL}/v1/oauth2/token",
-            auth=auth,
-            data=data,
-            headers={"Content-Type": "application/x-www-form-urlencoded"}
-        )
-        
-    if response.status_code != 200:
-        return HTTPException(status_code=400, detail="Failed to get Paypal access token")
-    
-    return response.json()["access_token"]
-
 async def update_user_subscription(
     db: AsyncSession,
     user_id: int,
@@ -50,48 +32,31 @@ async def update_user_subscription(
     plan_id: str,
     sub_status: SubscriptionStatus
 ):
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-        
-    user.subscription_id = subscription_id
-    user.subscription_plan_id = plan_id
-    user.subscription_status = sub_status
-    user.payment_method = "paypal"
-    
-    if sub_status == SubscriptionStatus.ACTIVE:
-        if plan_id == settings.PAYPAL_PRO_PALN_ID:
-            user.month_character_balance = 2000000
-            user.month_voice_balance = 2
-        elif plan_id == settings.PAYPAL_BUSINESS_PLAN_ID:
-            user.month_voice_balance = 8000000
-            user.month_voice_balance = 10
-        user.subsrciption_start_date = datetime.utcnow()
-        user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
-    
-    await db.commit()
-    await db.refresh(user)
-    return user
+    return await entitlements.update_subscription(
+        db=db,
+        user_id=user_id,
+        subscription_id=subscription_id,
+        plan_id=plan_id,
+        sub_status=sub_status,
+        payment_method="paypal"
+    )
 
 async def create_payment_history(
     db: AsyncSession,
     user_id: int,
     event_type: str,
-    event_data: Optional[dict] = None
+    event_data: Optional[dict] = None,
+    external_id: Optional[str] = None
 ):
     history = PaymentHistory(
         user_id = user_id,
         event_type = event_type,
-        event_data = str(event_data) if event_data else None
+        provider = "paypal",
+        external_id = external_id,
+        event_data = event_data
     )
     db.add(history)
-    await db.commit()
-    await db.refresh(history)
+    await db.flush()
     return history
 
 @router.post("/create_subscription")
@@ -109,13 +74,11 @@ async def create_subscription(
             detail = "User not found"
         )
     
-    access_token = await get_paypal_access_token()
-    
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}",
-        "Prefer": "return=representation"
-    }
+    cache_key = checkout_cache.make_key("paypal", user.id, "subscription", sub_req.plan_id)
+    params_fingerprint = checkout_cache.fingerprint(sub_req.dict())
+    cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+    if cached:
+        return {"approval_url": cached.url, "subscription_id": cached.external_id}
     
     subscription_data = {
         "plan_id": sub_req.plan_id,
@@ -137,13 +100,16 @@ async def create_subscription(
         }
     }
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{PAYPAL_BASE_URL}/v1/billing/subscriptions",
-            headers=headers,
-            json=subscription_data
-        )
-        
+    response = await paypal_client.request(
+        "POST",
+        "/v1/billing/subscriptions",
+        headers={
+            "Prefer": "return=representation",
+            "PayPal-Request-Id": await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)
+        },
+        json=subscription_data
+    )
+    
     if response.status_code != 201:
         raise HTTPException(status_code=400, detail="Failed to create subscription")
     
@@ -161,9 +127,12 @@ async def create_subscription(
             "subscription_id": subscription["id"],
             "plan_id": sub_req.plan_id,
             "status": "pending"
-        }
+        },
+        external_id=subscription["id"]
     )
+    await db.commit()
     
+    checkout_cache.put(cache_key, approval_url, subscription["id"], params_fingerprint)
     return {"approval_url": approval_url, "subscription_id": subscription["id"]}
 
 class OneTimePaymentRequest(BaseModel):
@@ -192,7 +161,12 @@ async def create_character_payment(
             status_code=status.HTTP_404_NOT_FOUND,
             detail="User not found"
         )
-    access_token = await get_paypal_access_token()
+    
+    cache_key = checkout_cache.make_key("paypal", user.id, "character_pack", payment_req.tier)
+    params_fingerprint = checkout_cache.fingerprint(payment_req.dict())
+    cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+    if cached:
+        return {"approval_url": cached.url, "order_id": cached.external_id}
     
     order_data = {
         "intent": "CAPTURE",
@@ -211,16 +185,13 @@ async def create_character_payment(
         }
     }
     
-    async with httpx.AsyncClient() as client:
-        response = await client.post(
-            f"{PAYPAL_BASE_URL}/v2/checkout/orders",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json=order_data
-        )
-        
+    response = await paypal_client.request(
+        "POST",
+        "/v2/checkout/orders",
+        headers={"PayPal-Request-Id": await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)},
+        json=order_data
+    )
+    
     if response.status_code != 201:
         raise HTTPException(status_code=400, detail="Failed to create ")
     
@@ -240,9 +211,12 @@ async def create_character_payment(
             "amount": TIER_PRICES[payment_req.tier],
             "paypal_order_id": payment_data["id"],
             "status": "pending"
-        }
+        },
+        external_id=payment_data["id"]
     )
+    await db.commit()
     
+    checkout_cache.put(cache_key, approval_url, payment_data["id"], params_fingerprint)
     return {"approval_url": approval_url, "order_id": payment_data["id"]}
 
 class VoicePayment(BaseModel):
@@ -275,9 +249,13 @@ async def create_voice_payment(
             status_code=status.HTTP_403_FORBIDDEN,
             detail="Active subscription required for voice cloning"
         )
-        
-    access_token = await get_paypal_access_token()
     
+    cache_key = checkout_cache.make_key("paypal", user.id, "voice_clone", request.account_type)
+    params_fingerprint = checkout_cache.fingerprint(request.dict())
+    cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+    if cached:
+        return {"approval_url": cached.url, "order_id": cached.external_id}
+        
     order_data = {
         "intent": "CAPTURE",
         "purchase_units": [{
@@ -296,16 +274,13 @@ async def create_voice_payment(
         }
     }
     
-    async with httpx.AsyncClient() as client:
-        respones = await client.post(
-            f"{PAYPAL_BASE_URL}/v2/checkout/orders",
-            headers={
-                "Authorization": f"Bearer {access_token}",
-                "Content-Type": "application/json"
-            },
-            json=order_data
-        )
-        
+    respones = await paypal_client.request(
+        "POST",
+        "/v2/checkout/orders",
+        headers={"PayPal-Request-Id": await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)},
+        json=order_data
+    )
+    
     if respones.status_code != 201:
         raise HTTPException(status_code=400, detail="Payment creation failed")
     
@@ -320,215 +295,204 @@ async def create_voice_payment(
             "amount": VOICE_CLONE_PRICES[request.account_type],
             "paypal_order_id": payment_data["id"],
             "status": "pending"
-        }
+        },
+        external_id=payment_data["id"]
+    )
+    await db.commit()
+    
+    approval_url = next(
+        link["href"] for link in payment_data["links"]
+        if link["rel"] == "approve"
     )
     
+    checkout_cache.put(cache_key, approval_url, payment_data["id"], params_fingerprint)
     return {
-        "approval_url": next(
-            link["href"] for link in payment_data["links"]
-            if link["rel"] == "approve"
-        ),
+        "approval_url": approval_url,
         "order_id": payment_data["id"]
     }
 
-@router.post("/paypal-webhook")
-async def paypal_webhook(
-    request: Request,
-    db: AsyncSession = Depends(get_db)
-):
-    
-    try:
-        access_token = await get_paypal_access_token()
-        headers = {
-            "Content-type": "application/json",
-            "Authorization": f"Bearer {access_token}"
-        }
-        
-        body = await request.json()
-        webhook_event = body.get("event_type")
-        
-        async with httpx.AsyncClient() as client:
-            verify_response = await client.post(
-                f"{PAYPAL_BASE_URL}/v1/notifications/verify-webhook-signature",
-                headers=headers,
-                json={
-                    "transmission_id": request.headers.get("PAYPAL-TRANSMISSION-ID"),
-                    "transmission_time": request.headers.get("PAYPAL-TRANSMISSION-TIME"),
-                    "cert_url": request.headers.get("PAYPAL-CERT-URL"),
-                    "auth_algo": request.headers.get("PAYPAL-AUTH-ALGO"),
-                    "transmission_sig": request.headers.get("PAYPAL-TRANSMISSION-SIG"),
-                    "webhook_id": PAYPAL_WEBHOOK_ID,
-                    "webhook_event": body
-                }
+# Runs inside the webhook processor's transaction and must not commit; see webhook_queue.process_event
+async def process_paypal_event(db: AsyncSession, body: dict):
+    webhook_event = body.get("event_type")
+    resource = body.get("resource", {})
+
+    if webhook_event == "BILLING.SUBSCRIPTION.ACTIVATED":
+        subscription_id = resource.get("id")
+        if not subscription_id:
+            logger.warning("PayPal %s webhook without subscription id", webhook_event)
+            return
+        subscription_cache.put("paypal", subscription_id, resource)
+
+        result = await db.execute(select(User).where(User.subscription_id == subscription_id))
+        user = result.scalars().first()
+
+        if user:
+            checkout_cache.invalidate_user("paypal", user.id)
+            await update_user_subscription(
+                db=db,
+                user_id=user.id,
+                subscription_id=subscription_id,
+                plan_id=user.subscription_plan_id,
+                sub_status=SubscriptionStatus.ACTIVE
             )
-            
-        if verify_response.status_code != 200 or verify_response.json()["verification_status"] != "SUCCESS":
-            raise HTTPException(
-                status_code=status.HTTP_400_BAD_REQUEST, 
-                detail="Webhook verification failed"
+
+            await create_payment_history(
+                db=db,
+                user_id=user.id,
+                event_type="subscription_activated",
+                event_data=body,
+                external_id=subscription_id
             )
-    except Exception as e:
-        raise HTTPException(
-            status_code=status.HTTP_400_BAD_REQUEST,
-            detail=f"Webhook processing error: {str(e)}"
+
+    elif webhook_event == "BILLING.SUBSCRIPTION.CANCELLED":
+        subscription_id = resource.get("id")
+        if not subscription_id:
+            logger.warning("PayPal %s webhook without subscription id", webhook_event)
+            return
+        subscription_cache.put("paypal", subscription_id, resource)
+
+        result = await db.execute(select(User).where(User.subscription_id == subscription_id))
+        user = result.scalars().first()
+        if user:
+            await update_user_subscription(
+                db=db,
+                user_id=user.id,
+                subscription_id=subscription_id,
+                plan_id=user.subscription_plan_id,
+                sub_status=SubscriptionStatus.CANCELLED
+            )
+            await create_payment_history(
+                db=db,
+                user_id=user.id,
+                event_type="subscription_cancelled",
+                event_data=body,
+                external_id=subscription_id
+            )
+
+    elif webhook_event == "PAYMENT.SALE.COMPLETED":
+        subscription_id = resource.get("billing_agreement_id")
+        if not subscription_id:
+            logger.warning("PayPal %s webhook without subscription id", webhook_event)
+            return
+        subscription_cache.invalidate("paypal", subscription_id)
+
+        result = await db.execute(select(User).where(User.subscription_id == subscription_id))
+        user = result.scalars().first()
+
+        if user:
+            await create_payment_history(
+                db=db,
+                user_id=user.id,
+                event_type="payment_received",
+                event_data=body,
+                external_id=subscription_id
+            )
+
+    elif webhook_event == "PAYMENT.CAPTURE.COMPLETED":
+        order_id = (
+            resource.get("supplementary_data", {}).get("related_ids", {}).get("order_id")
+            or resource.get("id")
         )
-        
-    try:
-        webhook_event = body.get("event_type")
-        resource = body.get("resource", {})
-        
-        if webhook_event == "BILLING.SUBSCRIPTION.ACTIVATED":
-            subscription_id = resource.get("id")
-            if not subscription_id:
-                return JSONResponse({"status": "missing subscription_id"}, status_code=400)
-            
-            result = await db.execute(select(User).where(User.subscription_id == subscription_id))
-            user = result.scalars().first()
-            
-            if user:
-                await update_user_subscription(
-                    db=db,
-                    user_id=user.id,
-                    subscription_id=subscription_id,
-                    plan_id=user.subscription_plan_id,
-                    sub_status=SubscriptionStatus.ACTIVE
-                )
-                
-                if user.payment_method != "paypal":
-                    user.payment_method = "paypal"
-                    await db.commit()
-                    
-                await create_payment_history(
-                    db=db,
-                    user_id=user.id,
-                    event_type="subscription_activated",
-                    event_data=body
-                )
-            
-        elif webhook_event == "BILLING.SUBSCRIPTION.CANCELLED":
-            subscription_id = resource.get("id")
-            if not subscription_id:
-                return JSONResponse({"status": "missing subscription_id"}, status_code=400)
-            
-            result = await db.execute(select(User).where(User.subscription_id == subscription_id))
-            user = result.scalars().first()
-            if user:
-                await update_user_subscription(
-                    db=db,
-                    user_id=user.id,
-                    subscription_id=subscription_id,
-                    plan_id=user.subscription_plan_id,
-                    sub_status=SubscriptionStatus.CANCELLED
-                )
+        amount = float(resource.get("amount", {}).get("value", 0))
+        if not order_id:
+            logger.warning("PayPal %s webhook without order id", webhook_event)
+            return
+
+        result = await db.execute(
+            select(PaymentHistory).where(
+                PaymentHistory.provider == "paypal",
+                PaymentHistory.created_at >= datetime.utcnow() - PENDING_PAYMENT_LOOKBACK,
+                PaymentHistory.external_id == order_id,
+                PaymentHistory.event_type.in_(["one_time_payment_created", "voice_payment_created"])
+            )
+            .order_by(PaymentHistory.created_at, PaymentHistory.id)
+            .limit(1)
+        )
+        history = result.scalars().first()
+
+        if history:
+            checkout_cache.invalidate_user("paypal", history.user_id)
+            history_data = history.event_data or {}
+            tier = history_data.get("tier")
+            product_type = entitlements.product_for_tier(tier)
+            balances = await entitlements.grant_pack(
+                db=db,
+                user_id=history.user_id,
+                product_type=product_type,
+                tier=tier,
+                payment_method="paypal"
+            )
+
+            if product_type == "voice_clone":
                 await create_payment_history(
                     db=db,
-                    user_id=user.id,
-                    event_type="subscription_cancelled",
-                    event_data=body
+                    user_id=history.user_id,
+                    event_type="payment_completed",
+                    event_data={
+                        **body,
+                        "voice_balance": balances.voice_balance
+                    },
+                    external_id=order_id
                 )
-            
-        elif webhook_event == "PAYMENT.SALE.COMPLETED":
-            subscription_id = resource.get("billing_agreement_id")
-            if not subscription_id:
-                return JSONResponse({"status": "missing subscription_id"}, status_code=400)
-            
-            result = await db.execute(select(User).where(User.subscription_id == subscription_id))
-            user = result.scalars().first()
-            
-            if user:
+            elif product_type == "character_pack":
                 await create_payment_history(
                     db=db,
-                    user_id=user.id,
-                    event_type="payment_received",
-                    event_data=body
-                )
-                
-        elif webhook_event == "PAYMENT.CAPTURE.COMPLETED":
-            order_id = resource.get("id")
-            amount = float(resource.get("amount", {}).get("value", 0))
-            if not order_id:
-                raise JSONResponse({"status": "missing order_id"}, status_code=400)
-            
-            result = await db.execute(
-                select(PaymentHistory).where(
-                    PaymentHistory.event_data.contains(f'"paypal_order_id": "{order_id}')
+                    user_id=history.user_id,
+                    event_type="payment_completed",
+                    event_data={
+                        **body,
+                        "character_balance": balances.character_balance
+                    },
+                    external_id=order_id
                 )
-            )
-            history = result.scalars().first()
-            
-            if history:
-                history_data = json.loads(history.event_data)
-                result = await db.execute(select(User).where(User.id == history.user_id))
-                user = result.scalars().first()
-                
-                if user:
-                    if history_data.get("tier") == "small":
-                        user.character_balance = user.character_balance + 500000
-                    elif history_data.get("tier") == "medium":
-                        user.character_balance = user.character_balance + 1000000
-                    elif history_data.get("tier") == "large":
-                        user.character_balance = user.character_balance + 5000000
-                    elif history_data.get("tier") == "enterprise":
-                        user.character_balance = user.character_balance + 20000000
-                    elif history_data.get("tier") == "pro":
-                        user.voice_balance = user.voice_balance + 1
-                    elif history_data.get("tier") == "business":
-                        user.voice_balance = user.voice_balance + 1
 
-                    user.payment_method = "paypal"
-                    await db.commit()
-                    
-                    if history_data.get("tier") == "pro" or history_data.get("tier") == "business":
-                        await create_payment_history(
-                            db=db,
-                            user_id=user.id,
-                            event_type="payment_completed",
-                            event_data={
-                                **body,
-                                "voice_balance": user.character_balance
-                            }
-                        )
-                    elif history_data.get("tier") in ["small", "medium", "large", "enterprise"]:
-                        await create_payment_history(
-                            db=db,
-                            user_id=user.id,
-                            event_type="payment_completed",
-                            event_data={
-                                **body,
-                                "character_balance": user.character_balance
-                            }
-                        )
-        return {"status": "success"}
+webhook_queue.register_handler("paypal", process_paypal_event)
+
+@router.post("/paypal-webhook")
+async def paypal_webhook(
+    request: Request,
+    db: AsyncSession = Depends(get_db)
+):
     
+    try:
+        raw_body = await request.body()
+        body = json.loads(raw_body)
+        
+        await verify_webhook(request.headers, raw_body, body)
+    except WebhookVerificationError as e:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST, 
+            detail=f"Webhook verification failed: {str(e)}"
+        )
     except Exception as e:
-        await db.rollback()
         raise HTTPException(
-            status_code=status.HTTP_500_INTERNAL_SERVER_ERROR,
-            detail=f"Error processing webhook: {str(e)}"
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Webhook processing error: {str(e)}"
         )
+    
+    await webhook_queue.record_event(db, "paypal", body.get("id"), body.get("event_type"), body)
+    return {"status": "success"}
 
 @router.get("/subscription/{subscription_id}")
 async def get_subscription(
     subscription_id: str,
     db: AsyncSession = Depends(get_db)
 ):
-    access_token = await get_paypal_access_token()
-    headers = {
-        "Content-Type": "application/json",
-        "Authorization": f"Bearer {access_token}"
-    }
+    cached = subscription_cache.get("paypal", subscription_id)
+    if cached is not None:
+        return cached
+    
+    response = await paypal_client.request(
+        "GET",
+        f"/v1/billing/subscriptions/{subscription_id}"
+    )
     
-    async with httpx.AsyncClient() as client:
-        response = await client.get(
-            f"{PAYPAL_BASE_URL}/v1/billing/subscriptions/{subscription_id}",
-            headers=headers
-        )
-        
     if response.status_code != 200:
         raise HTTPException(status_code=400, detail="Failed to get subscription detials")
     
     
     subscription_data = response.json()
+    subscription_cache.put("paypal", subscription_id, subscription_data)
     status_mapping = {
         "ACTIVE": SubscriptionStatus.ACTIVE,
         "CANCELLED": SubscriptionStatus.CANCELLED,
@@ -547,5 +511,6 @@ async def get_subscription(
                 plan_id=user.subscription_plan_id,
                 sub_status=status_mapping[subscription_data["status"]]
             )
+            await db.commit()
     
     return subscription_data
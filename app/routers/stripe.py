@@ -2,22 +2,25 @@ from fastapi import APIRouter, HTTPException, Depends, Request, status
 from fastapi.responses import JSONResponse
 from pydantic import BaseModel
 from fastapi import Request
-import stripe
-import stripe.error
 from app.config import settings
+from app.lazy_import import lazy_import
+from app.services import stripe_gateway, checkout_cache, subscription_cache, webhook_queue, entitlements
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
 from app.database import get_db
+from app.jobs.payment_history_partitions import PENDING_PAYMENT_LOOKBACK
 from app.models.user import User
 from app.models.payment_history import PaymentHistory
 from app.schemas.user import SubscriptionStatus
 from datetime import datetime, timedelta
 from typing import Optional, Literal
 import json
+import logging
+
+stripe = lazy_import("stripe")
 
 router = APIRouter()
-# Load your Stripe secret key from an environment variable
-stripe.api_key = settings.STRIPE_API_KEY
+logger = logging.getLogger(__name__)
 WEBHOOK_SECRET = settings.STRIPE_WEBHOOK_SECRET
 # Request model for payment data
 
@@ -28,7 +31,7 @@ class StripeSubscriptionRequest(BaseModel):
     cancel_url: str
     
 async def create_stripe_customer(user: User):
-    customer = stripe.Customer.create(
+    customer = await stripe_gateway.create_customer(
         email=user.email,
         metadata={
             "user_id": user.id,
@@ -41,16 +44,18 @@ async def create_payment_history(
     db: AsyncSession,
     user_id: int,
     event_type: str,
-    event_data: Optional[dict] = None
+    event_data: Optional[dict] = None,
+    external_id: Optional[str] = None
 ):
     history = PaymentHistory(
         user_id = user_id,
         event_type = event_type,
-        event_data = str(event_data) if event_data else None
+        provider = "stripe",
+        external_id = external_id,
+        event_data = event_data
     )
     db.add(history)
-    await db.commit()
-    await db.refresh(history)
+    await db.flush()
     return history
 
 async def update_user_stripe_info(
@@ -61,41 +66,14 @@ async def update_user_stripe_info(
     sub_status: Optional[SubscriptionStatus] = None,
     payment_method: Optional[str] = None
 ):
-    
-    result = await db.execute(select(User).where(User.id == user_id))
-    user = result.scalars().first()
-    
-    if not user:
-        raise HTTPException(
-            status_code=status.HTTP_404_NOT_FOUND,
-            detail="User not found"
-        )
-        
-    if subscription_id:
-        user.subscription_id = subscription_id
-    
-    if plan_id:
-        user.subscription_plan_id = plan_id
-        
-    if sub_status:
-        user.subscription_status = sub_status
-    
-    if payment_method:
-        user.payment_method = payment_method
-    
-    if sub_status == SubscriptionStatus.ACTIVE:
-        if plan_id == settings.STRIPE_PRO_PRICE_ID:
-            user.month_character_balance = 2000000
-            user.month_voice_balance = 2
-        elif plan_id == settings.STRIPE_BUSINESS_PRICE_ID:
-            user.month_voice_balance = 8000000
-            user.month_voice_balance = 10
-        user.subsrciption_start_date = datetime.utcnow()
-        user.subscription_end_date = datetime.utcnow() + timedelta(days=30)
-        
-    await db.commit()
-    await db.refresh(user)
-    return user
+    return await entitlements.update_subscription(
+        db=db,
+        user_id=user_id,
+        subscription_id=subscription_id,
+        plan_id=plan_id,
+        sub_status=sub_status,
+        payment_method=payment_method
+    )
 
 @router.post("/create-subscription")
 async def create_subscription(
@@ -112,36 +90,50 @@ async def create_subscription(
         )
         
     try:
-        session = stripe.checkout.Session.create(
-            customer_email=user.email,
-            payment_method_types=['card'],
-            line_items=[{
+        params = {
+            "customer_email": user.email,
+            "payment_method_types": ['card'],
+            "line_items": [{
                 'price': sub_req.price_id,
                 'quantity': 1,
             }],
-            mode='subscription',
-            success_url=sub_req.success_url,
-            cancel_url=sub_req.cancel_url,
-            metadata={
+            "mode": 'subscription',
+            "success_url": sub_req.success_url,
+            "cancel_url": sub_req.cancel_url,
+            "metadata": {
                 "user_id": str(user.id),
                 "price_id": sub_req.price_id
             }
+        }
+        
+        cache_key = checkout_cache.make_key("stripe", user.id, "subscription", sub_req.price_id)
+        params_fingerprint = checkout_cache.fingerprint(params)
+        cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+        if cached:
+            return {"checkout_url": cached.url}
+        
+        session = await stripe_gateway.create_checkout_session(
+            params,
+            idempotency_key=await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)
         )
         
         history = PaymentHistory(
             user_id=user.id,
             event_type="checkout_session_created",
-            event_data=json.dumps({
+            provider="stripe",
+            external_id=session.id,
+            event_data={
                 "session_id": session.id,
                 "price_id": sub_req.price_id,
                 "status": "pending"
-            })
+            }
         )
         db.add(history)
         await db.commit()
         
+        checkout_cache.put(cache_key, session.url, session.id, params_fingerprint, session.get("expires_at"))
         return {"checkout_url": session.url}
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -187,37 +179,51 @@ async def create_character_payment(
         }
         description = f"Character Pack: {payment_req.tier}"
         
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[line_item],
-            mode='payment',
-            success_url=payment_req.success_url,
-            cancel_url=payment_req.cancel_url,
-            metadata={
+        params = {
+            "payment_method_types": ['card'],
+            "line_items": [line_item],
+            "mode": 'payment',
+            "success_url": payment_req.success_url,
+            "cancel_url": payment_req.cancel_url,
+            "metadata": {
                 "user_id": str(user.id),
                 "product_type": "character_pack",
                 "tier": payment_req.tier or "",
             }
+        }
+        
+        cache_key = checkout_cache.make_key("stripe", user.id, "character_pack", payment_req.tier)
+        params_fingerprint = checkout_cache.fingerprint(params)
+        cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+        if cached:
+            return {"checkout_url": cached.url}
+        
+        session = await stripe_gateway.create_checkout_session(
+            params,
+            idempotency_key=await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)
         )
         
         history = PaymentHistory(
             user_id = user.id,
             event_type = "character_payment_created",
-            event_data = json.dumps({
+            provider = "stripe",
+            external_id = session.id,
+            event_data = {
                 "session_id": session.id,
                 "product_type": "character_pack",
                 "tier": payment_req.tier,
                 "amount": line_item["price_data"]["unit_amount"] / 100,
                 "status": "pending"
-            })
+            }
         )
         
         db.add(history)
         await db.commit()
         
+        checkout_cache.put(cache_key, session.url, session.id, params_fingerprint, session.get("expires_at"))
         return {"checkout_url": session.url}
     
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -261,37 +267,51 @@ async def create_character_payment(
         }
         description = f"Voice: {payment_req.tier}"
         
-        session = stripe.checkout.Session.create(
-            payment_method_types=['card'],
-            line_items=[line_item],
-            mode='payment',
-            success_url=payment_req.success_url,
-            cancel_url=payment_req.cancel_url,
-            metadata={
+        params = {
+            "payment_method_types": ['card'],
+            "line_items": [line_item],
+            "mode": 'payment',
+            "success_url": payment_req.success_url,
+            "cancel_url": payment_req.cancel_url,
+            "metadata": {
                 "user_id": str(user.id),
                 "product_type": "voice_clone",
                 "tier": payment_req.tier or "",
             }
+        }
+        
+        cache_key = checkout_cache.make_key("stripe", user.id, "voice_clone", payment_req.tier)
+        params_fingerprint = checkout_cache.fingerprint(params)
+        cached = await checkout_cache.lookup(db, cache_key, params_fingerprint)
+        if cached:
+            return {"checkout_url": cached.url}
+        
+        session = await stripe_gateway.create_checkout_session(
+            params,
+            idempotency_key=await checkout_cache.idempotency_key(db, cache_key, params_fingerprint)
         )
         
         history = PaymentHistory(
             user_id = user.id,
             event_type = "voice_payment_created",
-            event_data = json.dumps({
+            provider = "stripe",
+            external_id = session.id,
+            event_data = {
                 "session_id": session.id,
                 "product_type": "voice_clone",
                 "tier": payment_req.tier,
                 "amount": line_item["price_data"]["unit_amount"] / 100,
                 "status": "pending"
-            })
+            }
         )
         
         db.add(history)
         await db.commit()
         
+        checkout_cache.put(cache_key, session.url, session.id, params_fingerprint, session.get("expires_at"))
         return {"checkout_url": session.url}
     
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -314,22 +334,31 @@ async def stripe_webhook(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid payload: {str(e)}"
         )
-    except stripe.error.SignatureVerificationError as e:
+    except stripe.SignatureVerificationError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=f"Invalid signature: {str(e)}"
         )
 
+    await webhook_queue.record_event(db, "stripe", event['id'], event['type'], json.loads(payload))
+    return JSONResponse({"status": "success"})
+
+# Runs inside the webhook processor's transaction and must not commit; see webhook_queue.process_event
+async def process_stripe_event(db: AsyncSession, event: dict):
     event_type = event['type']
     data = event['data']['object']
     
     if event_type == 'checkout.session.completed' and data.get('mode') == "subscription":
         user_id = data['metadata'].get('user_id')
         if not user_id:
-            return JSONResponse({"status": "missing user_id"}, status_code=400)
+            logger.warning("Stripe %s event %s without user_id", event_type, event.get('id'))
+            return
+        
+        checkout_cache.invalidate_user("stripe", int(user_id))
         
         subscription_id = data.get('subscription')
         price_id = data['metadata'].get('price_id')
+        subscription_cache.invalidate("stripe", subscription_id)
         
         await update_user_stripe_info(
             db=db,
@@ -343,72 +372,72 @@ async def stripe_webhook(
         history = PaymentHistory(
             user_id=int(user_id),
             event_type="subscription_activated",
-            event_data=json.dumps(data)
+            provider="stripe",
+            external_id=data["id"],
+            event_data=data
         )
         
         db.add(history)
-        await db.commit()
     
     elif event_type == 'checkout.session.completed' and data.get('mode') == "payment":
         user_id = data['metadata'].get('user_id')
         product_type = data['metadata'].get('product_type')
         
         if not user_id:
-            return JSONResponse({"status": "missing user_id"}, status_code=400)
+            logger.warning("Stripe %s event %s without user_id", event_type, event.get('id'))
+            return
+        
+        checkout_cache.invalidate_user("stripe", int(user_id))
         
         result = await db.execute(
             select(PaymentHistory).where(
-                PaymentHistory.event_data.contains(f'"session_id":"{data["id"]}"')
+                PaymentHistory.provider == "stripe",
+                PaymentHistory.created_at >= datetime.utcnow() - PENDING_PAYMENT_LOOKBACK,
+                PaymentHistory.external_id == data["id"],
+                PaymentHistory.event_type.in_(["character_payment_created", "voice_payment_created"])
             )
+            .order_by(PaymentHistory.created_at, PaymentHistory.id)
+            .limit(1)
         )
         
         history = result.scalars().first()
         
         if history and history.user_id == int(user_id):
-            history_data = json.loads(history.event_data)
-            result = await db.execute(select(User).where(User.id == history.user_id))
-            user = result.scalars().first()
+            history_data = history.event_data or {}
+            balances = await entitlements.grant_pack(
+                db=db,
+                user_id=history.user_id,
+                product_type=product_type,
+                tier=history_data.get('tier'),
+                payment_method="stripe"
+            )
             
-            if user:
-                if product_type == "character_pack":
-                    tier = history_data.get('tier')
-                    if tier == "small":
-                        user.character_balance = user.character_balance + 500000
-                    elif tier == "medium":
-                        user.character_balance = user.character_balance + 1000000
-                    elif tier == "large":
-                        user.character_balance = user.character_balance + 5000000
-                    elif tier == "enterprise":
-                        user.character_balance = user.character_balance + 20000000
-                elif product_type == "voice_clone":
-                    user.voice_balance = user.voice_balance + 1
-                    
-                user.payment_method = "stripe"
-                await db.commit()
-                
-                if product_type == "character_pack":    
-                    await create_payment_history(
-                        db=db,
-                        user_id=user.id,
-                        event_type="character_payment_completed",
-                        event_data={
-                            **data,
-                            "new_balance": user.character_balance
-                        }
-                    )
-                elif product_type == "voice_clone":
-                    await create_payment_history(
-                        db=db,
-                        user_id=user.id,
-                        event_type="voice_payment_completed",
-                        event_data={
-                            **data,
-                            "new_balance": user.voice_balance
-                        }
-                    )
+            if product_type == "character_pack":    
+                await create_payment_history(
+                    db=db,
+                    user_id=history.user_id,
+                    event_type="character_payment_completed",
+                    event_data={
+                        **data,
+                        "new_balance": balances.character_balance
+                    },
+                    external_id=data["id"]
+                )
+            elif product_type == "voice_clone":
+                await create_payment_history(
+                    db=db,
+                    user_id=history.user_id,
+                    event_type="voice_payment_completed",
+                    event_data={
+                        **data,
+                        "new_balance": balances.voice_balance
+                    },
+                    external_id=data["id"]
+                )
     elif event_type == 'customer.subscription.updated':
         subscription = data
         user_id = subscription['metadata'].get('user_id')
+        subscription_cache.put("stripe", subscription['id'], subscription)
         
         if user_id:
             status_map = {
@@ -433,36 +462,44 @@ async def stripe_webhook(
                 history = PaymentHistory(
                     user_id = int(user_id),
                     event_type = "subscription_updated",
-                    event_data = json.dumps(subscription)
+                    provider = "stripe",
+                    external_id = subscription['id'],
+                    event_data = subscription
                 )
                 db.add(history)
-                await db.commit()
+    
+    elif event_type == 'invoice.paid':
+        subscription_id = data['subscription']
+        subscription_cache.invalidate("stripe", subscription_id)
+        result = await db.execute(
+            select(User).where(User.subscription_id == subscription_id)
+        )
+        user = result.scalars().first()
         
-        elif event_type == 'invoice.paid':
-            subscription_id = data['subscription']
-            result = await db.execute(
-                select(User).where(User.subscription_id == subscription_id)
+        if user:
+            history = PaymentHistory(
+                user_id = user.id,
+                event_type = "payment_received",
+                provider = "stripe",
+                external_id = data['id'],
+                event_data = data
             )
-            user = result.scalars().first()
-            
-            if user:
-                history = PaymentHistory(
-                    user_id = user.id,
-                    event_type = "payment_received",
-                    event_data = json.dumps(data)
-                )
-                db.add(history)
-                await db.commit()
-                
-        return JSONResponse({"status": "success"})
+            db.add(history)
+
+webhook_queue.register_handler("stripe", process_stripe_event)
 
 @router.get("/subscription/{subscription_id}")
 async def get_subscripton(
     subscription_id: str,
     db: AsyncSession = Depends(get_db)
 ):
+    cached = subscription_cache.get("stripe", subscription_id)
+    if cached is not None:
+        return cached
+    
     try:
-        subscription = stripe.Subscription.retrieve(subscription_id)
+        subscription = await stripe_gateway.retrieve_subscription(subscription_id)
+        subscription_cache.put("stripe", subscription_id, subscription)
         
         result = await db.execute(select(User).where(User.subscription_id == subscription_id))
         
@@ -485,10 +522,11 @@ async def get_subscripton(
                     subscription_id=subscription_id,
                     sub_status=new_status
                 )
+                await db.commit()
                 
         return subscription
     
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
@@ -509,10 +547,11 @@ async def cancel_subscription(
         )
         
     try:
-        subsciption = stripe.Subscription.modify(
+        subsciption = await stripe_gateway.update_subscription(
             user.subscription_id,
-            cancel_at_period_end=True
+            {"cancel_at_period_end": True}
         )
+        subscription_cache.put("stripe", subsciption['id'], subsciption)
         
         await update_user_stripe_info(
             db=db,
@@ -524,7 +563,9 @@ async def cancel_subscription(
         history = PaymentHistory(
             user_id = user.id,
             event_type = "subscription_cancelled",
-            event_data = json.dumps(subsciption)
+            provider = "stripe",
+            external_id = subsciption['id'],
+            event_data = subsciption
         )
         
         db.add(history)
@@ -532,7 +573,7 @@ async def cancel_subscription(
         
         return {"status": "success", "message": "Subscription will cancel at period end"}
     
-    except stripe.error.StripeError as e:
+    except stripe.StripeError as e:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(e)
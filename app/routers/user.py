@@ -1,40 +1,54 @@
-from datetime import timedelta, datetime
-from fastapi import APIRouter, Depends, HTTPException, status
+from datetime import timedelta, datetime, timezone
+from fastapi import APIRouter, Depends, HTTPException, Query, status
 from fastapi import BackgroundTasks
 from sqlalchemy.ext.asyncio import AsyncSession
 from sqlalchemy.future import select
-from sqlalchemy import or_
+from sqlalchemy import or_, tuple_
 from app.database import get_db
 from app.models.user import User
 from app.schemas.user import UserCreate, UserRead, UserUpdate
-from app.models.payment_history import SubScriptionHistory
-from app.schemas.payment_history import SubscriptionHistoryRead, SubscriptionHistoryCreate
+from app.models.payment_history import PaymentHistory
+from app.schemas.payment_history import PaymentHistoryRead, PaymentHistoryCreate, PaymentHistorySummary, PaymentHistoryPage
+from app.models.usage_rollup import UsageHourly, UsageDaily
+from app.schemas.usage import UsageBucket, UsageResponse
 from app.config import settings
 from app.routers.email_service import send_verification_email
 from jose import jwt, JWTError
 from app.routers.security import get_password_hash, create_access_token
 from app.routers.auth import get_current_user
-from authlib.integrations.starlette_client import OAuth, OAuthError
+from app.lazy_import import lazy_import
 from fastapi import Request
+from functools import lru_cache
+from typing import Optional, Literal
+import base64
 
 router = APIRouter()
 
+USAGE_MAX_RANGE = {
+    "hour": timedelta(days=7),
+    "day": timedelta(days=366)
+}
+
 SECRET_KEY = settings.SECRET_KEY
 ALGORITHM = settings.ALGORITHM
 ACCESS_TOKEN_EXPIRE_MINUTES = settings.ACCESS_TOKEN_EXPIRE_MINUTES
 
-oauth = OAuth()
+starlette_client = lazy_import("authlib.integrations.starlette_client")
 
-oauth.register(
-    name='google',
-    client_id=settings.GOOGLE_GLIENT_ID,
-    client_secret=settings.GOOGLE_CLIENT_SECRET,
-    server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
-    client_kwargs={
-        'scope': 'openid email profile',
-        'prompt': 'select_account',
-    }
-)
+@lru_cache(maxsize=1)
+def get_oauth():
+    oauth = starlette_client.OAuth()
+    oauth.register(
+        name='google',
+        client_id=settings.GOOGLE_GLIENT_ID,
+        client_secret=settings.GOOGLE_CLIENT_SECRET,
+        server_metadata_url='https://accounts.google.com/.well-known/openid-configuration',
+        client_kwargs={
+            'scope': 'openid email profile',
+            'prompt': 'select_account',
+        }
+    )
+    return oauth
 
 async def get_or_create_user(db: AsyncSession, email: str, provider: str = None, provider_user_id: str = None):
     result = await db.execute(
@@ -171,7 +185,7 @@ async def verify_email(
 @router.get("/login/google")
 async def login_google(request: Request):
     redirect_uri = request.url_for("auth_google")
-    return await oauth.google.authorize_redirect(request, redirect_uri)
+    return await get_oauth().google.authorize_redirect(request, redirect_uri)
 
 @router.get("/auth/google")
 async def auth_googel(
@@ -179,8 +193,8 @@ async def auth_googel(
     db: AsyncSession = Depends(get_db)
 ):
     try:
-        token = await oauth.google.authorize_access_token(request)
-    except OAuthError as error:
+        token = await get_oauth().google.authorize_access_token(request)
+    except starlette_client.OAuthError as error:
         raise HTTPException(
             status_code=status.HTTP_400_BAD_REQUEST,
             detail=str(error)
@@ -272,17 +286,17 @@ async def delete_user(user_id: int, user: User = Depends(get_current_user), db:
     
     return user
 
-@router.post("/{user_id}/subscription-history", response_model=SubscriptionHistoryRead)
+@router.post("/{user_id}/subscription-history", response_model=PaymentHistoryRead)
 async def create_subscription_history(
     user_id: int,
-    history: SubscriptionHistoryCreate,
+    history: PaymentHistoryCreate,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
     
-    db_history = SubScriptionHistory(
+    db_history = PaymentHistory(
         user_id=user_id,
         event_type=history.event_type,
         event_data=history.event_data
@@ -293,17 +307,129 @@ async def create_subscription_history(
     await db.refresh(db_history)
     return db_history
 
-@router.get("/{user_id}/subscription-history", response_model=list[SubscriptionHistoryRead])
+def as_naive_utc(value: Optional[datetime]):
+    # Stored timestamps are naive UTC; an offset in a query parameter or cursor is converted, not compared
+    if value is None or value.tzinfo is None:
+        return value
+    return value.astimezone(timezone.utc).replace(tzinfo=None)
+
+def encode_history_cursor(created_at: datetime, history_id: int):
+    raw = f"{created_at.isoformat()}|{history_id}"
+    return base64.urlsafe_b64encode(raw.encode()).decode()
+
+def decode_history_cursor(cursor: str):
+    try:
+        raw = base64.urlsafe_b64decode(cursor.encode()).decode()
+        created_at, history_id = raw.rsplit("|", 1)
+        return as_naive_utc(datetime.fromisoformat(created_at)), int(history_id)
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail="Invalid cursor")
+
+@router.get("/{user_id}/subscription-history", response_model=PaymentHistoryPage)
 async def get_subsciption_history(
     user_id: int,
+    limit: int = Query(50, ge=1, le=200),
+    cursor: Optional[str] = None,
+    event_type: Optional[str] = None,
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
+    include_event_data: bool = False,
+    current_user: User = Depends(get_current_user),
+    db: AsyncSession = Depends(get_db)
+):
+    if user_id != current_user.id:
+        raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
+    
+    start_date = as_naive_utc(start_date)
+    end_date = as_naive_utc(end_date)
+    columns = [
+        PaymentHistory.id,
+        PaymentHistory.user_id,
+        PaymentHistory.event_type,
+        PaymentHistory.provider,
+        PaymentHistory.external_id,
+        PaymentHistory.created_at
+    ]
+    if include_event_data:
+        columns.append(PaymentHistory.event_data)
+    
+    query = select(*columns).where(PaymentHistory.user_id == user_id)
+    
+    if event_type:
+        query = query.where(PaymentHistory.event_type == event_type)
+    if start_date:
+        query = query.where(PaymentHistory.created_at >= start_date)
+    if end_date:
+        query = query.where(PaymentHistory.created_at < end_date)
+    if cursor:
+        cursor_created_at, cursor_id = decode_history_cursor(cursor)
+        query = query.where(
+            PaymentHistory.created_at <= cursor_created_at,
+            tuple_(PaymentHistory.created_at, PaymentHistory.id) < tuple_(cursor_created_at, cursor_id)
+        )
+    
+    query = query.order_by(PaymentHistory.created_at.desc(), PaymentHistory.id.desc()).limit(limit + 1)
+    result = await db.execute(query)
+    rows = result.all()
+    
+    next_cursor = None
+    if len(rows) > limit:
+        rows = rows[:limit]
+        next_cursor = encode_history_cursor(rows[-1].created_at, rows[-1].id)
+    
+    return PaymentHistoryPage(
+        items=[PaymentHistorySummary(**row._mapping) for row in rows],
+        next_cursor=next_cursor
+    )
+
+@router.get("/{user_id}/usage", response_model=UsageResponse)
+async def get_usage(
+    user_id: int,
+    granularity: Literal["hour", "day"] = "day",
+    start_date: Optional[datetime] = None,
+    end_date: Optional[datetime] = None,
     current_user: User = Depends(get_current_user),
     db: AsyncSession = Depends(get_db)
 ):
     if user_id != current_user.id:
         raise HTTPException(status_code=status.HTTP_403_FORBIDDEN, detail="Not authorized")
     
+    start_date = as_naive_utc(start_date)
+    end_date = as_naive_utc(end_date) or datetime.utcnow()
+    start_date = start_date or end_date - (timedelta(days=1) if granularity == "hour" else timedelta(days=30))
+    
+    if start_date >= end_date or end_date - start_date > USAGE_MAX_RANGE[granularity]:
+        raise HTTPException(
+            status_code=status.HTTP_400_BAD_REQUEST,
+            detail=f"Range must be positive and at most {USAGE_MAX_RANGE[granularity].days} days for {granularity} granularity"
+        )
+    
+    rollup = UsageHourly if granularity == "hour" else UsageDaily
+    # Buckets are keyed by their start, so the bucket containing start_date begins before it
+    range_start = start_date.replace(minute=0, second=0, microsecond=0) if granularity == "hour" else start_date.date()
+    range_end = end_date if granularity == "hour" else end_date.date()
+    
     result = await db.execute(
-        select(SubScriptionHistory).where(SubScriptionHistory.user_id == user_id).order_by(SubScriptionHistory.created_at.desc())
+        select(
+            rollup.bucket_start,
+            rollup.operation,
+            rollup.voice_id,
+            rollup.model,
+            rollup.requests,
+            rollup.characters,
+            rollup.audio_bytes
+        )
+        .where(
+            rollup.user_id == user_id,
+            rollup.bucket_start >= range_start,
+            rollup.bucket_start <= range_end
+        )
+        .order_by(rollup.bucket_start)
     )
     
-    return result.scalars().all()
\ No newline at end of file
+    return UsageResponse(
+        granularity=granularity,
+        start=start_date,
+        end=end_date,
+        items=[UsageBucket(**row._mapping) for row in result.all()]
+    )
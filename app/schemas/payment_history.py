@@ -1,17 +1,20 @@
 from pydantic import BaseModel
 from datetime import datetime
-from typing import Optional
+from typing import Optional, Any, Dict, List
 
 class PaymentHistoryBase(BaseModel):
     event_type: str
-    event_data: Optional[str] = None
+    event_data: Optional[Dict[str, Any]] = None
     
+# provider and external_id are only ever set server-side: payment webhooks trust rows keyed by them
 class PaymentHistoryCreate(PaymentHistoryBase):
     user_id: int
     
 class PaymentHistoryRead(PaymentHistoryBase):
     id: int
     user_id: int
+    provider: Optional[str] = None
+    external_id: Optional[str] = None
     created_at: datetime
     
     class Config:
@@ -19,5 +22,20 @@ class PaymentHistoryRead(PaymentHistoryBase):
         
 class PaymentHistoryUpdate(BaseModel):
     event_type: Optional[str] = None
-    event_data: Optional[str] = None
-    
\ No newline at end of file
+    event_data: Optional[Dict[str, Any]] = None
+        
+class PaymentHistorySummary(BaseModel):
+    id: int
+    user_id: int
+    event_type: str
+    provider: Optional[str] = None
+    external_id: Optional[str] = None
+    created_at: datetime
+    event_data: Optional[Dict[str, Any]] = None
+    
+    class Config:
+        orm_mode = True
+        
+class PaymentHistoryPage(BaseModel):
+    items: List[PaymentHistorySummary]
+    next_cursor: Optional[str] = None
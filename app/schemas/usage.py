@@ -0,0 +1,22 @@
+from pydantic import BaseModel
+from datetime import date, datetime
+from typing import List, Literal, Union
+
+class UsageBucket(BaseModel):
+    # Hourly buckets are timestamps, daily buckets are dates; datetime is tried first
+    bucket_start: Union[datetime, date]
+    operation: str
+    voice_id: str
+    model: str
+    requests: int
+    characters: int
+    audio_bytes: int
+    
+    class Config:
+        orm_mode = True
+        
+class UsageResponse(BaseModel):
+    granularity: Literal["hour", "day"]
+    start: datetime
+    end: datetime
+    items: List[UsageBucket]
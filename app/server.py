@@ -0,0 +1,93 @@
+import importlib.util
+import logging
+import multiprocessing
+import os
+import shutil
+import tempfile
+from gunicorn.app.base import BaseApplication
+from uvicorn.workers import UvicornWorker
+
+logger = logging.getLogger(__name__)
+
+BIND = os.environ.get("BIND", "0.0.0.0:8000")
+SSL_KEYFILE = os.environ.get("SSL_KEYFILE", "ssl/key.pem")
+SSL_CERTFILE = os.environ.get("SSL_CERTFILE", "ssl/cert.pem")
+# Long enough for a full TTS stream to finish plus the webhook queue and usage recorder drains
+# that run in each worker's lifespan shutdown
+GRACEFUL_TIMEOUT = int(os.environ.get("GRACEFUL_TIMEOUT", "60"))
+KEEPALIVE = 75
+# Recycle workers now and then so slow leaks in upstream SDKs cannot accumulate
+MAX_REQUESTS = 20000
+MAX_REQUESTS_JITTER = 2000
+
+def worker_count():
+    return max(int(os.environ.get("WEB_CONCURRENCY", multiprocessing.cpu_count())), 1)
+
+class ProductionWorker(UvicornWorker):
+    # uvloop and httptools are used when installed, with the pure-Python stack as fallback
+    CONFIG_KWARGS = {
+        "loop": "uvloop" if importlib.util.find_spec("uvloop") else "asyncio",
+        "http": "httptools" if importlib.util.find_spec("httptools") else "h11",
+        "lifespan": "on",
+    }
+
+def child_exit(server, worker):
+    if os.environ.get("PROMETHEUS_MULTIPROC_DIR"):
+        from prometheus_client import multiprocess
+        multiprocess.mark_process_dead(worker.pid)
+
+class ProductionServer(BaseApplication):
+    def __init__(self, options: dict):
+        self.options = options
+        super().__init__()
+
+    def load_config(self):
+        for key, value in self.options.items():
+            self.cfg.set(key, value)
+
+    def load(self):
+        # Imported in each worker after the fork, so engines, pools and event loops are never shared
+        from main import app
+        return app
+
+def prepare_environment(workers: int):
+    # Read by app.database to split DB_POOL_BUDGET and by the metrics endpoint to aggregate workers
+    os.environ["WEB_CONCURRENCY"] = str(workers)
+    metrics_dir = os.environ.setdefault(
+        "PROMETHEUS_MULTIPROC_DIR",
+        os.path.join(tempfile.gettempdir(), f"tts-api-metrics-{os.getpid()}")
+    )
+    shutil.rmtree(metrics_dir, ignore_errors=True)
+    os.makedirs(metrics_dir)
+
+def run():
+    workers = worker_count()
+    prepare_environment(workers)
+
+    options = {
+        "bind": BIND,
+        "workers": workers,
+        "worker_class": "app.server.ProductionWorker",
+        "graceful_timeout": GRACEFUL_TIMEOUT,
+        "timeout": GRACEFUL_TIMEOUT * 2,
+        "keepalive": KEEPALIVE,
+        "max_requests": MAX_REQUESTS,
+        "max_requests_jitter": MAX_REQUESTS_JITTER,
+        "preload_app": False,
+        "child_exit": child_exit,
+    }
+    if os.path.exists(SSL_KEYFILE) and os.path.exists(SSL_CERTFILE):
+        options.update(keyfile=SSL_KEYFILE, certfile=SSL_CERTFILE)
+
+    logger.info(
+        "Starting %s workers (loop=%s, http=%s)",
+        workers,
+        ProductionWorker.CONFIG_KWARGS["loop"],
+        ProductionWorker.CONFIG_KWARGS["http"]
+    )
+    # SIGHUP reloads gracefully (new workers start before old ones drain), SIGTERM drains and exits
+    ProductionServer(options).run()
+
+if __name__ == "__main__":
+    logging.basicConfig(level=logging.INFO)
+    run()
@@ -0,0 +1,129 @@
+import asyncio
+import time
+from typing import Hashable, Optional
+from app.services.fair_queue import FREE_TIER, FairQueue, Tier, Waiter
+
+class Overloaded(Exception):
+    def __init__(self, retry_after: float):
+        super().__init__(f"upstream overloaded, retry in {retry_after:.1f}s")
+        self.retry_after = retry_after
+
+class AdaptiveLimiter:
+    # AIMD on the in-flight limit: +1 per limit's worth of healthy responses (roughly one per round
+    # trip), halved on a 429/5xx/transport failure or a latency above the target, at most once per
+    # round trip so one burst of failures does not collapse the limit to the floor.
+    # The limit decides how many calls run; the fair queue decides whose call runs next.
+    def __init__(
+        self,
+        initial_limit: int,
+        min_limit: int,
+        max_limit: int,
+        latency_target: float,
+        backoff: float = 0.5
+    ):
+        self.limit = float(initial_limit)
+        self.min_limit = min_limit
+        self.max_limit = max_limit
+        self.latency_target = latency_target
+        self.backoff = backoff
+        self.in_flight = 0
+        self.latency = latency_target / 2
+        self.paused_until = 0.0
+        self.last_decrease = 0.0
+        self.queue = FairQueue()
+        self.wake_handle: Optional[asyncio.TimerHandle] = None
+
+    def has_capacity(self):
+        return self.in_flight < int(self.limit) and time.monotonic() >= self.paused_until
+
+    def expected_wait(self, waiter: Waiter):
+        # Requests with earlier finish tags drain at about `limit` per observed round trip
+        rounds = (self.queue.ahead(waiter) + 1) / max(int(self.limit), 1)
+        paused = max(self.paused_until - time.monotonic(), 0.0)
+        return max(paused, self.queue.rate_wait(waiter)) + rounds * self.latency
+
+    async def acquire(self, deadline: float, flow: Hashable = None, tier: Tier = FREE_TIER, cost: float = 1.0):
+        future = asyncio.get_running_loop().create_future()
+        waiter = self.queue.push(future, flow, tier, cost)
+        self.wake()
+        if future.done():
+            return waiter
+
+        wait = self.expected_wait(waiter)
+        if wait > deadline:
+            self.queue.discard(waiter)
+            raise Overloaded(wait)
+
+        try:
+            await asyncio.wait_for(asyncio.shield(future), deadline)
+        except (asyncio.TimeoutError, asyncio.CancelledError) as e:
+            if future.done() and not future.cancelled():
+                # A slot was handed over just as the wait ended; give it back
+                self.abandon(waiter)
+            else:
+                self.queue.discard(waiter)
+                future.cancel()
+            if isinstance(e, asyncio.CancelledError):
+                raise
+            raise Overloaded(self.expected_wait(waiter))
+        return waiter
+
+    def release(
+        self,
+        waiter: Waiter,
+        latency: Optional[float],
+        status_code: Optional[int] = None,
+        retry_after: Optional[float] = None
+    ):
+        self.in_flight -= 1
+        self.queue.done(waiter)
+        now = time.monotonic()
+        failed = status_code is None or status_code == 429 or status_code >= 500
+
+        if latency is not None and not failed:
+            self.latency = 0.8 * self.latency + 0.2 * latency
+
+        if failed or (latency is not None and latency > self.latency_target):
+            if now - self.last_decrease >= self.latency:
+                self.limit = max(self.limit * self.backoff, float(self.min_limit))
+                self.last_decrease = now
+        else:
+            self.limit = min(self.limit + 1 / self.limit, float(self.max_limit))
+
+        if retry_after:
+            self.paused_until = max(self.paused_until, now + retry_after)
+        self.wake()
+
+    def abandon(self, waiter: Waiter):
+        # Slot given back without an outcome worth learning from (a hand-over race or a local error)
+        self.in_flight -= 1
+        self.queue.done(waiter)
+        self.wake()
+
+    def wake(self):
+        while self.queue and self.has_capacity():
+            waiter = self.queue.pop()
+            if waiter is None:
+                break
+            self.in_flight += 1
+            waiter.future.set_result(None)
+        self.schedule_wake()
+
+    def schedule_wake(self):
+        # Nobody releases a slot while paused by Retry-After or while the only waiters are
+        # held back by an empty tier bucket, so a timer resumes the queue
+        if not self.queue or self.wake_handle is not None:
+            return
+        delay = self.paused_until - time.monotonic()
+        if delay <= 0:
+            if not self.has_capacity():
+                return
+            delay = self.queue.retry_in()
+            if delay is None:
+                return
+
+        def resume():
+            self.wake_handle = None
+            self.wake()
+
+        self.wake_handle = asyncio.get_running_loop().call_later(max(delay, 0.001), resume)
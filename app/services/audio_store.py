@@ -0,0 +1,50 @@
+import base64
+import hashlib
+import hmac
+import os
+import re
+import time
+from typing import Optional
+from app.config import settings
+from app.services.object_store import get_store
+
+AUDIO_NAME = re.compile(r"^[0-9a-f]{64}\.(mp3|wav|flac|pcm)$")
+# Signed download links; a CDN or separate static host can be put in front via AUDIO_URL_BASE
+AUDIO_URL_BASE = os.environ.get("AUDIO_URL_BASE", "")
+AUDIO_URL_PATH = "/audio"
+AUDIO_URL_TTL = int(os.environ.get("AUDIO_URL_TTL", "900"))
+AUDIO_URL_SECRET = os.environ.get("AUDIO_URL_SECRET", settings.SECRET_KEY).encode()
+
+def audio_name(content: bytes, extension: str):
+    # Content-addressed: identical audio is stored once and its name doubles as a strong ETag
+    return f"{hashlib.sha256(content).hexdigest()}.{extension}"
+
+def object_key(name: str):
+    # Two-level fan-out keeps directories (or key prefixes) small once millions of clips exist
+    return f"{name[:2]}/{name[2:4]}/{name}"
+
+def save(content: bytes, extension: str):
+    name = audio_name(content, extension)
+    store = get_store()
+    key = object_key(name)
+    if not store.exists(key):
+        store.put(key, content)
+    return name
+
+def resolve(name: str) -> Optional[str]:
+    if not AUDIO_NAME.match(name):
+        return None
+    return get_store().local_path(object_key(name))
+
+def signature(name: str, expires: int):
+    digest = hmac.new(AUDIO_URL_SECRET, f"{name}:{expires}".encode(), hashlib.sha256).digest()
+    return base64.urlsafe_b64encode(digest).rstrip(b"=").decode()
+
+def signed_url(name: str, ttl: int = AUDIO_URL_TTL):
+    expires = int(time.time()) + ttl
+    return f"{AUDIO_URL_BASE}{AUDIO_URL_PATH}/{name}?expires={expires}&signature={signature(name, expires)}", expires
+
+def verify(name: str, expires: int, provided: str):
+    if expires < time.time():
+        return False
+    return hmac.compare_digest(signature(name, expires), provided)
@@ -0,0 +1,133 @@
+import hashlib
+import json
+import time
+from collections import OrderedDict
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from typing import Optional, Tuple
+from sqlalchemy import exists, func, or_, select
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.jobs.payment_history_partitions import PENDING_PAYMENT_LOOKBACK
+from app.models.payment_history import PaymentHistory
+from app.services import metrics
+
+# Never hand out a cached checkout link older than this, even if the provider would keep it open longer
+MAX_TTL = 30 * 60
+MAX_ENTRIES = 10000
+# Rows written when a checkout is opened; any other row for the same upstream id means it was used
+CREATED_EVENT_TYPES = (
+    "checkout_session_created",
+    "character_payment_created",
+    "voice_payment_created",
+    "subscription_created",
+    "one_time_payment_created",
+)
+
+CacheKey = Tuple[str, int, str, str]
+
+@dataclass
+class CheckoutEntry:
+    url: str
+    external_id: str
+    fingerprint: str
+    expires_at: float
+
+_entries: "OrderedDict[CacheKey, CheckoutEntry]" = OrderedDict()
+
+def make_key(provider: str, user_id: int, product: str, tier: str):
+    return (provider, user_id, product, tier)
+
+def fingerprint(params: dict):
+    return hashlib.sha256(json.dumps(params, sort_keys=True, default=str).encode()).hexdigest()
+
+async def checkout_generation(db: AsyncSession, provider: str, user_id: int):
+    # Latest of the user's rows that ends a checkout attempt: a completion, or a checkout opened more
+    # than MAX_TTL ago and left unused. Rows for a checkout still open do not count, so every submit
+    # until it is used or abandoned sees the same value, in any worker
+    now = datetime.utcnow()
+    result = await db.execute(
+        select(func.max(PaymentHistory.id)).where(
+            PaymentHistory.user_id == user_id,
+            PaymentHistory.provider == provider,
+            PaymentHistory.created_at >= now - PENDING_PAYMENT_LOOKBACK,
+            or_(
+                PaymentHistory.event_type.not_in(CREATED_EVENT_TYPES),
+                PaymentHistory.created_at < now - timedelta(seconds=MAX_TTL)
+            )
+        )
+    )
+    return result.scalar() or 0
+
+async def idempotency_key(db: AsyncSession, key: CacheKey, params_fingerprint: str):
+    # Built from stable inputs only, so double-clicks and retries share one upstream session however
+    # far apart they land, while a repeat purchase after the previous one completed gets a fresh one
+    generation = await checkout_generation(db, key[0], key[1])
+    raw = ":".join(str(part) for part in key) + f":{params_fingerprint}:{generation}"
+    return hashlib.sha256(raw.encode()).hexdigest()
+
+def get(key: CacheKey, params_fingerprint: str):
+    entry = _entries.get(key)
+    if entry is None:
+        metrics.cache_lookup("checkout", False)
+        return None
+
+    if entry.expires_at <= time.monotonic() or entry.fingerprint != params_fingerprint:
+        del _entries[key]
+        metrics.cache_lookup("checkout", False)
+        return None
+
+    _entries.move_to_end(key)
+    metrics.cache_lookup("checkout", True)
+    return entry
+
+def put(
+    key: CacheKey,
+    url: str,
+    external_id: str,
+    params_fingerprint: str,
+    provider_expires_at: Optional[int] = None
+):
+    ttl = MAX_TTL
+    if provider_expires_at:
+        ttl = min(ttl, provider_expires_at - time.time())
+    if ttl <= 0:
+        return
+
+    _entries[key] = CheckoutEntry(
+        url=url,
+        external_id=external_id,
+        fingerprint=params_fingerprint,
+        expires_at=time.monotonic() + ttl
+    )
+    _entries.move_to_end(key)
+
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+async def is_completed(db: AsyncSession, provider: str, external_id: str):
+    result = await db.execute(
+        select(
+            exists().where(
+                PaymentHistory.provider == provider,
+                PaymentHistory.external_id == external_id,
+                PaymentHistory.created_at >= datetime.utcnow() - timedelta(seconds=MAX_TTL),
+                PaymentHistory.event_type.not_in(CREATED_EVENT_TYPES)
+            )
+        )
+    )
+    return result.scalar()
+
+async def lookup(db: AsyncSession, key: CacheKey, params_fingerprint: str):
+    # The entry is per process but completion webhooks are processed by whichever worker claims
+    # them, so a hit is confirmed against payment_history, which every worker shares
+    entry = get(key, params_fingerprint)
+    if entry is None:
+        return None
+    if await is_completed(db, key[0], entry.external_id):
+        _entries.pop(key, None)
+        return None
+    return entry
+
+def invalidate_user(provider: str, user_id: int):
+    for key in [key for key in _entries if key[0] == provider and key[1] == user_id]:
+        del _entries[key]
@@ -0,0 +1,128 @@
+from dataclasses import dataclass
+from datetime import datetime, timedelta
+from functools import lru_cache
+from typing import Dict, Optional, Tuple
+from fastapi import HTTPException, status
+from sqlalchemy import update
+from sqlalchemy.ext.asyncio import AsyncSession
+from app.config import settings
+from app.models.user import User
+
+SUBSCRIPTION_PERIOD = timedelta(days=30)
+
+@dataclass(frozen=True)
+class Entitlement:
+    # One-off credits are added to the purchased balances
+    character_credits: int = 0
+    voice_credits: int = 0
+    # Plan quotas replace the monthly balances when a period starts
+    month_character_quota: Optional[int] = None
+    month_voice_quota: Optional[int] = None
+
+PRO_PLAN = Entitlement(month_character_quota=2000000, month_voice_quota=2)
+BUSINESS_PLAN = Entitlement(month_character_quota=8000000, month_voice_quota=10)
+
+PACKS = {
+    ("character_pack", "small"): Entitlement(character_credits=500000),
+    ("character_pack", "medium"): Entitlement(character_credits=1000000),
+    ("character_pack", "large"): Entitlement(character_credits=5000000),
+    ("character_pack", "enterprise"): Entitlement(character_credits=20000000),
+    ("voice_clone", "pro"): Entitlement(voice_credits=1),
+    ("voice_clone", "business"): Entitlement(voice_credits=1),
+}
+
+@lru_cache(maxsize=1)
+def load_catalog() -> Dict[Tuple[str, str], Entitlement]:
+    catalog = {("plan", plan_id): PRO_PLAN for plan_id in (settings.STRIPE_PRO_PRICE_ID, settings.PAYPAL_PRO_PALN_ID) if plan_id}
+    catalog.update(
+        {("plan", plan_id): BUSINESS_PLAN for plan_id in (settings.STRIPE_BUSINESS_PRICE_ID, settings.PAYPAL_BUSINESS_PLAN_ID) if plan_id}
+    )
+    catalog.update(PACKS)
+    return catalog
+
+def plan_entitlement(plan_id: Optional[str]):
+    return load_catalog().get(("plan", plan_id))
+
+def pack_entitlement(product_type: Optional[str], tier: Optional[str]):
+    return load_catalog().get((product_type, tier))
+
+def product_for_tier(tier: Optional[str]):
+    for product_type, pack_tier in PACKS:
+        if pack_tier == tier:
+            return product_type
+    return None
+
+def grant_values(entitlement: Optional[Entitlement]):
+    values = {}
+    if entitlement is None:
+        return values
+
+    if entitlement.character_credits:
+        values["character_balance"] = User.character_balance + entitlement.character_credits
+    if entitlement.voice_credits:
+        values["voice_balance"] = User.voice_balance + entitlement.voice_credits
+    if entitlement.month_character_quota is not None:
+        values["month_character_balance"] = entitlement.month_character_quota
+    if entitlement.month_voice_quota is not None:
+        values["month_voice_balance"] = entitlement.month_voice_quota
+    return values
+
+def period_values(start: Optional[datetime] = None):
+    start = start or datetime.utcnow()
+    return {
+        "subsrciption_start_date": start.isoformat(),
+        "subscription_end_date": start + SUBSCRIPTION_PERIOD
+    }
+
+async def apply_user_update(db: AsyncSession, user_id: int, values: dict):
+    # Runs in the caller's transaction; the caller commits it together with the matching history row
+    result = await db.execute(
+        update(User)
+        .where(User.id == user_id)
+        .values(**values)
+        .returning(
+            User.id,
+            User.character_balance,
+            User.voice_balance,
+            User.month_character_balance,
+            User.month_voice_balance
+        )
+    )
+    row = result.first()
+
+    if row is None:
+        raise HTTPException(
+            status_code=status.HTTP_404_NOT_FOUND,
+            detail="User not found"
+        )
+
+    return row
+
+async def update_subscription(
+    db: AsyncSession,
+    user_id: int,
+    subscription_id: Optional[str] = None,
+    plan_id: Optional[str] = None,
+    sub_status=None,
+    payment_method: Optional[str] = None
+):
+    values = {}
+    if subscription_id:
+        values["subscription_id"] = subscription_id
+    if plan_id:
+        values["subscription_plan_id"] = plan_id
+    if sub_status:
+        values["subscription_status"] = sub_status.name
+    if payment_method:
+        values["payment_method"] = payment_method
+
+    if sub_status is not None and sub_status.name == "ACTIVE":
+        values.update(grant_values(plan_entitlement(plan_id)))
+        values.update(period_values())
+
+    return await apply_user_update(db, user_id, values)
+
+async def grant_pack(db: AsyncSession, user_id: int, product_type: str, tier: str, payment_method: str):
+    values = grant_values(pack_entitlement(product_type, tier))
+    values["payment_method"] = payment_method
+    return await apply_user_update(db, user_id, values)
@@ -0,0 +1,266 @@
+import asyncio
+import heapq
+import itertools
+import os
+import time
+from dataclasses import dataclass
+from typing import Dict, Hashable, List, Optional, Set, Tuple
+from app.models.user import User
+from app.schemas.user import SubscriptionStatus
+from app.services.entitlements import BUSINESS_PLAN, PRO_PLAN, plan_entitlement
+
+@dataclass(frozen=True)
+class Tier:
+    name: str
+    # Share of contended upstream capacity relative to other backlogged users
+    weight: float
+    # In-flight upstream calls a single user of this tier may hold
+    max_concurrent: int
+    # Requests per second admitted for the whole tier, refilled continuously up to burst
+    rate: float
+    burst: float
+
+def tier_from_env(name: str, weight: float, max_concurrent: int, rate: float, burst: float):
+    # Overridable per tier, e.g. FAIR_QUEUE_PRO_WEIGHT=4 or FAIR_QUEUE_FREE_RATE=2
+    prefix = f"FAIR_QUEUE_{name.upper()}_"
+    return Tier(
+        name,
+        weight=float(os.environ.get(prefix + "WEIGHT", weight)),
+        max_concurrent=int(os.environ.get(prefix + "MAX_CONCURRENT", max_concurrent)),
+        rate=float(os.environ.get(prefix + "RATE", rate)),
+        burst=float(os.environ.get(prefix + "BURST", burst))
+    )
+
+BUSINESS_TIER = tier_from_env("business", weight=8, max_concurrent=8, rate=30.0, burst=60)
+PRO_TIER = tier_from_env("pro", weight=3, max_concurrent=4, rate=15.0, burst=30)
+FREE_TIER = tier_from_env("free", weight=1, max_concurrent=2, rate=4.0, burst=8)
+TIERS = (BUSINESS_TIER, PRO_TIER, FREE_TIER)
+
+def tier_for(user: Optional[User]):
+    # Lapsed, cancelled or suspended subscriptions fall back to the free share
+    if user is None or user.subscription_status != SubscriptionStatus.ACTIVE:
+        return FREE_TIER
+    entitlement = plan_entitlement(user.subscription_plan_id)
+    if entitlement == BUSINESS_PLAN:
+        return BUSINESS_TIER
+    if entitlement == PRO_PLAN:
+        return PRO_TIER
+    return FREE_TIER
+
+class TokenBucket:
+    def __init__(self, rate: float, burst: float):
+        self.rate = rate
+        self.burst = burst
+        self.tokens = burst
+        self.updated = time.monotonic()
+
+    def refill(self):
+        now = time.monotonic()
+        self.tokens = min(self.tokens + (now - self.updated) * self.rate, self.burst)
+        self.updated = now
+
+    def available(self):
+        self.refill()
+        return self.tokens >= 1
+
+    def take(self):
+        self.tokens -= 1
+
+    def wait_time(self, queued: int = 0):
+        # Time until a token is free for the request behind `queued` others of the same tier
+        self.refill()
+        return max(queued + 1 - self.tokens, 0.0) / self.rate
+
+@dataclass(eq=False)
+class Waiter:
+    future: asyncio.Future
+    flow: Hashable
+    tier: Tier
+    start: float
+    finish: float
+
+class Backlog:
+    # One user's queued requests in push order, which is also finish-tag order. Popped from the
+    # front by advancing an offset so the list is not shifted on every pop
+    def __init__(self):
+        self.waiters: List[Waiter] = []
+        self.head = 0
+
+    def __len__(self):
+        return len(self.waiters) - self.head
+
+    def first(self):
+        return self.waiters[self.head]
+
+    def append(self, waiter: Waiter):
+        self.waiters.append(waiter)
+
+    def popleft(self):
+        waiter = self.waiters[self.head]
+        self.head += 1
+        if self.head * 2 >= len(self.waiters):
+            del self.waiters[:self.head]
+            self.head = 0
+        return waiter
+
+    def remove(self, waiter: Waiter) -> Optional[int]:
+        # Position of the removed waiter from the front, or None if it is not queued here
+        for index in range(self.head, len(self.waiters)):
+            if self.waiters[index] is waiter:
+                del self.waiters[index]
+                return index - self.head
+        return None
+
+    def after(self, position: int):
+        return self.waiters[self.head + position:]
+
+    def count_before(self, finish: float):
+        low, high = self.head, len(self.waiters)
+        while low < high:
+            middle = (low + high) // 2
+            if self.waiters[middle].finish < finish:
+                low = middle + 1
+            else:
+                high = middle
+        return low - self.head
+
+class FairQueue:
+    # Weighted fair queueing across users by virtual finish time: each request starts at
+    # max(virtual time, the user's previous finish), finishes cost / weight later, and the smallest
+    # eligible finish tag goes next, so a backlogged heavy user only delays others by its weighted
+    # share. A request is eligible when its user is under the tier's concurrency cap and the tier
+    # bucket has a token.
+    # A user's tags only grow, so only the head of each backlog competes: every tier keeps a heap
+    # of the heads of its users that are under the cap, and pop compares one head per tier. Heap
+    # entries are invalidated lazily through `scheduled`, which holds each user's current entry.
+    def __init__(self, tiers=TIERS):
+        self.buckets: Dict[str, TokenBucket] = {tier.name: TokenBucket(tier.rate, tier.burst) for tier in tiers}
+        self.backlogs: Dict[Hashable, Backlog] = {}
+        self.tier_flows: Dict[str, Set[Hashable]] = {tier.name: set() for tier in tiers}
+        self.ready: Dict[str, List[Tuple[float, int, Waiter]]] = {tier.name: [] for tier in tiers}
+        self.scheduled: Dict[Hashable, int] = {}
+        self.sequence = itertools.count()
+        self.size = 0
+        self.virtual_time = 0.0
+        self.last_finish: Dict[Hashable, float] = {}
+        self.running: Dict[Hashable, int] = {}
+
+    def __len__(self):
+        return self.size
+
+    def push(self, future: asyncio.Future, flow: Hashable, tier: Tier, cost: float = 1.0):
+        start = max(self.virtual_time, self.last_finish.get(flow, 0.0))
+        waiter = Waiter(future, flow, tier, start, start + cost / tier.weight)
+        self.last_finish[flow] = waiter.finish
+        backlog = self.backlogs.get(flow)
+        if backlog is None:
+            backlog = self.backlogs[flow] = Backlog()
+        backlog.append(waiter)
+        self.tier_flows[tier.name].add(flow)
+        self.size += 1
+        if len(backlog) == 1:
+            self.schedule(flow)
+        return waiter
+
+    def schedule(self, flow: Hashable):
+        # Enters the user's current head in its tier heap; any earlier entry for the user goes stale
+        self.scheduled.pop(flow, None)
+        backlog = self.backlogs.get(flow)
+        if not backlog:
+            return
+        head = backlog.first()
+        if self.running.get(flow, 0) >= head.tier.max_concurrent:
+            return
+        sequence = next(self.sequence)
+        self.scheduled[flow] = sequence
+        heapq.heappush(self.ready[head.tier.name], (head.finish, sequence, head))
+
+    def peek(self, tier_name: str):
+        heap = self.ready[tier_name]
+        while heap and self.scheduled.get(heap[0][2].flow) != heap[0][1]:
+            heapq.heappop(heap)
+        return heap[0] if heap else None
+
+    def drop_backlog(self, flow: Hashable):
+        del self.backlogs[flow]
+        self.scheduled.pop(flow, None)
+        for flows in self.tier_flows.values():
+            flows.discard(flow)
+
+    def discard(self, waiter: Waiter):
+        # A shed or timed-out request never ran, so the user's later requests and next push move up
+        # by its share instead of being charged for it
+        backlog = self.backlogs.get(waiter.flow)
+        position = backlog.remove(waiter) if backlog is not None else None
+        if position is None:
+            return
+        self.size -= 1
+        share = waiter.finish - waiter.start
+        for other in backlog.after(position):
+            other.start -= share
+            other.finish -= share
+        if waiter.flow in self.last_finish:
+            self.last_finish[waiter.flow] -= share
+
+        if not backlog:
+            self.drop_backlog(waiter.flow)
+        elif position == 0:
+            self.schedule(waiter.flow)
+        self.forget(waiter.flow)
+
+    def pop(self) -> Optional[Waiter]:
+        best = None
+        for tier_name, bucket in self.buckets.items():
+            entry = self.peek(tier_name)
+            if entry is not None and (best is None or entry[:2] < best[:2]) and bucket.available():
+                best = entry
+        if best is None:
+            return None
+
+        waiter = best[2]
+        heapq.heappop(self.ready[waiter.tier.name])
+        backlog = self.backlogs[waiter.flow]
+        backlog.popleft()
+        self.size -= 1
+        self.buckets[waiter.tier.name].take()
+        self.running[waiter.flow] = self.running.get(waiter.flow, 0) + 1
+        self.virtual_time = max(self.virtual_time, waiter.start)
+        if backlog:
+            self.schedule(waiter.flow)
+        else:
+            self.drop_backlog(waiter.flow)
+        return waiter
+
+    def done(self, waiter: Waiter):
+        self.running[waiter.flow] -= 1
+        if self.running[waiter.flow] <= 0:
+            del self.running[waiter.flow]
+        # A user held back by the concurrency cap competes again once a slot is back
+        if waiter.flow in self.backlogs and waiter.flow not in self.scheduled:
+            self.schedule(waiter.flow)
+        self.forget(waiter.flow)
+
+    def forget(self, flow: Hashable):
+        # A user with nothing queued or running restarts at the current virtual time,
+        # which also keeps the map bounded to active users
+        if flow not in self.running and flow not in self.backlogs:
+            self.last_finish.pop(flow, None)
+
+    def ahead(self, waiter: Waiter):
+        return sum(backlog.count_before(waiter.finish) for backlog in self.backlogs.values())
+
+    def rate_wait(self, waiter: Waiter):
+        queued = sum(
+            self.backlogs[flow].count_before(waiter.finish)
+            for flow in self.tier_flows[waiter.tier.name]
+        )
+        return self.buckets[waiter.tier.name].wait_time(queued)
+
+    def retry_in(self):
+        # Soonest time a waiter held back only by an empty tier bucket could go
+        delays = [
+            bucket.wait_time()
+            for tier_name, bucket in self.buckets.items()
+            if self.peek(tier_name) is not None
+        ]
+        return min(delays) if delays else None
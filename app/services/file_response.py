@@ -0,0 +1,188 @@
+import asyncio
+import os
+import secrets
+from typing import List, Optional, Tuple
+from starlette.datastructures import Headers
+from starlette.responses import Response
+
+CHUNK_SIZE = 256 * 1024
+# More ranges than this are answered with the full body instead of a huge multipart response
+MAX_RANGES = 16
+ZERO_COPY = "http.response.zerocopysend"
+
+ByteRange = Tuple[int, int]
+
+class RangeNotSatisfiable(Exception):
+    pass
+
+def parse_range(header: str, size: int) -> Optional[List[ByteRange]]:
+    # Returns inclusive (start, end) pairs, or None when the header should be ignored
+    unit, _, spec = header.partition("=")
+    if unit.strip().lower() != "bytes" or not spec:
+        return None
+
+    ranges = []
+    for part in spec.split(","):
+        first, dash, last = part.strip().partition("-")
+        if not dash:
+            return None
+        try:
+            if not first:
+                suffix = int(last)
+                if suffix <= 0:
+                    continue
+                ranges.append((max(size - suffix, 0), size - 1))
+            else:
+                start = int(first)
+                end = int(last) if last else size - 1
+                if end < start:
+                    return None
+                if start >= size:
+                    continue
+                ranges.append((start, min(end, size - 1)))
+        except ValueError:
+            return None
+
+    if not ranges:
+        raise RangeNotSatisfiable()
+    if len(ranges) > MAX_RANGES:
+        return None
+    return coalesce(ranges)
+
+def coalesce(ranges: List[ByteRange]):
+    merged: List[ByteRange] = []
+    for start, end in sorted(ranges):
+        if merged and start <= merged[-1][1] + 1:
+            merged[-1] = (merged[-1][0], max(merged[-1][1], end))
+        else:
+            merged.append((start, end))
+    return merged
+
+def etag_matches(header: Optional[str], etag: str):
+    if not header:
+        return False
+    candidates = [candidate.strip() for candidate in header.split(",")]
+    return "*" in candidates or etag in candidates or f"W/{etag}" in candidates
+
+# Strong-ETag revalidation plus single and multi Range support. Bodies go out through the ASGI
+# zero-copy send extension (sendfile) when the server offers it, otherwise as positional reads
+# off the event loop.
+class RangedFileResponse(Response):
+    def __init__(
+        self,
+        path: str,
+        request_headers: Headers,
+        etag: str,
+        media_type: str,
+        headers: Optional[dict] = None
+    ):
+        self.path = path
+        self.request_headers = request_headers
+        self.etag = f'"{etag}"'
+        self.media_type = media_type
+        self.extra_headers = headers or {}
+        self.background = None
+        self.status_code = 200
+        self.raw_headers = []
+
+    def base_headers(self, size: Optional[int] = None):
+        headers = {
+            "accept-ranges": "bytes",
+            "etag": self.etag,
+            # Content-addressed, so the bytes behind a name never change
+            "cache-control": "private, max-age=31536000, immutable",
+            **self.extra_headers
+        }
+        if size is not None:
+            headers["content-length"] = str(size)
+        return headers
+
+    async def __call__(self, scope, receive, send):
+        send_body = scope["method"] != "HEAD"
+
+        if etag_matches(self.request_headers.get("if-none-match"), self.etag):
+            await self.start(send, 304, self.base_headers())
+            await send({"type": "http.response.body", "body": b""})
+            return
+
+        size = os.stat(self.path).st_size
+        ranges = None
+        range_header = self.request_headers.get("range")
+        if_range = self.request_headers.get("if-range")
+        if range_header and (if_range is None or if_range.strip() == self.etag):
+            try:
+                ranges = parse_range(range_header, size)
+            except RangeNotSatisfiable:
+                await self.start(send, 416, {**self.base_headers(0), "content-range": f"bytes */{size}"})
+                await send({"type": "http.response.body", "body": b""})
+                return
+
+        fd = os.open(self.path, os.O_RDONLY)
+        try:
+            if not ranges:
+                await self.start(send, 200, {**self.base_headers(size), "content-type": self.media_type})
+                if send_body:
+                    await self.send_segment(scope, send, fd, 0, size)
+            elif len(ranges) == 1:
+                start, end = ranges[0]
+                headers = {
+                    **self.base_headers(end - start + 1),
+                    "content-type": self.media_type,
+                    "content-range": f"bytes {start}-{end}/{size}"
+                }
+                await self.start(send, 206, headers)
+                if send_body:
+                    await self.send_segment(scope, send, fd, start, end - start + 1)
+            else:
+                await self.send_multipart(scope, send, fd, ranges, size, send_body)
+            await send({"type": "http.response.body", "body": b""})
+        finally:
+            os.close(fd)
+
+    async def send_multipart(self, scope, send, fd: int, ranges: List[ByteRange], size: int, send_body: bool):
+        boundary = secrets.token_hex(16)
+        part_headers = [
+            (
+                f"--{boundary}\r\nContent-Type: {self.media_type}\r\n"
+                f"Content-Range: bytes {start}-{end}/{size}\r\n\r\n"
+            ).encode()
+            for start, end in ranges
+        ]
+        closing = f"\r\n--{boundary}--\r\n".encode()
+        length = sum(len(header) for header in part_headers) + len(closing)
+        length += sum(end - start + 1 for start, end in ranges) + 2 * (len(ranges) - 1)
+
+        headers = {
+            **self.base_headers(length),
+            "content-type": f"multipart/byteranges; boundary={boundary}"
+        }
+        await self.start(send, 206, headers)
+        if not send_body:
+            return
+
+        for index, ((start, end), header) in enumerate(zip(ranges, part_headers)):
+            prefix = header if index == 0 else b"\r\n" + header
+            await send({"type": "http.response.body", "body": prefix, "more_body": True})
+            await self.send_segment(scope, send, fd, start, end - start + 1)
+        await send({"type": "http.response.body", "body": closing, "more_body": True})
+
+    async def start(self, send, status_code: int, headers: dict):
+        await send({
+            "type": "http.response.start",
+            "status": status_code,
+            "headers": [(key.encode(), value.encode()) for key, value in headers.items()]
+        })
+
+    async def send_segment(self, scope, send, fd: int, offset: int, count: int):
+        if ZERO_COPY in scope.get("extensions", {}):
+            await send({"type": ZERO_COPY, "file": fd, "offset": offset, "count": count, "more_body": True})
+            return
+
+        loop = asyncio.get_running_loop()
+        while count > 0:
+            chunk = await loop.run_in_executor(None, os.pread, fd, min(CHUNK_SIZE, count), offset)
+            if not chunk:
+                break
+            offset += len(chunk)
+            count -= len(chunk)
+            await send({"type": "http.response.body", "body": chunk, "more_body": True})
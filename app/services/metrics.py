@@ -0,0 +1,162 @@
+import os
+import re
+import time
+from contextlib import contextmanager
+from typing import Optional
+from prometheus_client import CollectorRegistry, Counter, Gauge, Histogram, multiprocess
+from starlette.routing import Match
+
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1.0, 2.5, 5.0, 10.0, 30.0, 60.0)
+# Upstream ids (PayPal orders/subscriptions, Stripe objects) are collapsed so label cardinality stays bounded
+ID_SEGMENT = re.compile(r"^([A-Z0-9-]{8,}|[a-z]+_[A-Za-z0-9]{8,}|\d+)$")
+# Set by the multi-worker launcher; every worker then writes its samples to shared files
+MULTIPROCESS = "PROMETHEUS_MULTIPROC_DIR" in os.environ
+
+HTTP_REQUEST_SECONDS = Histogram(
+    "http_request_duration_seconds",
+    "Time from request start until the response body is fully sent",
+    ["method", "route", "status"],
+    buckets=LATENCY_BUCKETS
+)
+HTTP_IN_FLIGHT = Gauge(
+    "http_requests_in_flight",
+    "Requests currently being handled",
+    ["method", "route"],
+    multiprocess_mode="livesum"
+)
+
+UPSTREAM_SECONDS = Histogram(
+    "upstream_request_duration_seconds",
+    "Outbound call latency by provider and endpoint",
+    ["provider", "endpoint", "status"],
+    buckets=LATENCY_BUCKETS
+)
+UPSTREAM_RESPONSE_BYTES = Counter(
+    "upstream_response_bytes_total",
+    "Response bytes received from upstream providers",
+    ["provider", "endpoint"]
+)
+
+UPSTREAM_CONCURRENCY_LIMIT = Gauge(
+    "upstream_concurrency_limit",
+    "Current adaptive in-flight limit per provider",
+    ["provider"],
+    multiprocess_mode="livesum"
+)
+UPSTREAM_SHED = Counter(
+    "upstream_shed_total",
+    "Requests rejected with 503 because the upstream queue wait would exceed its deadline",
+    ["provider", "endpoint", "tier"]
+)
+
+DB_POOL_WAIT_SECONDS = Histogram(
+    "db_pool_wait_seconds",
+    "Time spent waiting to check a connection out of the pool",
+    buckets=(0.0005, 0.001, 0.005, 0.01, 0.05, 0.1, 0.5, 1.0, 5.0, 30.0)
+)
+DB_POOL_SIZE = Gauge("db_pool_size", "Configured number of persistent pool connections", multiprocess_mode="livesum")
+DB_POOL_CHECKED_OUT = Gauge("db_pool_checked_out", "Connections currently checked out of the pool", multiprocess_mode="livesum")
+DB_POOL_OVERFLOW = Gauge("db_pool_overflow", "Overflow connections currently open beyond the pool size", multiprocess_mode="livesum")
+
+CACHE_LOOKUPS = Counter(
+    "cache_lookups_total",
+    "In-process cache lookups; hit ratio is hits / (hits + misses)",
+    ["cache", "result"]
+)
+
+def register_pool(pool):
+    # QueuePool counts overflow from -pool_size while the pool is still filling up
+    overflow = lambda: max(pool.overflow(), 0)
+    if not MULTIPROCESS:
+        DB_POOL_SIZE.set_function(pool.size)
+        DB_POOL_CHECKED_OUT.set_function(pool.checkedout)
+        DB_POOL_OVERFLOW.set_function(overflow)
+        return
+
+    # Callback gauges are not shared across processes, so values are pushed on every checkout/checkin
+    from sqlalchemy import event
+
+    def update(*_):
+        DB_POOL_CHECKED_OUT.set(pool.checkedout())
+        DB_POOL_OVERFLOW.set(overflow())
+
+    DB_POOL_SIZE.set(pool.size())
+    event.listen(pool, "checkout", update)
+    event.listen(pool, "checkin", update)
+
+def registry():
+    if not MULTIPROCESS:
+        return None
+    collector_registry = CollectorRegistry()
+    multiprocess.MultiProcessCollector(collector_registry)
+    return collector_registry
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.labels(cache, "hit" if hit else "miss").inc()
+
+def endpoint_label(path: str):
+    path = path.split("?", 1)[0]
+    return "/".join("{id}" if ID_SEGMENT.match(segment) else segment for segment in path.split("/"))
+
+def observe_upstream(
+    provider: str,
+    endpoint: str,
+    seconds: float,
+    status_code: Optional[int] = None,
+    response_bytes: int = 0
+):
+    UPSTREAM_SECONDS.labels(provider, endpoint, str(status_code) if status_code else "error").observe(seconds)
+    if response_bytes:
+        UPSTREAM_RESPONSE_BYTES.labels(provider, endpoint).inc(response_bytes)
+
+@contextmanager
+def track_upstream(provider: str, endpoint: str):
+    # For SDK calls that raise instead of returning a status; the outcome is recorded on exit
+    started = time.perf_counter()
+    outcome = {"status": 200}
+    try:
+        yield outcome
+    except Exception as e:
+        outcome["status"] = getattr(e, "http_status", None) or getattr(e, "status_code", None)
+        raise
+    finally:
+        observe_upstream(provider, endpoint, time.perf_counter() - started, outcome["status"])
+
+def route_label(scope):
+    app = scope.get("app")
+    if app is None:
+        return "unmatched"
+    for route in app.router.routes:
+        match, _ = route.matches(scope)
+        if match == Match.FULL:
+            return route.path
+    return "unmatched"
+
+class MetricsMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http":
+            await self.app(scope, receive, send)
+            return
+
+        method = scope["method"]
+        # Route templates, not raw paths, so /api/users/1 and /api/users/2 share one series
+        route = route_label(scope)
+        status_code = 500
+        in_flight = HTTP_IN_FLIGHT.labels(method, route)
+
+        async def send_wrapper(message):
+            nonlocal status_code
+            if message["type"] == "http.response.start":
+                status_code = message["status"]
+            await send(message)
+
+        in_flight.inc()
+        started = time.perf_counter()
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            in_flight.dec()
+            HTTP_REQUEST_SECONDS.labels(method, route, str(status_code)).observe(time.perf_counter() - started)
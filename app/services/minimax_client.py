@@ -0,0 +1,156 @@
+import asyncio
+import contextvars
+import functools
+import os
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.utils import parsedate_to_datetime
+from typing import Optional
+import requests
+from fastapi import HTTPException, status
+from requests.adapters import HTTPAdapter
+from app.services import metrics, tracing
+from app.models.user import User
+from app.services.adaptive_limiter import AdaptiveLimiter, Overloaded
+from app.services.fair_queue import tier_for
+
+# Point at a local Minimax stand-in (benchmarks/fake_upstreams.py) for benchmarks
+MINIMAX_API_BASE = os.environ.get("MINIMAX_API_BASE", "https://api.minimax.io")
+POOL_SIZE = 32
+
+# Admission control: the in-flight limit adapts between the bounds from latency and 429/5xx,
+# and callers that would queue longer than QUEUE_TIMEOUT are shed with a 503
+MIN_CONCURRENCY = int(os.environ.get("MINIMAX_MIN_CONCURRENCY", "2"))
+MAX_CONCURRENCY = int(os.environ.get("MINIMAX_MAX_CONCURRENCY", str(POOL_SIZE)))
+INITIAL_CONCURRENCY = int(os.environ.get("MINIMAX_INITIAL_CONCURRENCY", "8"))
+LATENCY_TARGET = float(os.environ.get("MINIMAX_LATENCY_TARGET", "10.0"))
+QUEUE_TIMEOUT = float(os.environ.get("MINIMAX_QUEUE_TIMEOUT", "5.0"))
+REQUEST_TIMEOUT = 60
+# Used when a 429/503 arrives without a Retry-After header
+DEFAULT_RETRY_AFTER = 1.0
+# base_resp codes: 1002 rate limited, 1039 token rate limited, 2013 invalid parameters
+RATE_LIMIT_CODES = (1002, 1039)
+INVALID_PARAMS_CODE = 2013
+
+# One keep-alive session instead of a fresh TCP/TLS handshake per call
+_session = requests.Session()
+_session.mount(MINIMAX_API_BASE, HTTPAdapter(pool_connections=1, pool_maxsize=POOL_SIZE))
+
+limiter = AdaptiveLimiter(INITIAL_CONCURRENCY, MIN_CONCURRENCY, MAX_CONCURRENCY, LATENCY_TARGET)
+# Own threads rather than the default executor, which file serving and audio writes share: the
+# limiter alone bounds concurrency, and executor queueing is never mistaken for upstream latency
+_executor = ThreadPoolExecutor(max_workers=MAX_CONCURRENCY, thread_name_prefix="minimax")
+
+def post(endpoint: str, url: str, **kwargs):
+    started = time.perf_counter()
+    status_code = None
+    response_bytes = 0
+    try:
+        with tracing.span("minimax", endpoint=endpoint) as current:
+            response = _session.post(url, **kwargs)
+            status_code = response.status_code
+            response_bytes = len(response.content)
+            tracing.set_attributes(current, status=status_code, bytes=response_bytes)
+        return response
+    finally:
+        metrics.observe_upstream("minimax", endpoint, time.perf_counter() - started, status_code, response_bytes)
+
+def retry_after(response: requests.Response) -> Optional[float]:
+    value = response.headers.get("Retry-After")
+    if value is None:
+        return DEFAULT_RETRY_AFTER if response.status_code in (429, 503) else None
+    try:
+        return max(float(value), 0.0)
+    except ValueError:
+        pass
+    try:
+        return max(parsedate_to_datetime(value).timestamp() - time.time(), 0.0)
+    except (TypeError, ValueError):
+        return DEFAULT_RETRY_AFTER
+
+def overloaded(retry_seconds: float, detail: str = "TTS service is busy, please retry"):
+    return HTTPException(
+        status_code=status.HTTP_503_SERVICE_UNAVAILABLE,
+        detail=detail,
+        headers={"Retry-After": str(max(int(retry_seconds + 0.999), 1))}
+    )
+
+async def request(
+    endpoint: str,
+    url: str,
+    user: Optional[User] = None,
+    cost: float = 1.0,
+    queue_timeout: float = QUEUE_TIMEOUT,
+    **kwargs
+):
+    # Async entry point for request handlers: admission first, then the blocking call in a thread.
+    # Contended capacity is shared per user by subscription tier, weighted by cost
+    kwargs.setdefault("timeout", REQUEST_TIMEOUT)
+    tier = tier_for(user)
+    try:
+        with tracing.span("minimax.queue", endpoint=endpoint, tier=tier.name):
+            waiter = await limiter.acquire(queue_timeout, user.id if user else None, tier, cost)
+    except Overloaded as e:
+        metrics.UPSTREAM_SHED.labels("minimax", endpoint, tier.name).inc()
+        raise overloaded(e.retry_after)
+
+    call = functools.partial(contextvars.copy_context().run, post, endpoint, url, **kwargs)
+    future = asyncio.get_running_loop().run_in_executor(_executor, call)
+    # The slot is settled when the thread finishes, even if the caller was cancelled meanwhile,
+    # because the call to Minimax is still in flight until then
+    future.add_done_callback(functools.partial(settle, waiter, time.monotonic()))
+    return await asyncio.shield(future)
+
+def settle(waiter, started: float, future: asyncio.Future):
+    latency = time.monotonic() - started
+    if future.cancelled():
+        limiter.abandon(waiter)
+    elif isinstance(future.exception(), requests.RequestException):
+        limiter.release(waiter, latency)
+    elif future.exception() is not None:
+        limiter.abandon(waiter)
+    else:
+        response = future.result()
+        limiter.release(waiter, latency, response.status_code, retry_after(response))
+    metrics.UPSTREAM_CONCURRENCY_LIMIT.labels("minimax").set(int(limiter.limit))
+
+def upstream_error(e: requests.RequestException):
+    # Only upstream 4xx other than 429 mean the request itself was bad
+    if isinstance(e, requests.Timeout):
+        return HTTPException(status_code=status.HTTP_504_GATEWAY_TIMEOUT, detail="Minimax API timed out")
+    response = getattr(e, "response", None)
+    if response is None:
+        return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Minimax API unreachable")
+    if response.status_code == 429:
+        return overloaded(retry_after(response) or DEFAULT_RETRY_AFTER, "TTS service is rate limited, please retry")
+    if response.status_code >= 500:
+        return HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Minimax API error: {e}")
+    return HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Minimax API error: {e}")
+
+def audio_content(response: requests.Response) -> bytes:
+    # With output_format "hex" the audio comes hex-encoded in a JSON envelope, and Minimax reports
+    # errors (rate limits, bad parameters, balance) as HTTP 200 with a non-zero base_resp code
+    try:
+        body = response.json()
+    except ValueError:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Minimax API returned an invalid response")
+    base_resp = body.get("base_resp") or {}
+    code = base_resp.get("status_code", 0)
+    if code in RATE_LIMIT_CODES:
+        raise overloaded(DEFAULT_RETRY_AFTER, "TTS service is rate limited, please retry")
+    if code == INVALID_PARAMS_CODE:
+        raise HTTPException(status_code=status.HTTP_400_BAD_REQUEST, detail=f"Minimax API error: {base_resp.get('status_msg')}")
+    if code != 0:
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail=f"Minimax API error: {base_resp.get('status_msg')}")
+    try:
+        return bytes.fromhex((body.get("data") or {})["audio"])
+    except (KeyError, TypeError, ValueError):
+        raise HTTPException(status_code=status.HTTP_502_BAD_GATEWAY, detail="Minimax API returned no audio")
+
+def warmup():
+    # Any response will do; the point is an established TLS connection left in the pool
+    _session.head(MINIMAX_API_BASE, timeout=5)
+
+def close():
+    _executor.shutdown(wait=False)
+    _session.close()
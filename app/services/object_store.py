@@ -0,0 +1,57 @@
+import os
+import tempfile
+from abc import ABC, abstractmethod
+from functools import lru_cache
+from typing import Optional
+
+# "filesystem" is the only backend shipped; an S3 backend implements the same three methods
+OBJECT_STORE_BACKEND = os.environ.get("OBJECT_STORE_BACKEND", "filesystem")
+OBJECT_STORE_ROOT = os.environ.get("OBJECT_STORE_ROOT", os.environ.get("AUDIO_STORE_DIR", "storage/audio"))
+
+class ObjectStore(ABC):
+    @abstractmethod
+    def exists(self, key: str) -> bool:
+        ...
+
+    @abstractmethod
+    def put(self, key: str, content: bytes):
+        ...
+
+    @abstractmethod
+    def local_path(self, key: str) -> Optional[str]:
+        # Remote backends return None and hand out their own presigned URLs instead
+        ...
+
+class FilesystemStore(ObjectStore):
+    def __init__(self, root: str):
+        self.root = root
+
+    def path_for(self, key: str):
+        return os.path.join(self.root, *key.split("/"))
+
+    def exists(self, key: str):
+        return os.path.isfile(self.path_for(key))
+
+    def put(self, key: str, content: bytes):
+        path = self.path_for(key)
+        directory = os.path.dirname(path)
+        os.makedirs(directory, exist_ok=True)
+        # Written to a temp file and renamed, so readers never see a partial object
+        fd, temp_path = tempfile.mkstemp(dir=directory, suffix=".part")
+        try:
+            with os.fdopen(fd, "wb") as object_file:
+                object_file.write(content)
+            os.replace(temp_path, path)
+        except BaseException:
+            os.unlink(temp_path)
+            raise
+
+    def local_path(self, key: str):
+        path = self.path_for(key)
+        return path if os.path.isfile(path) else None
+
+@lru_cache(maxsize=1)
+def get_store() -> ObjectStore:
+    if OBJECT_STORE_BACKEND == "filesystem":
+        return FilesystemStore(OBJECT_STORE_ROOT)
+    raise ValueError(f"Unknown OBJECT_STORE_BACKEND {OBJECT_STORE_BACKEND!r}")
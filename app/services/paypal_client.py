@@ -0,0 +1,117 @@
+import asyncio
+import time
+from typing import Optional
+import httpx
+from fastapi import HTTPException, status
+from app.config import settings
+from app.services import metrics, tracing
+
+PAYPAL_CLIENT_ID = settings.PAYPAL_CLIENT_ID
+PAYPAL_SECRET = settings.PAYPAL_SECRET
+PAYPAL_BASE_URL = settings.PAYPAL_BASE_URL
+
+# Refresh this many seconds before PayPal's expires_in so in-flight calls never carry a stale token,
+# but never more than a fraction of a short lifetime, or the token would never be reused
+TOKEN_REFRESH_MARGIN = 300
+TOKEN_REFRESH_FRACTION = 0.1
+# Assumed lifetime when the token response carries no expires_in
+DEFAULT_TOKEN_TTL = 600
+REQUEST_TIMEOUT = httpx.Timeout(10.0, connect=5.0)
+POOL_LIMITS = httpx.Limits(max_connections=50, max_keepalive_connections=20, keepalive_expiry=60)
+
+_client: Optional[httpx.AsyncClient] = None
+_access_token: Optional[str] = None
+_token_refresh_at: float = 0.0
+_token_lock = asyncio.Lock()
+
+def get_client():
+    global _client
+    if _client is None or _client.is_closed:
+        _client = httpx.AsyncClient(
+            base_url=PAYPAL_BASE_URL,
+            timeout=REQUEST_TIMEOUT,
+            limits=POOL_LIMITS
+        )
+    return _client
+
+def token_is_fresh():
+    return _access_token is not None and time.monotonic() < _token_refresh_at
+
+async def timed_request(method: str, path: str, **kwargs):
+    started = time.perf_counter()
+    status_code = None
+    try:
+        with tracing.span("paypal", endpoint=f"{method} {metrics.endpoint_label(path)}") as current:
+            response = await get_client().request(method, path, **kwargs)
+            status_code = response.status_code
+            tracing.set_attributes(current, status=status_code)
+        return response
+    finally:
+        metrics.observe_upstream(
+            "paypal",
+            f"{method} {metrics.endpoint_label(path)}",
+            time.perf_counter() - started,
+            status_code
+        )
+
+async def fetch_access_token():
+    global _access_token, _token_refresh_at
+    response = await timed_request(
+        "POST",
+        "/v1/oauth2/token",
+        auth=(PAYPAL_CLIENT_ID, PAYPAL_SECRET),
+        data={"grant_type": "client_credentials"},
+        headers={"Content-Type": "application/x-www-form-urlencoded"}
+    )
+
+    if response.status_code != 200:
+        raise HTTPException(
+            status_code=status.HTTP_502_BAD_GATEWAY,
+            detail="Failed to get Paypal access token"
+        )
+
+    token_data = response.json()
+    _access_token = token_data["access_token"]
+    expires_in = float(token_data.get("expires_in") or DEFAULT_TOKEN_TTL)
+    _token_refresh_at = time.monotonic() + expires_in - min(TOKEN_REFRESH_MARGIN, expires_in * TOKEN_REFRESH_FRACTION)
+    return _access_token
+
+async def get_access_token():
+    if token_is_fresh():
+        return _access_token
+
+    # Single flight: concurrent callers wait on the lock and reuse the token the first one fetched
+    async with _token_lock:
+        if token_is_fresh():
+            return _access_token
+        return await fetch_access_token()
+
+def invalidate_access_token():
+    global _access_token, _token_refresh_at
+    _access_token = None
+    _token_refresh_at = 0.0
+
+async def request(method: str, path: str, headers: Optional[dict] = None, **kwargs):
+    token = await get_access_token()
+    request_headers = {
+        "Content-Type": "application/json",
+        **(headers or {}),
+        "Authorization": f"Bearer {token}"
+    }
+    response = await timed_request(method, path, headers=request_headers, **kwargs)
+
+    if response.status_code == 401:
+        async with _token_lock:
+            if _access_token == token:
+                invalidate_access_token()
+        request_headers["Authorization"] = f"Bearer {await get_access_token()}"
+        response = await timed_request(method, path, headers=request_headers, **kwargs)
+
+    return response
+
+async def close():
+    global _client
+    if _client is not None:
+        await _client.aclose()
+        _client = None
+    invalidate_access_token()
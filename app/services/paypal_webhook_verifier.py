@@ -0,0 +1,138 @@
+import asyncio
+import base64
+import os
+import zlib
+from datetime import datetime, timezone
+from typing import Dict, Optional, Tuple
+from urllib.parse import urlparse
+from cryptography import x509
+from cryptography.exceptions import InvalidSignature
+from cryptography.hazmat.primitives import hashes
+from cryptography.hazmat.primitives.asymmetric import padding
+from app.config import settings
+from app.services import metrics, paypal_client
+
+PAYPAL_WEBHOOK_ID = settings.PAYPAL_WEBHOOK_ID
+
+# "local" verifies the transmission signature in-process, "remote" calls PayPal's verify API
+VERIFICATION_MODE = os.environ.get("PAYPAL_WEBHOOK_VERIFICATION", "local")
+
+CERT_HOST_ALLOWLIST = {
+    "api.paypal.com",
+    "api-m.paypal.com",
+    "api.sandbox.paypal.com",
+    "api-m.sandbox.paypal.com",
+}
+LOCAL_AUTH_ALGOS = {"SHA256withRSA"}
+MAX_CACHED_CERTS = 16
+
+_cert_cache: Dict[str, Tuple[x509.Certificate, datetime]] = {}
+_cert_lock = asyncio.Lock()
+
+class WebhookVerificationError(Exception):
+    pass
+
+def check_cert_url(cert_url: Optional[str]):
+    if not cert_url:
+        raise WebhookVerificationError("Missing PAYPAL-CERT-URL header")
+
+    parsed = urlparse(cert_url)
+    if parsed.scheme != "https" or parsed.hostname not in CERT_HOST_ALLOWLIST:
+        raise WebhookVerificationError(f"Untrusted certificate url: {cert_url}")
+
+def cached_cert(cert_url: str):
+    cached = _cert_cache.get(cert_url)
+    if cached and cached[1] > datetime.now(timezone.utc):
+        return cached[0]
+    return None
+
+async def get_certificate(cert_url: str):
+    check_cert_url(cert_url)
+
+    cert = cached_cert(cert_url)
+    metrics.cache_lookup("paypal_cert", cert is not None)
+    if cert is not None:
+        return cert
+
+    async with _cert_lock:
+        cert = cached_cert(cert_url)
+        if cert is not None:
+            return cert
+
+        response = await paypal_client.get_client().get(cert_url)
+        if response.status_code != 200:
+            raise WebhookVerificationError(f"Failed to download certificate: {response.status_code}")
+
+        cert = x509.load_pem_x509_certificate(response.content)
+        now = datetime.now(timezone.utc)
+        if not (cert.not_valid_before_utc <= now < cert.not_valid_after_utc):
+            raise WebhookVerificationError("PayPal certificate is not currently valid")
+
+        for url in [url for url, (_, expires) in _cert_cache.items() if expires <= now]:
+            del _cert_cache[url]
+        if len(_cert_cache) >= MAX_CACHED_CERTS:
+            _cert_cache.clear()
+
+        _cert_cache[cert_url] = (cert, cert.not_valid_after_utc)
+        return cert
+
+def expected_message(transmission_id: str, transmission_time: str, webhook_id: str, raw_body: bytes):
+    crc = zlib.crc32(raw_body) & 0xFFFFFFFF
+    return f"{transmission_id}|{transmission_time}|{webhook_id}|{crc}".encode()
+
+def verify_with_certificate(
+    cert: x509.Certificate,
+    transmission_id: str,
+    transmission_time: str,
+    transmission_sig: str,
+    raw_body: bytes,
+    webhook_id: str = PAYPAL_WEBHOOK_ID
+):
+    try:
+        signature = base64.b64decode(transmission_sig)
+    except (TypeError, ValueError):
+        raise WebhookVerificationError("Malformed transmission signature")
+
+    try:
+        cert.public_key().verify(
+            signature,
+            expected_message(transmission_id, transmission_time, webhook_id, raw_body),
+            padding.PKCS1v15(),
+            hashes.SHA256()
+        )
+    except InvalidSignature:
+        raise WebhookVerificationError("Invalid transmission signature")
+
+async def verify_remote(headers, body: dict):
+    response = await paypal_client.request(
+        "POST",
+        "/v1/notifications/verify-webhook-signature",
+        json={
+            "transmission_id": headers.get("PAYPAL-TRANSMISSION-ID"),
+            "transmission_time": headers.get("PAYPAL-TRANSMISSION-TIME"),
+            "cert_url": headers.get("PAYPAL-CERT-URL"),
+            "auth_algo": headers.get("PAYPAL-AUTH-ALGO"),
+            "transmission_sig": headers.get("PAYPAL-TRANSMISSION-SIG"),
+            "webhook_id": PAYPAL_WEBHOOK_ID,
+            "webhook_event": body
+        }
+    )
+
+    if response.status_code != 200 or response.json().get("verification_status") != "SUCCESS":
+        raise WebhookVerificationError("Webhook verification failed")
+
+async def verify_webhook(headers, raw_body: bytes, body: dict):
+    auth_algo = headers.get("PAYPAL-AUTH-ALGO")
+
+    if VERIFICATION_MODE == "remote" or auth_algo not in LOCAL_AUTH_ALGOS:
+        await verify_remote(headers, body)
+        return
+
+    transmission_id = headers.get("PAYPAL-TRANSMISSION-ID")
+    transmission_time = headers.get("PAYPAL-TRANSMISSION-TIME")
+    transmission_sig = headers.get("PAYPAL-TRANSMISSION-SIG")
+    if not (transmission_id and transmission_time and transmission_sig):
+        raise WebhookVerificationError("Missing PayPal transmission headers")
+
+    cert = await get_certificate(headers.get("PAYPAL-CERT-URL"))
+    verify_with_certificate(cert, transmission_id, transmission_time, transmission_sig, raw_body, PAYPAL_WEBHOOK_ID)
@@ -0,0 +1,88 @@
+import asyncio
+import os
+from typing import Optional
+import httpx
+from fastapi import HTTPException, status
+from app.config import settings
+from app.lazy_import import lazy_import
+from app.services import metrics, tracing
+
+STRIPE_API_KEY = settings.STRIPE_API_KEY
+# Point at a local Stripe stand-in (e.g. stripe-mock on http://localhost:12111) for tests and benchmarks
+STRIPE_API_BASE = os.environ.get("STRIPE_API_BASE", "https://api.stripe.com")
+
+CALL_TIMEOUT = 15.0
+CONNECT_TIMEOUT = 5.0
+MAX_NETWORK_RETRIES = 2
+
+# The SDK is large; it loads on the first Stripe call or during warmup
+stripe = lazy_import("stripe")
+
+_client: Optional["stripe.StripeClient"] = None
+_http_client: Optional["stripe.HTTPXClient"] = None
+
+def get_client():
+    global _client, _http_client
+    if _client is None:
+        _http_client = stripe.HTTPXClient(timeout=httpx.Timeout(CALL_TIMEOUT, connect=CONNECT_TIMEOUT))
+        _client = stripe.StripeClient(
+            STRIPE_API_KEY,
+            base_addresses={"api": STRIPE_API_BASE},
+            http_client=_http_client,
+            max_network_retries=MAX_NETWORK_RETRIES
+        )
+    return _client
+
+def request_options(idempotency_key: Optional[str] = None):
+    options = {}
+    if idempotency_key:
+        options["idempotency_key"] = idempotency_key
+    return options
+
+async def call(coro, timeout: float = CALL_TIMEOUT, endpoint: str = "unknown"):
+    try:
+        with metrics.track_upstream("stripe", endpoint), tracing.span("stripe", endpoint=endpoint):
+            return await asyncio.wait_for(coro, timeout=timeout)
+    except asyncio.TimeoutError:
+        raise HTTPException(
+            status_code=status.HTTP_504_GATEWAY_TIMEOUT,
+            detail="Stripe request timed out"
+        )
+
+async def create_customer(email: str, metadata: dict, timeout: float = CALL_TIMEOUT):
+    return await call(
+        get_client().customers.create_async(params={"email": email, "metadata": metadata}),
+        timeout,
+        "customers.create"
+    )
+
+async def create_checkout_session(
+    params: dict,
+    idempotency_key: Optional[str] = None,
+    timeout: float = CALL_TIMEOUT
+):
+    return await call(
+        get_client().checkout.sessions.create_async(params=params, options=request_options(idempotency_key)),
+        timeout,
+        "checkout.sessions.create"
+    )
+
+async def retrieve_subscription(subscription_id: str, timeout: float = CALL_TIMEOUT):
+    return await call(get_client().subscriptions.retrieve_async(subscription_id), timeout, "subscriptions.retrieve")
+
+async def update_subscription(subscription_id: str, params: dict, timeout: float = CALL_TIMEOUT):
+    return await call(get_client().subscriptions.update_async(subscription_id, params=params), timeout, "subscriptions.update")
+
+async def list_subscriptions(params: dict, timeout: float = CALL_TIMEOUT):
+    return await call(get_client().subscriptions.list_async(params=params), timeout, "subscriptions.list")
+
+async def warmup():
+    # A one-item list opens the keep-alive connection and loads the SDK before traffic arrives
+    await list_subscriptions({"limit": 1})
+
+async def close():
+    global _client, _http_client
+    if _http_client is not None:
+        await _http_client.close_async()
+    _client = None
+    _http_client = None
@@ -0,0 +1,42 @@
+import time
+from collections import OrderedDict
+from typing import Any, Dict, Tuple
+from app.services import metrics
+
+# Webhooks keep entries fresh; the TTL only bounds staleness when a webhook is missed
+# or lands on another worker
+TTL = 300
+MAX_ENTRIES = 50000
+
+_entries: "OrderedDict[Tuple[str, str], Tuple[Dict[str, Any], float]]" = OrderedDict()
+
+def get(provider: str, subscription_id: str):
+    key = (provider, subscription_id)
+    entry = _entries.get(key)
+    if entry is None:
+        metrics.cache_lookup(f"{provider}_subscription", False)
+        return None
+
+    data, expires_at = entry
+    if expires_at <= time.monotonic():
+        del _entries[key]
+        metrics.cache_lookup(f"{provider}_subscription", False)
+        return None
+
+    _entries.move_to_end(key)
+    metrics.cache_lookup(f"{provider}_subscription", True)
+    return data
+
+def put(provider: str, subscription_id: str, data: Dict[str, Any]):
+    if not subscription_id:
+        return
+
+    key = (provider, subscription_id)
+    _entries[key] = (data, time.monotonic() + TTL)
+    _entries.move_to_end(key)
+
+    while len(_entries) > MAX_ENTRIES:
+        _entries.popitem(last=False)
+
+def invalidate(provider: str, subscription_id: str):
+    _entries.pop((provider, subscription_id), None)
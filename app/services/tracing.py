@@ -0,0 +1,250 @@
+import asyncio
+import json
+import logging
+import os
+import random
+import re
+import secrets
+import time
+from contextlib import contextmanager
+from contextvars import ContextVar
+from dataclasses import dataclass, field, asdict
+from typing import Dict, List, Optional
+import httpx
+
+logger = logging.getLogger(__name__)
+
+# "none", "file" (JSON lines) or "otlp" (OTLP/HTTP JSON to a collector or stand-in)
+TRACE_EXPORTER = os.environ.get("TRACE_EXPORTER", "none")
+TRACE_FILE = os.environ.get("TRACE_FILE", "traces.jsonl")
+TRACE_OTLP_ENDPOINT = os.environ.get("TRACE_OTLP_ENDPOINT", "http://localhost:4318/v1/traces")
+TRACE_SAMPLE_RATE = float(os.environ.get("TRACE_SAMPLE_RATE", "1.0"))
+# Debug only: the header reveals internal timings to clients
+SERVER_TIMING = os.environ.get("TRACE_SERVER_TIMING", "").lower() in ("1", "true", "yes")
+
+EXPORT_INTERVAL = 2.0
+MAX_PENDING = 10000
+METRIC_NAME = re.compile(r"[^A-Za-z0-9_.-]")
+
+@dataclass
+class Span:
+    name: str
+    span_id: str
+    parent_id: Optional[str]
+    start: float
+    end: Optional[float] = None
+    attributes: Dict[str, object] = field(default_factory=dict)
+
+    @property
+    def duration_ms(self):
+        return ((self.end or time.perf_counter()) - self.start) * 1000
+
+@dataclass
+class Trace:
+    trace_id: str
+    name: str
+    started_at: float
+    spans: List[Span] = field(default_factory=list)
+
+_current_trace: ContextVar[Optional[Trace]] = ContextVar("current_trace", default=None)
+_current_span: ContextVar[Optional[Span]] = ContextVar("current_span", default=None)
+
+_pending: List[Trace] = []
+_export_task: Optional[asyncio.Task] = None
+_otlp_client: Optional[httpx.AsyncClient] = None
+
+def enabled():
+    return TRACE_EXPORTER != "none" or SERVER_TIMING
+
+def start_span(name: str, **attributes):
+    trace = _current_trace.get()
+    if trace is None:
+        return None
+    parent = _current_span.get()
+    span = Span(
+        name=name,
+        span_id=secrets.token_hex(8),
+        parent_id=parent.span_id if parent else None,
+        start=time.perf_counter(),
+        attributes=attributes
+    )
+    trace.spans.append(span)
+    return span
+
+def end_span(span: Optional[Span], **attributes):
+    if span is None:
+        return
+    span.end = time.perf_counter()
+    span.attributes.update(attributes)
+
+def set_attributes(span: Optional[Span], **attributes):
+    if span is not None:
+        span.attributes.update(attributes)
+
+@contextmanager
+def span(name: str, **attributes):
+    current = start_span(name, **attributes)
+    if current is None:
+        yield None
+        return
+
+    token = _current_span.set(current)
+    try:
+        yield current
+    except Exception as e:
+        current.attributes["error"] = type(e).__name__
+        raise
+    finally:
+        _current_span.reset(token)
+        end_span(current)
+
+def server_timing(trace: Trace):
+    # One entry per span name, summed, so repeated phases such as "db" collapse into a single total
+    totals: Dict[str, float] = {}
+    for recorded in trace.spans:
+        if recorded.parent_id is None:
+            continue
+        metric = METRIC_NAME.sub("_", recorded.name)
+        totals[metric] = totals.get(metric, 0.0) + recorded.duration_ms
+
+    entries = [f"{metric};dur={duration:.1f}" for metric, duration in totals.items()]
+    entries.append(f"total;dur={(time.perf_counter() - trace.started_at) * 1000:.1f}")
+    return ", ".join(entries)
+
+def to_record(trace: Trace):
+    return {
+        "trace_id": trace.trace_id,
+        "name": trace.name,
+        "spans": [
+            {**asdict(recorded), "duration_ms": round(recorded.duration_ms, 3)}
+            for recorded in trace.spans
+        ]
+    }
+
+def to_otlp(traces: List[Trace]):
+    # perf_counter offsets are anchored to wall time once per batch
+    offset_ns = time.time_ns() - int(time.perf_counter() * 1e9)
+    spans = []
+    for trace in traces:
+        for recorded in trace.spans:
+            spans.append({
+                "traceId": trace.trace_id,
+                "spanId": recorded.span_id,
+                "parentSpanId": recorded.parent_id or "",
+                "name": recorded.name,
+                "startTimeUnixNano": str(offset_ns + int(recorded.start * 1e9)),
+                "endTimeUnixNano": str(offset_ns + int((recorded.end or recorded.start) * 1e9)),
+                "attributes": [
+                    {"key": key, "value": {"stringValue": str(value)}}
+                    for key, value in recorded.attributes.items()
+                ]
+            })
+    return {
+        "resourceSpans": [{
+            "resource": {"attributes": [{"key": "service.name", "value": {"stringValue": "tts-api"}}]},
+            "scopeSpans": [{"scope": {"name": "app.tracing"}, "spans": spans}]
+        }]
+    }
+
+def write_file(traces: List[Trace]):
+    with open(TRACE_FILE, "a") as trace_file:
+        for trace in traces:
+            trace_file.write(json.dumps(to_record(trace), default=str) + "\n")
+
+async def export(traces: List[Trace]):
+    global _otlp_client
+    if TRACE_EXPORTER == "file":
+        await asyncio.to_thread(write_file, traces)
+    elif TRACE_EXPORTER == "otlp":
+        if _otlp_client is None:
+            _otlp_client = httpx.AsyncClient(timeout=5.0)
+        response = await _otlp_client.post(TRACE_OTLP_ENDPOINT, json=to_otlp(traces))
+        response.raise_for_status()
+
+async def flush():
+    if not _pending:
+        return
+    batch = _pending[:]
+    del _pending[:len(batch)]
+    try:
+        await export(batch)
+    except Exception:
+        logger.exception("Failed to export %s traces", len(batch))
+
+async def export_loop():
+    while True:
+        await asyncio.sleep(EXPORT_INTERVAL)
+        await flush()
+
+async def start():
+    global _export_task
+    if _export_task is not None or TRACE_EXPORTER == "none":
+        return
+    _export_task = asyncio.create_task(export_loop())
+
+async def stop():
+    global _export_task, _otlp_client
+    if _export_task is not None:
+        _export_task.cancel()
+        await asyncio.gather(_export_task, return_exceptions=True)
+        _export_task = None
+    await flush()
+    if _otlp_client is not None:
+        await _otlp_client.aclose()
+        _otlp_client = None
+
+def finish(trace: Trace):
+    if TRACE_EXPORTER == "none" or random.random() >= TRACE_SAMPLE_RATE:
+        return
+    _pending.append(trace)
+    if len(_pending) > MAX_PENDING:
+        del _pending[:len(_pending) - MAX_PENDING]
+
+class TracingMiddleware:
+    def __init__(self, app):
+        self.app = app
+
+    async def __call__(self, scope, receive, send):
+        if scope["type"] != "http" or not enabled():
+            await self.app(scope, receive, send)
+            return
+
+        name = f"{scope['method']} {scope['path']}"
+        trace = Trace(trace_id=secrets.token_hex(16), name=name, started_at=time.perf_counter())
+        trace_token = _current_trace.set(trace)
+        root = start_span(name)
+        span_token = _current_span.set(root)
+
+        async def send_wrapper(message):
+            if message["type"] == "http.response.start":
+                root.attributes["status"] = message["status"]
+                if SERVER_TIMING:
+                    headers = list(message.get("headers", []))
+                    headers.append((b"server-timing", server_timing(trace).encode()))
+                    message = {**message, "headers": headers}
+            await send(message)
+
+        try:
+            await self.app(scope, receive, send_wrapper)
+        finally:
+            end_span(root)
+            _current_span.reset(span_token)
+            _current_trace.reset(trace_token)
+            finish(trace)
+
+def instrument_engine(sync_engine):
+    from sqlalchemy import event
+
+    @event.listens_for(sync_engine, "before_cursor_execute")
+    def before_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        context._trace_span = start_span("db", statement=statement.split(None, 1)[0] if statement else "")
+
+    @event.listens_for(sync_engine, "after_cursor_execute")
+    def after_cursor_execute(conn, cursor, statement, parameters, context, executemany):
+        end_span(getattr(context, "_trace_span", None), rows=cursor.rowcount)
+
+    @event.listens_for(sync_engine, "handle_error")
+    def handle_error(exception_context):
+        context = exception_context.execution_context
+        if context is not None:
+            end_span(getattr(context, "_trace_span", None), error=type(exception_context.original_exception).__name__)
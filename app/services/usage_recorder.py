@@ -0,0 +1,149 @@
+import asyncio
+import logging
+from datetime import datetime
+from collections import defaultdict
+from typing import Dict, List, Optional, Tuple
+from sqlalchemy import text
+from app.database import engine
+
+logger = logging.getLogger(__name__)
+
+BATCH_SIZE = 500
+FLUSH_INTERVAL = 2.0
+# Upper bound on buffered records while the database is unavailable; the oldest are dropped past it
+MAX_BUFFER = 50000
+
+COLUMNS = [
+    "user_id",
+    "operation",
+    "voice_id",
+    "model",
+    "characters",
+    "audio_bytes",
+    "upstream_latency_ms",
+    "cache_hit",
+    "created_at",
+]
+
+UsageRow = Tuple[int, str, Optional[str], Optional[str], int, int, Optional[int], bool, datetime]
+
+_buffer: List[UsageRow] = []
+_flush_needed: Optional[asyncio.Event] = None
+_flush_task: Optional[asyncio.Task] = None
+_flush_lock = asyncio.Lock()
+
+def record(
+    user_id: int,
+    operation: str,
+    voice_id: Optional[str] = None,
+    model: Optional[str] = None,
+    characters: int = 0,
+    audio_bytes: int = 0,
+    upstream_latency_ms: Optional[int] = None,
+    cache_hit: bool = False
+):
+    _buffer.append((
+        user_id,
+        operation,
+        voice_id,
+        model,
+        characters,
+        audio_bytes,
+        upstream_latency_ms,
+        cache_hit,
+        datetime.utcnow()
+    ))
+
+    if len(_buffer) > MAX_BUFFER:
+        dropped = len(_buffer) - MAX_BUFFER
+        del _buffer[:dropped]
+        logger.warning("Usage buffer full, dropped %s records", dropped)
+
+    if len(_buffer) >= BATCH_SIZE and _flush_needed is not None:
+        _flush_needed.set()
+
+ROLLUP_UPSERT = """
+    INSERT INTO {table} (user_id, bucket_start, operation, voice_id, model, requests, characters, audio_bytes)
+    VALUES (:user_id, :bucket_start, :operation, :voice_id, :model, :requests, :characters, :audio_bytes)
+    ON CONFLICT (user_id, bucket_start, operation, voice_id, model) DO UPDATE SET
+        requests = {table}.requests + EXCLUDED.requests,
+        characters = {table}.characters + EXCLUDED.characters,
+        audio_bytes = {table}.audio_bytes + EXCLUDED.audio_bytes
+"""
+HOURLY_UPSERT = text(ROLLUP_UPSERT.format(table="usage_hourly"))
+DAILY_UPSERT = text(ROLLUP_UPSERT.format(table="usage_daily"))
+
+def rollup(batch: List[UsageRow], granularity: str):
+    totals: Dict[tuple, List[int]] = defaultdict(lambda: [0, 0, 0])
+    for user_id, operation, voice_id, model, characters, audio_bytes, _, _, created_at in batch:
+        if granularity == "hour":
+            bucket = created_at.replace(minute=0, second=0, microsecond=0)
+        else:
+            bucket = created_at.date()
+        total = totals[(user_id, bucket, operation, voice_id or "", model or "")]
+        total[0] += 1
+        total[1] += characters
+        total[2] += audio_bytes
+
+    # Sorted so concurrent workers upsert overlapping keys in the same order and cannot deadlock
+    return [
+        {
+            "user_id": key[0],
+            "bucket_start": key[1],
+            "operation": key[2],
+            "voice_id": key[3],
+            "model": key[4],
+            "requests": total[0],
+            "characters": total[1],
+            "audio_bytes": total[2]
+        }
+        for key, total in sorted(totals.items())
+    ]
+
+async def write_batch(batch: List[UsageRow]):
+    async with engine.begin() as conn:
+        # The upserts open the transaction, so the raw COPY below commits or rolls back with them
+        await conn.execute(HOURLY_UPSERT, rollup(batch, "hour"))
+        await conn.execute(DAILY_UPSERT, rollup(batch, "day"))
+        raw = await conn.get_raw_connection()
+        await raw.driver_connection.copy_records_to_table(
+            "usage_records",
+            records=batch,
+            columns=COLUMNS
+        )
+
+async def flush():
+    async with _flush_lock:
+        while _buffer:
+            batch = _buffer[:BATCH_SIZE * 10]
+            try:
+                await write_batch(batch)
+            except Exception:
+                logger.exception("Failed to write %s usage records, keeping them buffered", len(batch))
+                return
+            del _buffer[:len(batch)]
+
+async def flush_loop():
+    while True:
+        try:
+            await asyncio.wait_for(_flush_needed.wait(), timeout=FLUSH_INTERVAL)
+        except asyncio.TimeoutError:
+            pass
+        _flush_needed.clear()
+        await flush()
+
+async def start():
+    global _flush_needed, _flush_task
+    if _flush_task is not None:
+        return
+    _flush_needed = asyncio.Event()
+    _flush_task = asyncio.create_task(flush_loop())
+
+async def stop():
+    global _flush_needed, _flush_task
+    if _flush_task is not None:
+        _flush_task.cancel()
+        await asyncio.gather(_flush_task, return_exceptions=True)
+        _flush_task = None
+    await flush()
+    _flush_needed = None
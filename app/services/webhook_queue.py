@@ -0,0 +1,203 @@
+import asyncio
+import logging
+from datetime import datetime, timedelta
+from typing import Awaitable, Callable, Dict, List, Optional
+from sqlalchemy import update, or_, and_
+from sqlalchemy.dialects.postgresql import insert
+from sqlalchemy.ext.asyncio import AsyncSession
+from sqlalchemy.future import select
+from app.database import SessionLocal
+from app.models.webhook_event import WebhookEvent
+from app.models.processed_event import ProcessedEvent
+
+logger = logging.getLogger(__name__)
+
+WORKER_COUNT = 8
+QUEUE_SIZE = 1000
+MAX_ATTEMPTS = 8
+POLL_INTERVAL = 5
+POLL_BATCH = 200
+# Freshly recorded events go straight onto the in-memory queue; the poller only picks them up
+# after this grace period, i.e. when the queue was full or the process died before handling them
+INLINE_GRACE = timedelta(seconds=30)
+STALE_LOCK = timedelta(minutes=5)
+
+EventHandler = Callable[[AsyncSession, dict], Awaitable[None]]
+
+_handlers: Dict[str, EventHandler] = {}
+_queue: Optional[asyncio.Queue] = None
+_tasks: List[asyncio.Task] = []
+_poller_task: Optional[asyncio.Task] = None
+
+def register_handler(provider: str, handler: EventHandler):
+    _handlers[provider] = handler
+
+def retry_delay(attempts: int):
+    return timedelta(seconds=min(2 ** attempts * 5, 3600))
+
+def enqueue(event_id: int):
+    if _queue is None:
+        return
+    try:
+        _queue.put_nowait(event_id)
+    except asyncio.QueueFull:
+        logger.warning("Webhook queue full, event %s left for the poller", event_id)
+
+async def is_processed(db: AsyncSession, provider: str, event_id: str):
+    result = await db.execute(
+        select(ProcessedEvent.id).where(ProcessedEvent.provider == provider, ProcessedEvent.event_id == event_id)
+    )
+    return result.first() is not None
+
+async def claim_processed_event(db: AsyncSession, provider: str, event_id: str):
+    result = await db.execute(
+        insert(ProcessedEvent)
+        .values(provider=provider, event_id=event_id, processed_at=datetime.utcnow())
+        .on_conflict_do_nothing(constraint='uq_processed_events_provider_event_id')
+        .returning(ProcessedEvent.id)
+    )
+    return result.first() is not None
+
+async def record_event(
+    db: AsyncSession,
+    provider: str,
+    event_id: Optional[str],
+    event_type: Optional[str],
+    payload: dict
+):
+    if event_id and await is_processed(db, provider, event_id):
+        return None
+
+    event = WebhookEvent(
+        provider=provider,
+        event_id=event_id,
+        event_type=event_type,
+        payload=payload,
+        next_attempt_at=datetime.utcnow() + INLINE_GRACE
+    )
+    db.add(event)
+    await db.flush()
+    recorded_id = event.id
+    await db.commit()
+    enqueue(recorded_id)
+    return recorded_id
+
+async def claim_event(db: AsyncSession, event_id: int):
+    now = datetime.utcnow()
+    result = await db.execute(
+        update(WebhookEvent)
+        .where(
+            WebhookEvent.id == event_id,
+            or_(
+                WebhookEvent.status == "pending",
+                and_(WebhookEvent.status == "processing", WebhookEvent.locked_at < now - STALE_LOCK)
+            )
+        )
+        .values(status="processing", locked_at=now, attempts=WebhookEvent.attempts + 1)
+        .returning(WebhookEvent.provider, WebhookEvent.event_id, WebhookEvent.payload, WebhookEvent.attempts)
+    )
+    claimed = result.first()
+    await db.commit()
+    return claimed
+
+async def finish_event(db: AsyncSession, event_id: int, **values):
+    await db.execute(update(WebhookEvent).where(WebhookEvent.id == event_id).values(locked_at=None, **values))
+    await db.commit()
+
+async def process_event(event_id: int):
+    async with SessionLocal() as db:
+        claimed = await claim_event(db, event_id)
+        if claimed is None:
+            return
+
+        handler = _handlers.get(claimed.provider)
+        try:
+            if handler is None:
+                raise RuntimeError(f"No webhook handler registered for {claimed.provider}")
+            # The claim and every handler write commit in one transaction: a failure rolls back the
+            # claim and any credits granted so far, and a concurrent redelivery on another worker
+            # blocks on the unique index until this transaction ends. Handlers never commit.
+            if claimed.event_id and not await claim_processed_event(db, claimed.provider, claimed.event_id):
+                await db.rollback()
+                logger.info("Skipping duplicate %s event %s", claimed.provider, claimed.event_id)
+                await finish_event(db, event_id, status="duplicate", processed_at=datetime.utcnow())
+                return
+            await handler(db, claimed.payload)
+            await db.commit()
+        except Exception as e:
+            await db.rollback()
+            dead = claimed.attempts >= MAX_ATTEMPTS
+            logger.exception("Webhook event %s failed (attempt %s)", event_id, claimed.attempts)
+            await finish_event(
+                db,
+                event_id,
+                status="dead" if dead else "pending",
+                last_error=str(e)[:1000],
+                next_attempt_at=datetime.utcnow() + retry_delay(claimed.attempts)
+            )
+            return
+
+        await finish_event(db, event_id, status="done", processed_at=datetime.utcnow(), last_error=None)
+
+async def worker():
+    while True:
+        event_id = await _queue.get()
+        try:
+            await process_event(event_id)
+        except Exception:
+            logger.exception("Webhook worker crashed on event %s", event_id)
+        finally:
+            _queue.task_done()
+
+async def poll_due_events():
+    now = datetime.utcnow()
+    async with SessionLocal() as db:
+        result = await db.execute(
+            select(WebhookEvent.id)
+            .where(
+                or_(
+                    and_(WebhookEvent.status == "pending", WebhookEvent.next_attempt_at <= now),
+                    and_(WebhookEvent.status == "processing", WebhookEvent.locked_at < now - STALE_LOCK)
+                )
+            )
+            .order_by(WebhookEvent.next_attempt_at)
+            .limit(min(POLL_BATCH, QUEUE_SIZE - _queue.qsize()))
+        )
+        return result.scalars().all()
+
+async def poller():
+    while True:
+        try:
+            if _queue.qsize() < QUEUE_SIZE:
+                for event_id in await poll_due_events():
+                    enqueue(event_id)
+        except Exception:
+            logger.exception("Webhook poller failed")
+        await asyncio.sleep(POLL_INTERVAL)
+
+async def start(worker_count: int = WORKER_COUNT):
+    global _queue, _poller_task
+    if _tasks:
+        return
+    _queue = asyncio.Queue(maxsize=QUEUE_SIZE)
+    _tasks.extend(asyncio.create_task(worker()) for _ in range(worker_count))
+    _poller_task = asyncio.create_task(poller())
+
+async def stop(timeout: float = 25.0):
+    global _queue, _poller_task
+    if _poller_task is not None:
+        _poller_task.cancel()
+        await asyncio.gather(_poller_task, return_exceptions=True)
+        _poller_task = None
+
+    if _queue is not None:
+        try:
+            await asyncio.wait_for(_queue.join(), timeout=timeout)
+        except asyncio.TimeoutError:
+            logger.warning("Webhook queue not drained in %ss, %s events left for the poller", timeout, _queue.qsize())
+
+    for task in _tasks:
+        task.cancel()
+    await asyncio.gather(*_tasks, return_exceptions=True)
+    _tasks.clear()
+    _queue = None
@@ -0,0 +1,62 @@
+import asyncio
+import logging
+import os
+from contextlib import AsyncExitStack
+from sqlalchemy import text
+from app.database import engine, Base, POOL_SIZE
+from app.jobs.payment_history_partitions import ensure_partitions
+from app.services import minimax_client, paypal_client, stripe_gateway
+
+logger = logging.getLogger(__name__)
+
+# Highest migrations/NNNN_*.sql this code depends on; bump it together with each new migration
+REQUIRED_SCHEMA_VERSION = 9
+# Local development against an empty database only; production schemas come from migrations/
+CREATE_ALL = os.environ.get("DB_CREATE_ALL", "").lower() in ("1", "true", "yes")
+WARMUP = os.environ.get("STARTUP_WARMUP", "").lower() in ("1", "true", "yes")
+WARMUP_DB_CONNECTIONS = int(os.environ.get("WARMUP_DB_CONNECTIONS", str(POOL_SIZE)))
+WARMUP_TIMEOUT = 10.0
+
+class SchemaVersionError(RuntimeError):
+    pass
+
+async def schema_version(conn):
+    result = await conn.execute(text("SELECT to_regclass('schema_version') IS NOT NULL"))
+    if not result.scalar():
+        return 0
+    result = await conn.execute(text("SELECT COALESCE(max(version), 0) FROM schema_version"))
+    return result.scalar()
+
+async def prepare_database():
+    async with engine.begin() as conn:
+        if CREATE_ALL:
+            await conn.run_sync(Base.metadata.create_all)
+        else:
+            version = await schema_version(conn)
+            if version < REQUIRED_SCHEMA_VERSION:
+                raise SchemaVersionError(
+                    f"Database schema is at version {version}, this build needs {REQUIRED_SCHEMA_VERSION}; "
+                    f"apply the pending files in migrations/"
+                )
+        await ensure_partitions(conn)
+
+async def warm_database(connections: int = WARMUP_DB_CONNECTIONS):
+    # Held open together so the pool really ends up with that many established connections
+    async with AsyncExitStack() as stack:
+        conns = await asyncio.gather(*(stack.enter_async_context(engine.connect()) for _ in range(connections)))
+        await asyncio.gather(*(conn.execute(text("SELECT 1")) for conn in conns))
+
+async def warmup():
+    steps = {
+        "database": warm_database(),
+        "paypal": paypal_client.get_access_token(),
+        "stripe": stripe_gateway.warmup(),
+        "minimax": asyncio.to_thread(minimax_client.warmup),
+    }
+    results = await asyncio.gather(
+        *(asyncio.wait_for(step, WARMUP_TIMEOUT) for step in steps.values()),
+        return_exceptions=True
+    )
+    for name, result in zip(steps, results):
+        if isinstance(result, BaseException):
+            logger.warning("Warmup of %s failed: %r", name, result)
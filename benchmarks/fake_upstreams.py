@@ -0,0 +1,221 @@
+"""Local stand-ins for Minimax, Stripe and PayPal with configurable latency and errors.
+
+Run the API against them with:
+
+    MINIMAX_API_BASE=http://127.0.0.1:9101
+    STRIPE_API_BASE=http://127.0.0.1:9102
+    PAYPAL_BASE_URL=http://127.0.0.1:9103
+    PAYPAL_WEBHOOK_VERIFICATION=remote
+
+Profiles are "latency_ms,jitter_ms,error_rate[,error_status]", e.g. --minimax 800,200,0.01
+"""
+import argparse
+import asyncio
+import json
+import os
+import random
+import time
+import uuid
+from dataclasses import dataclass
+import uvicorn
+from starlette.applications import Starlette
+from starlette.requests import Request
+from starlette.responses import JSONResponse, StreamingResponse
+from starlette.routing import Route
+
+AUDIO_BYTES_PER_CHAR = 160
+STREAM_CHUNK = 4096
+_audio_block = os.urandom(1024 * 1024)
+
+@dataclass
+class Profile:
+    latency_ms: float = 0.0
+    jitter_ms: float = 0.0
+    error_rate: float = 0.0
+    error_status: int = 500
+
+    @classmethod
+    def parse(cls, value: str):
+        parts = value.split(",")
+        profile = cls(*(float(part) for part in parts[:3]))
+        if len(parts) > 3:
+            profile.error_status = int(parts[3])
+        return profile
+
+    async def delay(self):
+        latency = max(self.latency_ms + random.uniform(-self.jitter_ms, self.jitter_ms), 0)
+        await asyncio.sleep(latency / 1000)
+
+    def failed(self):
+        return random.random() < self.error_rate
+
+def simulated(profile: Profile):
+    def decorate(handler):
+        async def endpoint(request: Request):
+            await profile.delay()
+            if profile.failed():
+                return JSONResponse({"error": "simulated failure"}, status_code=profile.error_status)
+            return await handler(request)
+        return endpoint
+    return decorate
+
+def audio(size: int):
+    repeats, remainder = divmod(size, len(_audio_block))
+    return _audio_block * repeats + _audio_block[:remainder]
+
+def t2a_envelope(audio_hex: str, status: int):
+    return {
+        "data": {"audio": audio_hex, "status": status},
+        "trace_id": uuid.uuid4().hex,
+        "base_resp": {"status_code": 0, "status_msg": "success"}
+    }
+
+def minimax_app(profile: Profile):
+    @simulated(profile)
+    async def t2a(request: Request):
+        # Same shape as Minimax: hex-encoded audio in a JSON envelope, or one SSE event per chunk
+        body = await request.json()
+        size = max(len(body.get("text", "")), 1) * AUDIO_BYTES_PER_CHAR
+        if not body.get("stream"):
+            return JSONResponse(t2a_envelope(audio(size).hex(), status=2))
+
+        async def chunks():
+            for start in range(0, size, STREAM_CHUNK):
+                chunk = t2a_envelope(audio(min(STREAM_CHUNK, size - start)).hex(), status=1)
+                yield f"data: {json.dumps(chunk)}\n\n".encode()
+                await asyncio.sleep(0)
+            yield f"data: {json.dumps(t2a_envelope(audio(size).hex(), status=2))}\n\n".encode()
+        return StreamingResponse(chunks(), media_type="text/event-stream")
+
+    @simulated(profile)
+    async def voice_design(request: Request):
+        return JSONResponse({"voice_id": f"designed{uuid.uuid4().hex[:12]}", "trial_audio": ""})
+
+    @simulated(profile)
+    async def voice_clone(request: Request):
+        return JSONResponse({"input_sensitive": False, "preview_audio": None})
+
+    @simulated(profile)
+    async def upload(request: Request):
+        form = await request.form()
+        upload_file = form["file"]
+        content = await upload_file.read()
+        return JSONResponse({"file": {
+            "file_id": uuid.uuid4().hex,
+            "filename": upload_file.filename,
+            "bytes": len(content),
+            "created_at": int(time.time())
+        }})
+
+    return Starlette(routes=[
+        Route("/v1/t2a_v2", t2a, methods=["POST"]),
+        Route("/v1/voice_design", voice_design, methods=["POST"]),
+        Route("/v1/voice_clone", voice_clone, methods=["POST"]),
+        Route("/v1/files/upload", upload, methods=["POST"]),
+    ])
+
+def stripe_object(prefix: str, kind: str, **fields):
+    return {"id": f"{prefix}_{uuid.uuid4().hex[:24]}", "object": kind, "created": int(time.time()), **fields}
+
+def stripe_subscription(subscription_id: str, status: str = "active"):
+    return {
+        "id": subscription_id,
+        "object": "subscription",
+        "status": status,
+        "cancel_at_period_end": False,
+        "current_period_end": int(time.time()) + 30 * 86400,
+        "items": {"object": "list", "data": [], "has_more": False}
+    }
+
+def stripe_app(profile: Profile):
+    @simulated(profile)
+    async def checkout_session(request: Request):
+        session = stripe_object("cs", "checkout.session", expires_at=int(time.time()) + 86400)
+        session["url"] = f"https://checkout.stripe.test/pay/{session['id']}"
+        return JSONResponse(session)
+
+    @simulated(profile)
+    async def customer(request: Request):
+        return JSONResponse(stripe_object("cus", "customer"))
+
+    @simulated(profile)
+    async def subscription(request: Request):
+        return JSONResponse(stripe_subscription(request.path_params["subscription_id"]))
+
+    @simulated(profile)
+    async def subscriptions(request: Request):
+        return JSONResponse({"object": "list", "url": "/v1/subscriptions", "data": [], "has_more": False})
+
+    return Starlette(routes=[
+        Route("/v1/checkout/sessions", checkout_session, methods=["POST"]),
+        Route("/v1/customers", customer, methods=["POST"]),
+        Route("/v1/subscriptions", subscriptions, methods=["GET"]),
+        Route("/v1/subscriptions/{subscription_id}", subscription, methods=["GET", "POST"]),
+    ])
+
+def paypal_app(profile: Profile):
+    @simulated(profile)
+    async def token(request: Request):
+        return JSONResponse({"access_token": uuid.uuid4().hex, "token_type": "Bearer", "expires_in": 32400})
+
+    @simulated(profile)
+    async def verify(request: Request):
+        return JSONResponse({"verification_status": "SUCCESS"})
+
+    @simulated(profile)
+    async def order(request: Request):
+        order_id = uuid.uuid4().hex[:17].upper()
+        return JSONResponse({
+            "id": order_id,
+            "status": "CREATED",
+            "links": [{"rel": "approve", "href": f"https://paypal.test/checkoutnow?token={order_id}"}]
+        }, status_code=201)
+
+    @simulated(profile)
+    async def create_subscription(request: Request):
+        subscription_id = f"I-{uuid.uuid4().hex[:12].upper()}"
+        return JSONResponse({
+            "id": subscription_id,
+            "status": "APPROVAL_PENDING",
+            "links": [{"rel": "approve", "href": f"https://paypal.test/webapps/billing/subscriptions?ba_token={subscription_id}"}]
+        }, status_code=201)
+
+    @simulated(profile)
+    async def subscription(request: Request):
+        return JSONResponse({"id": request.path_params["subscription_id"], "status": "ACTIVE"})
+
+    return Starlette(routes=[
+        Route("/v1/oauth2/token", token, methods=["POST"]),
+        Route("/v1/notifications/verify-webhook-signature", verify, methods=["POST"]),
+        Route("/v2/checkout/orders", order, methods=["POST"]),
+        Route("/v1/billing/subscriptions", create_subscription, methods=["POST"]),
+        Route("/v1/billing/subscriptions/{subscription_id}", subscription, methods=["GET"]),
+        Route("/v1/billing/subscriptions/{subscription_id}/cancel", subscription, methods=["POST"]),
+    ])
+
+async def serve(host: str, apps):
+    servers = [
+        uvicorn.Server(uvicorn.Config(app, host=host, port=port, log_level="warning"))
+        for app, port in apps
+    ]
+    await asyncio.gather(*(server.serve() for server in servers))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--minimax-port", type=int, default=9101)
+    parser.add_argument("--stripe-port", type=int, default=9102)
+    parser.add_argument("--paypal-port", type=int, default=9103)
+    parser.add_argument("--minimax", type=Profile.parse, default=Profile(800, 200))
+    parser.add_argument("--stripe", type=Profile.parse, default=Profile(250, 50))
+    parser.add_argument("--paypal", type=Profile.parse, default=Profile(300, 80))
+    args = parser.parse_args()
+
+    asyncio.run(serve(args.host, [
+        (minimax_app(args.minimax), args.minimax_port),
+        (stripe_app(args.stripe), args.stripe_port),
+        (paypal_app(args.paypal), args.paypal_port),
+    ]))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,157 @@
+"""Time the hot queries against a seeded database and print their EXPLAIN plans.
+
+Parameters are sampled from the data itself (see benchmarks/seed.py), so skewed users and old
+partitions are exercised the way production traffic does. Use --output to keep a JSON report
+for comparing schema or index changes.
+"""
+import argparse
+import asyncio
+import json
+import time
+from dataclasses import dataclass, asdict
+from datetime import datetime
+from typing import Callable, List, Optional
+from app.database import engine
+from app.jobs.payment_history_partitions import PENDING_PAYMENT_LOOKBACK
+
+SAMPLE_SIZE = 500
+
+@dataclass
+class QueryCase:
+    name: str
+    sql: str
+    params: Callable[[dict], tuple]
+    sample: str
+
+@dataclass
+class QueryResult:
+    name: str
+    iterations: int
+    mean_ms: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    plan: str
+
+CASES = [
+    QueryCase(
+        name="webhook_correlation",
+        sql=(
+            "SELECT * FROM payment_history "
+            "WHERE provider = 'stripe' AND created_at >= $2 AND external_id = $1 "
+            "AND event_type = ANY($3::varchar[])"
+        ),
+        params=lambda row: (
+            row["external_id"],
+            datetime.utcnow() - PENDING_PAYMENT_LOOKBACK,
+            ["character_payment_created", "voice_payment_created"]
+        ),
+        sample=(
+            "SELECT external_id FROM payment_history TABLESAMPLE SYSTEM (1) "
+            "WHERE provider = 'stripe' AND created_at >= now() AT TIME ZONE 'utc' - interval '30 days'"
+        )
+    ),
+    QueryCase(
+        name="subscription_lookup",
+        sql="SELECT id, subscription_status, payment_method FROM users WHERE subscription_id = $1",
+        params=lambda row: (row["subscription_id"],),
+        sample="SELECT subscription_id FROM users TABLESAMPLE SYSTEM (5) WHERE subscription_id IS NOT NULL"
+    ),
+    QueryCase(
+        name="history_first_page",
+        sql=(
+            "SELECT id, user_id, event_type, provider, external_id, created_at FROM payment_history "
+            "WHERE user_id = $1 ORDER BY created_at DESC, id DESC LIMIT 51"
+        ),
+        params=lambda row: (row["user_id"],),
+        # Sampled from history rows, so heavy accounts show up as often as they do in traffic
+        sample="SELECT user_id FROM payment_history TABLESAMPLE SYSTEM (1)"
+    ),
+    QueryCase(
+        name="history_deep_page",
+        sql=(
+            "SELECT id, user_id, event_type, provider, external_id, created_at FROM payment_history "
+            "WHERE user_id = $1 AND created_at <= $2 AND (created_at, id) < ($2, $3) "
+            "ORDER BY created_at DESC, id DESC LIMIT 51"
+        ),
+        params=lambda row: (row["user_id"], row["created_at"], row["id"]),
+        sample="SELECT user_id, created_at, id FROM payment_history TABLESAMPLE SYSTEM (1)"
+    ),
+    QueryCase(
+        name="voice_list",
+        sql="SELECT * FROM voice WHERE user_id = $1 AND detail_info = 'Voice Clone'",
+        params=lambda row: (row["user_id"],),
+        sample="SELECT user_id FROM voice TABLESAMPLE SYSTEM (5)"
+    ),
+    QueryCase(
+        name="renewal_due_scan",
+        sql=(
+            "SELECT id FROM users WHERE subscription_end_date <= $1 AND subscription_status = 'ACTIVE' "
+            "AND subscription_cancel_at_period_end IS NOT TRUE ORDER BY subscription_end_date LIMIT 5000"
+        ),
+        params=lambda row: (datetime.utcnow(),),
+        sample="SELECT 1"
+    ),
+]
+
+def percentile(sorted_values: List[float], fraction: float):
+    rank = max(int(round(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+async def run_case(conn, case: QueryCase, iterations: int):
+    samples = await conn.fetch(f"{case.sample} LIMIT {SAMPLE_SIZE}")
+    if not samples:
+        return None
+
+    statement = await conn.prepare(case.sql)
+    timings = []
+    for iteration in range(iterations):
+        params = case.params(samples[iteration % len(samples)])
+        started = time.perf_counter()
+        await statement.fetch(*params)
+        timings.append((time.perf_counter() - started) * 1000)
+
+    plan_rows = await conn.fetch(f"EXPLAIN (ANALYZE, BUFFERS) {case.sql}", *case.params(samples[0]))
+    timings.sort()
+    return QueryResult(
+        name=case.name,
+        iterations=iterations,
+        mean_ms=round(sum(timings) / len(timings), 3),
+        p50_ms=round(percentile(timings, 0.50), 3),
+        p95_ms=round(percentile(timings, 0.95), 3),
+        p99_ms=round(percentile(timings, 0.99), 3),
+        plan="\n".join(row[0] for row in plan_rows)
+    )
+
+async def run(names: List[str], iterations: int, output: Optional[str]):
+    results = []
+    async with engine.connect() as sa_conn:
+        raw = await sa_conn.get_raw_connection()
+        conn = raw.driver_connection
+        for case in CASES:
+            if case.name not in names:
+                continue
+            result = await run_case(conn, case, iterations)
+            if result is None:
+                print(f"{case.name}: no sample rows, skipped")
+                continue
+            results.append(result)
+            print(
+                f"\n{result.name}: mean={result.mean_ms}ms p50={result.p50_ms}ms "
+                f"p95={result.p95_ms}ms p99={result.p99_ms}ms\n{result.plan}"
+            )
+
+    if output:
+        with open(output, "w") as output_file:
+            json.dump([asdict(result) for result in results], output_file, indent=2)
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--queries", nargs="+", choices=[case.name for case in CASES], default=[case.name for case in CASES])
+    parser.add_argument("--iterations", type=int, default=200)
+    parser.add_argument("--output", default=None)
+    args = parser.parse_args()
+    asyncio.run(run(args.queries, args.iterations, args.output))
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,258 @@
+"""Drive the API at fixed concurrency levels and report latency percentiles and throughput.
+
+Start benchmarks/fake_upstreams.py and the API pointed at it first. The benchmark user must
+exist, be verified and have enough character balance for the TTS scenarios; benchmarks/seed.py
+creates one. Results are saved under benchmarks/results/ and can be compared against an earlier
+run with --compare.
+"""
+import argparse
+import asyncio
+import hashlib
+import hmac
+import json
+import os
+import subprocess
+import time
+import uuid
+from dataclasses import dataclass, field, asdict
+from typing import Awaitable, Callable, Dict, List, Optional
+import httpx
+
+RESULTS_DIR = os.path.join(os.path.dirname(__file__), "results")
+DEFAULT_CONCURRENCY = [1, 8, 32]
+TTS_TEXT = "The quick brown fox jumps over the lazy dog. " * 6
+
+Scenario = Callable[[httpx.AsyncClient, "Context"], Awaitable[httpx.Response]]
+
+@dataclass
+class Context:
+    email: str
+    password: str
+    stripe_webhook_secret: str
+    token: Optional[str] = None
+
+    @property
+    def auth(self):
+        return {"Authorization": f"Bearer {self.token}"}
+
+@dataclass
+class LevelResult:
+    scenario: str
+    concurrency: int
+    requests: int
+    errors: int
+    rps: float
+    p50_ms: float
+    p95_ms: float
+    p99_ms: float
+    max_ms: float
+    status_codes: Dict[str, int] = field(default_factory=dict)
+
+def percentile(sorted_values: List[float], fraction: float):
+    if not sorted_values:
+        return 0.0
+    rank = max(int(round(fraction * len(sorted_values))) - 1, 0)
+    return sorted_values[min(rank, len(sorted_values) - 1)]
+
+async def auth_token(client: httpx.AsyncClient, context: Context):
+    return await client.post("/api/auth/token", data={"username": context.email, "password": context.password})
+
+def tts_payload(stream: bool):
+    return {
+        "text": TTS_TEXT,
+        "model": "speech-02-hd",
+        "voice_settings": {"voice_id": "Wise_Woman"},
+        "stream": stream
+    }
+
+async def tts_buffered(client: httpx.AsyncClient, context: Context):
+    return await client.post("/api/api_integration/generate", json=tts_payload(False), headers=context.auth)
+
+async def tts_streamed(client: httpx.AsyncClient, context: Context):
+    # Latency covers the whole body, since that is what a listener waits for
+    async with client.stream("POST", "/api/api_integration/generate", json=tts_payload(True), headers=context.auth) as response:
+        async for _ in response.aiter_bytes():
+            pass
+    return response
+
+async def clone_list(client: httpx.AsyncClient, context: Context):
+    return await client.get("/api/voice_id/clonelist", headers=context.auth)
+
+async def design_list(client: httpx.AsyncClient, context: Context):
+    return await client.get("/api/voice_id/designlist", headers=context.auth)
+
+async def stripe_webhook(client: httpx.AsyncClient, context: Context):
+    payload = json.dumps({
+        "id": f"evt_{uuid.uuid4().hex[:24]}",
+        "object": "event",
+        "type": "customer.updated",
+        "data": {"object": {"id": f"cus_{uuid.uuid4().hex[:14]}", "object": "customer"}}
+    })
+    timestamp = int(time.time())
+    signature = hmac.new(
+        context.stripe_webhook_secret.encode(),
+        f"{timestamp}.{payload}".encode(),
+        hashlib.sha256
+    ).hexdigest()
+    return await client.post(
+        "/api/stripe/webhook/",
+        content=payload,
+        headers={"Content-Type": "application/json", "Stripe-Signature": f"t={timestamp},v1={signature}"}
+    )
+
+async def paypal_webhook(client: httpx.AsyncClient, context: Context):
+    # Verified through the fake PayPal verify endpoint (PAYPAL_WEBHOOK_VERIFICATION=remote)
+    body = {
+        "id": f"WH-{uuid.uuid4().hex[:20].upper()}",
+        "event_type": "CATALOG.PRODUCT.UPDATED",
+        "resource": {"id": uuid.uuid4().hex[:12].upper()}
+    }
+    return await client.post(
+        "/api/paypal/paypal-webhook",
+        json=body,
+        headers={
+            "PAYPAL-TRANSMISSION-ID": str(uuid.uuid4()),
+            "PAYPAL-TRANSMISSION-TIME": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "PAYPAL-TRANSMISSION-SIG": "benchmark",
+            "PAYPAL-CERT-URL": "https://api-m.sandbox.paypal.com/v1/notifications/certs/benchmark",
+            "PAYPAL-AUTH-ALGO": "SHA256withRSA"
+        }
+    )
+
+SCENARIOS: Dict[str, Scenario] = {
+    "auth_token": auth_token,
+    "tts_buffered": tts_buffered,
+    "tts_streamed": tts_streamed,
+    "voice_clone_list": clone_list,
+    "voice_design_list": design_list,
+    "stripe_webhook": stripe_webhook,
+    "paypal_webhook": paypal_webhook,
+}
+
+async def run_level(client: httpx.AsyncClient, context: Context, name: str, concurrency: int, duration: float):
+    scenario = SCENARIOS[name]
+    latencies: List[float] = []
+    status_codes: Dict[str, int] = {}
+    errors = 0
+    deadline = time.perf_counter() + duration
+
+    async def user_loop():
+        nonlocal errors
+        while time.perf_counter() < deadline:
+            started = time.perf_counter()
+            try:
+                response = await scenario(client, context)
+                code = str(response.status_code)
+                if response.status_code >= 400:
+                    errors += 1
+            except httpx.HTTPError as e:
+                code = type(e).__name__
+                errors += 1
+            latencies.append((time.perf_counter() - started) * 1000)
+            status_codes[code] = status_codes.get(code, 0) + 1
+
+    started = time.perf_counter()
+    await asyncio.gather(*(user_loop() for _ in range(concurrency)))
+    elapsed = time.perf_counter() - started
+
+    latencies.sort()
+    return LevelResult(
+        scenario=name,
+        concurrency=concurrency,
+        requests=len(latencies),
+        errors=errors,
+        rps=round(len(latencies) / elapsed, 1),
+        p50_ms=round(percentile(latencies, 0.50), 1),
+        p95_ms=round(percentile(latencies, 0.95), 1),
+        p99_ms=round(percentile(latencies, 0.99), 1),
+        max_ms=round(latencies[-1], 1) if latencies else 0.0,
+        status_codes=status_codes
+    )
+
+async def login(client: httpx.AsyncClient, context: Context):
+    response = await auth_token(client, context)
+    response.raise_for_status()
+    context.token = response.json()["access_token"]
+
+async def run(args):
+    context = Context(args.email, args.password, args.stripe_webhook_secret)
+    limits = httpx.Limits(max_connections=max(args.concurrency) * 2, max_keepalive_connections=max(args.concurrency))
+    results: List[LevelResult] = []
+
+    async with httpx.AsyncClient(base_url=args.base_url, limits=limits, timeout=60.0, verify=False) as client:
+        await login(client, context)
+        for name in args.scenarios:
+            for concurrency in args.concurrency:
+                if args.warmup:
+                    await run_level(client, context, name, concurrency, args.warmup)
+                result = await run_level(client, context, name, concurrency, args.duration)
+                results.append(result)
+                print_result(result)
+    return results
+
+def print_result(result: LevelResult):
+    print(
+        f"{result.scenario:<18} c={result.concurrency:<4} n={result.requests:<7} "
+        f"rps={result.rps:<8} p50={result.p50_ms:<8} p95={result.p95_ms:<8} p99={result.p99_ms:<8} "
+        f"errors={result.errors}"
+    )
+
+def git_revision():
+    try:
+        return subprocess.check_output(["git", "rev-parse", "--short", "HEAD"], text=True).strip()
+    except (OSError, subprocess.CalledProcessError):
+        return "unknown"
+
+def save(results: List[LevelResult], label: str, args):
+    os.makedirs(RESULTS_DIR, exist_ok=True)
+    path = os.path.join(RESULTS_DIR, f"{label}.json")
+    with open(path, "w") as results_file:
+        json.dump({
+            "label": label,
+            "revision": git_revision(),
+            "recorded_at": time.strftime("%Y-%m-%dT%H:%M:%SZ", time.gmtime()),
+            "duration": args.duration,
+            "results": [asdict(result) for result in results]
+        }, results_file, indent=2)
+    return path
+
+def compare(results: List[LevelResult], baseline_path: str):
+    with open(baseline_path) as baseline_file:
+        baseline = {
+            (entry["scenario"], entry["concurrency"]): entry
+            for entry in json.load(baseline_file)["results"]
+        }
+
+    print(f"\nCompared with {baseline_path}")
+    for result in results:
+        before = baseline.get((result.scenario, result.concurrency))
+        if before is None:
+            continue
+        deltas = []
+        for metric in ("rps", "p50_ms", "p95_ms", "p99_ms"):
+            old, new = before[metric], getattr(result, metric)
+            change = (new - old) / old * 100 if old else 0.0
+            deltas.append(f"{metric} {old} -> {new} ({change:+.1f}%)")
+        print(f"{result.scenario:<18} c={result.concurrency:<4} " + "  ".join(deltas))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--base-url", default=os.environ.get("BENCH_BASE_URL", "http://127.0.0.1:8000"))
+    parser.add_argument("--email", default=os.environ.get("BENCH_EMAIL", "bench-user-0@example.com"))
+    parser.add_argument("--password", default=os.environ.get("BENCH_PASSWORD", "benchmark"))
+    parser.add_argument("--stripe-webhook-secret", default=os.environ.get("STRIPE_WEBHOOK_SECRET", ""))
+    parser.add_argument("--scenarios", nargs="+", choices=list(SCENARIOS), default=list(SCENARIOS))
+    parser.add_argument("--concurrency", nargs="+", type=int, default=DEFAULT_CONCURRENCY)
+    parser.add_argument("--duration", type=float, default=20.0, help="seconds per scenario and concurrency level")
+    parser.add_argument("--warmup", type=float, default=3.0, help="unrecorded seconds before each level")
+    parser.add_argument("--label", default=None, help="results file name, defaults to the git revision")
+    parser.add_argument("--compare", default=None, help="baseline results file to diff against")
+    args = parser.parse_args()
+
+    results = asyncio.run(run(args))
+    print(f"\nSaved {save(results, args.label or git_revision(), args)}")
+    if args.compare:
+        compare(results, args.compare)
+
+if __name__ == "__main__":
+    main()
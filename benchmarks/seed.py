@@ -0,0 +1,210 @@
+"""Bulk-load a production-sized synthetic dataset into users, voice and payment_history.
+
+Rows are streamed with COPY in chunks. Activity is skewed the way real accounts are: most users
+have a handful of payment events and no custom voices, while a small tail has thousands.
+bench-user-0@example.com (password "benchmark") is verified, active and funded for benchmarks/run.py.
+Run it against an empty database; the bench-user emails are unique.
+"""
+import argparse
+import asyncio
+import bisect
+import itertools
+import json
+import random
+import time
+import uuid
+from datetime import datetime, timedelta
+from passlib.context import CryptContext
+from sqlalchemy import text
+from app.config import settings
+from app.database import engine
+from app.jobs.payment_history_partitions import ensure_partitions
+
+CHUNK_SIZE = 50000
+BENCH_PASSWORD = "benchmark"
+# Weights for users.subscription_status, by enum name
+STATUS_WEIGHTS = {"INACTIVE": 70, "ACTIVE": 20, "CANCELLED": 5, "PAST_DUE": 3, "PENDING": 2}
+STRIPE_EVENTS = [
+    ("checkout_session_created", 25),
+    ("character_payment_created", 15),
+    ("character_payment_completed", 12),
+    ("voice_payment_created", 5),
+    ("voice_payment_completed", 4),
+    ("subscription_activated", 10),
+    ("subscription_updated", 8),
+    ("payment_received", 18),
+    ("subscription_cancelled", 3),
+]
+PAYPAL_EVENTS = [
+    ("subscription_created", 25),
+    ("one_time_payment_created", 20),
+    ("voice_payment_created", 5),
+    ("subscription_activated", 10),
+    ("payment_received", 20),
+    ("payment_completed", 17),
+    ("subscription_cancelled", 3),
+]
+
+USER_COLUMNS = [
+    "id", "email", "hashed_password", "auth_provider", "is_verified", "created_at", "updated_at",
+    "subscription_status", "subscription_id", "subscription_plan_id", "subsrciption_start_date",
+    "subscription_end_date", "subscription_cancel_at_period_end", "subscription_auto_renew", "payment_method",
+    "character_balance", "voice_balance", "month_character_balance", "month_voice_balance",
+]
+VOICE_COLUMNS = ["user_id", "voice_id", "detail_info", "created_at"]
+PAYMENT_COLUMNS = ["user_id", "event_type", "provider", "external_id", "event_data", "created_at"]
+
+def weighted(choices):
+    values, weights = zip(*choices)
+    return list(values), list(itertools.accumulate(weights))
+
+def activity_weights(user_count: int, rng: random.Random):
+    # Pareto weights: a few heavy accounts carry most of the history, like real traffic
+    return list(itertools.accumulate(rng.paretovariate(1.2) for _ in range(user_count)))
+
+def pick(cumulative, rng: random.Random):
+    return bisect.bisect_left(cumulative, rng.random() * cumulative[-1])
+
+def plan_ids():
+    ids = {
+        "stripe": [plan for plan in (settings.STRIPE_PRO_PRICE_ID, settings.STRIPE_BUSINESS_PRICE_ID) if plan],
+        "paypal": [plan for plan in (settings.PAYPAL_PRO_PALN_ID, settings.PAYPAL_BUSINESS_PLAN_ID) if plan],
+    }
+    return {provider: plans or [f"{provider}_plan_pro", f"{provider}_plan_business"] for provider, plans in ids.items()}
+
+def user_rows(first_id: int, count: int, hashed_password: str, since: datetime, rng: random.Random):
+    statuses, status_weights = weighted(STATUS_WEIGHTS.items())
+    plans = plan_ids()
+    now = datetime.utcnow()
+    span = (now - since).total_seconds()
+
+    for offset in range(count):
+        user_id = first_id + offset
+        created_at = since + timedelta(seconds=rng.random() * span)
+        status = "ACTIVE" if offset == 0 else rng.choices(statuses, cum_weights=status_weights)[0]
+        subscription_id = plan_id = start_date = end_date = payment_method = None
+
+        if status != "INACTIVE":
+            payment_method = "stripe" if rng.random() < 0.7 else "paypal"
+            subscription_id = (
+                f"sub_{uuid.UUID(int=rng.getrandbits(128)).hex[:24]}" if payment_method == "stripe"
+                else f"I-{uuid.UUID(int=rng.getrandbits(128)).hex[:12].upper()}"
+            )
+            plan_id = rng.choice(plans[payment_method])
+            end_date = now + timedelta(days=rng.uniform(-5, 30))
+            start_date = (end_date - timedelta(days=30)).isoformat()
+
+        yield (
+            user_id,
+            f"bench-user-{offset}@example.com",
+            hashed_password,
+            "local",
+            True if offset == 0 else rng.random() < 0.9,
+            created_at,
+            created_at,
+            status,
+            subscription_id,
+            plan_id,
+            start_date,
+            end_date,
+            rng.random() < 0.05,
+            True,
+            payment_method,
+            1000000000 if offset == 0 else rng.choice([0, 0, 0, 500000, 1000000]),
+            rng.choice([0, 0, 1]),
+            2000000 if status == "ACTIVE" else 0,
+            2 if status == "ACTIVE" else 0,
+        )
+
+def voice_rows(first_user_id: int, cumulative, count: int, since: datetime, rng: random.Random):
+    span = (datetime.utcnow() - since).total_seconds()
+    for _ in range(count):
+        yield (
+            first_user_id + pick(cumulative, rng),
+            f"voice{uuid.UUID(int=rng.getrandbits(128)).hex[:16]}",
+            "Voice Clone" if rng.random() < 0.6 else "Voice Design",
+            since + timedelta(seconds=rng.random() * span),
+        )
+
+def payment_rows(first_user_id: int, cumulative, count: int, since: datetime, rng: random.Random):
+    stripe_events, stripe_weights = weighted(STRIPE_EVENTS)
+    paypal_events, paypal_weights = weighted(PAYPAL_EVENTS)
+    span = (datetime.utcnow() - since).total_seconds()
+
+    for _ in range(count):
+        provider = "stripe" if rng.random() < 0.7 else "paypal"
+        if provider == "stripe":
+            event_type = rng.choices(stripe_events, cum_weights=stripe_weights)[0]
+            external_id = f"cs_{uuid.UUID(int=rng.getrandbits(128)).hex}"
+        else:
+            event_type = rng.choices(paypal_events, cum_weights=paypal_weights)[0]
+            external_id = uuid.UUID(int=rng.getrandbits(128)).hex[:17].upper()
+        # Skewed towards recent months, as traffic grows
+        created_at = since + timedelta(seconds=span * rng.random() ** 0.7)
+        event_data = {
+            "amount": rng.choice([999, 1999, 4999, 9999]),
+            "currency": "usd",
+            "tier": rng.choice(["small", "medium", "large", "pro", "business"]),
+            "metadata": {"source": "seed", "attempt": rng.randint(1, 3)},
+        }
+        yield (
+            first_user_id + pick(cumulative, rng),
+            event_type,
+            provider,
+            external_id,
+            json.dumps(event_data),
+            created_at,
+        )
+
+async def copy_chunks(table: str, columns, rows, total: int):
+    loaded = 0
+    started = time.monotonic()
+    while True:
+        chunk = list(itertools.islice(rows, CHUNK_SIZE))
+        if not chunk:
+            break
+        async with engine.begin() as conn:
+            raw = await conn.get_raw_connection()
+            await raw.driver_connection.copy_records_to_table(table, records=chunk, columns=columns)
+        loaded += len(chunk)
+        print(f"{table}: {loaded}/{total} rows ({loaded / (time.monotonic() - started):.0f} rows/s)", flush=True)
+
+async def run(args):
+    rng = random.Random(args.seed)
+    since = datetime.utcnow() - timedelta(days=30 * args.months)
+    hashed_password = CryptContext(schemes=["bcrypt"]).hash(BENCH_PASSWORD)
+
+    async with engine.begin() as conn:
+        await ensure_partitions(conn, months_back=args.months)
+        first_id = (await conn.execute(text("SELECT COALESCE(max(id), 0) + 1 FROM users"))).scalar()
+
+    await copy_chunks("users", USER_COLUMNS, user_rows(first_id, args.users, hashed_password, since, rng), args.users)
+
+    async with engine.begin() as conn:
+        await conn.execute(text("SELECT setval(pg_get_serial_sequence('users', 'id'), (SELECT max(id) FROM users))"))
+
+    cumulative = activity_weights(args.users, rng)
+    await copy_chunks("voice", VOICE_COLUMNS, voice_rows(first_id, cumulative, args.voices, since, rng), args.voices)
+    await copy_chunks(
+        "payment_history",
+        PAYMENT_COLUMNS,
+        payment_rows(first_id, cumulative, args.payments, since, rng),
+        args.payments
+    )
+
+    async with engine.begin() as conn:
+        for table in ("users", "voice", "payment_history"):
+            await conn.execute(text(f"ANALYZE {table}"))
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--users", type=int, default=300000)
+    parser.add_argument("--voices", type=int, default=500000)
+    parser.add_argument("--payments", type=int, default=5000000)
+    parser.add_argument("--months", type=int, default=18, help="history spread over this many months")
+    parser.add_argument("--seed", type=int, default=42)
+    args = parser.parse_args()
+    asyncio.run(run(args))
+
+if __name__ == "__main__":
+    main()
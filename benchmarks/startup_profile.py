@@ -0,0 +1,58 @@
+"""Profile `import main` with -X importtime and enforce an import-time budget.
+
+Prints the slowest top-level imports and exits non-zero when the total exceeds --budget-ms,
+so CI catches a new eager import of a heavy SDK before it reaches cold starts.
+"""
+import argparse
+import os
+import subprocess
+import sys
+from typing import List, Tuple
+
+IMPORT_BUDGET_MS = 1500
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+
+def profile_imports(module: str):
+    completed = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        cwd=ROOT,
+        capture_output=True,
+        text=True
+    )
+    if completed.returncode != 0:
+        sys.stderr.write(completed.stderr)
+        raise SystemExit(f"import {module} failed")
+
+    # Lines look like "import time:  self [us] |  cumulative | imported package";
+    # nesting is shown by indentation, so unindented names are what the module itself pulled in
+    top_level: List[Tuple[str, int]] = []
+    for line in completed.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        name = name[1:]
+        if name.startswith(" "):
+            continue
+        top_level.append((name.strip(), int(cumulative)))
+    return top_level
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__, formatter_class=argparse.RawDescriptionHelpFormatter)
+    parser.add_argument("--module", default="main")
+    parser.add_argument("--budget-ms", type=float, default=IMPORT_BUDGET_MS)
+    parser.add_argument("--top", type=int, default=15)
+    args = parser.parse_args()
+
+    top_level = profile_imports(args.module)
+    total_ms = sum(cumulative for _, cumulative in top_level) / 1000
+
+    print(f"{'cumulative ms':>14}  module")
+    for name, cumulative in sorted(top_level, key=lambda entry: entry[1], reverse=True)[:args.top]:
+        print(f"{cumulative / 1000:>14.1f}  {name}")
+    print(f"\nimport {args.module}: {total_ms:.1f}ms (budget {args.budget_ms:.0f}ms)")
+
+    if total_ms > args.budget_ms:
+        raise SystemExit(1)
+
+if __name__ == "__main__":
+    main()
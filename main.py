@@ -1,22 +1,21 @@
-from fastapi import FastAPI
+from fastapi import FastAPI, Response, status
 from fastapi.middleware.cors import CORSMiddleware
-from app.routers import user, auth, api_integration, paypal, stripe, voice_id
-from app.database import engine, Base
-import ssl
-import uvicorn
+from app.routers import user, auth, api_integration, audio, paypal, stripe, voice_id, metrics
+from app.services import audio_store, minimax_client, paypal_client, stripe_gateway, webhook_queue, usage_recorder, tracing
+from app.services.metrics import MetricsMiddleware
+from app.services.tracing import TracingMiddleware
+from app import startup
 import logging
 from pydantic import BaseModel
 
 app = FastAPI()
+app.state.ready = False
 
 class MemeberResponse(BaseModel):
     username: str
     role_name: str
     access_level: str
     
-ssl_context = ssl.SSLContext(ssl.PROTOCOL_TLS_CLIENT)
-ssl_context.load_cert_chain('ssl/cert.pem', keyfile='ssl/key.pem')
-
 origins = [
     "*"
 ]
@@ -28,23 +27,46 @@ app.add_middleware(
     allow_methods = ["*"],
     allow_headers = ["*"]
 )
+app.add_middleware(MetricsMiddleware)
+app.add_middleware(TracingMiddleware)
 
 app.include_router(auth.router, prefix="/api/auth", tags=["auth"])
 app.include_router(user.router, prefix="/api/users", tags=["users"])
 app.include_router(api_integration.router, prefix="/api/api_integration", tags=["api_integration"])
 app.include_router(paypal.router, prefix="/api/paypal", tags=["paypal"])
-app.include_router(stripe.router, prefix="api/stripe", tags=["stripe"])
-app.include_router(voice_id.router, prefix="api/voice_id", tags=["voice_id"])
+app.include_router(stripe.router, prefix="/api/stripe", tags=["stripe"])
+app.include_router(voice_id.router, prefix="/api/voice_id", tags=["voice_id"])
+app.include_router(metrics.router, prefix="/metrics", tags=["metrics"])
+app.include_router(audio.router, prefix=audio_store.AUDIO_URL_PATH, tags=["audio"])
+
+@app.get("/health/ready", include_in_schema=False)
+async def readiness():
+    if not app.state.ready:
+        return Response(status_code=status.HTTP_503_SERVICE_UNAVAILABLE)
+    return {"status": "ready"}
 
-async def init_models():
-    async with engine.begin() as conn:
-        await conn.run_sync(Base.metadata.create_all)
-        
 @app.on_event("startup")
 async def on_startup():
-    await init_models()
+    await startup.prepare_database()
+    await webhook_queue.start()
+    await usage_recorder.start()
+    await tracing.start()
+    if startup.WARMUP:
+        await startup.warmup()
+    app.state.ready = True
+
+@app.on_event("shutdown")
+async def on_shutdown():
+    app.state.ready = False
+    await webhook_queue.stop()
+    await usage_recorder.stop()
+    await tracing.stop()
+    await paypal_client.close()
+    await stripe_gateway.close()
+    minimax_client.close()
 
 if __name__ == "__main__":
+    import uvicorn
     
     ssl_keyfile = "ssl/key.pem"
     ssl_certfile = "ssl/cert.pem"
@@ -0,0 +1,63 @@
+-- Structured payment_history: provider/external_id columns, JSONB event_data.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0001_payment_history_structured.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS schema_version (
+    version integer PRIMARY KEY,
+    applied_at timestamp NOT NULL DEFAULT now()
+);
+
+ALTER TABLE payment_history
+    ADD COLUMN IF NOT EXISTS provider varchar,
+    ADD COLUMN IF NOT EXISTS external_id varchar;
+
+-- Older rows were written with str(dict), which is a Python repr and not JSON.
+-- Keep those readable by wrapping the raw text instead of failing the cast.
+CREATE OR REPLACE FUNCTION pg_temp.try_jsonb(raw text) RETURNS jsonb AS $$
+BEGIN
+    RETURN raw::jsonb;
+EXCEPTION WHEN others THEN
+    RETURN jsonb_build_object('legacy_repr', raw);
+END;
+$$ LANGUAGE plpgsql IMMUTABLE;
+
+ALTER TABLE payment_history
+    ALTER COLUMN event_data TYPE jsonb USING pg_temp.try_jsonb(event_data);
+
+-- Stripe checkout rows created by the API
+UPDATE payment_history
+SET provider = 'stripe', external_id = event_data->>'session_id'
+WHERE provider IS NULL AND event_data ? 'session_id';
+
+-- Stripe webhook payloads (checkout sessions, subscriptions, invoices)
+UPDATE payment_history
+SET provider = 'stripe', external_id = event_data->>'id'
+WHERE provider IS NULL
+  AND event_data->>'object' IN ('checkout.session', 'subscription', 'invoice');
+
+-- PayPal orders and subscriptions created by the API
+UPDATE payment_history
+SET provider = 'paypal', external_id = event_data->>'paypal_order_id'
+WHERE provider IS NULL AND event_data ? 'paypal_order_id';
+
+UPDATE payment_history
+SET provider = 'paypal', external_id = event_data->>'subscription_id'
+WHERE provider IS NULL AND event_data ? 'subscription_id';
+
+-- PayPal webhook payloads
+UPDATE payment_history
+SET provider = 'paypal',
+    external_id = COALESCE(
+        event_data->'resource'->'supplementary_data'->'related_ids'->>'order_id',
+        event_data->'resource'->>'billing_agreement_id',
+        event_data->'resource'->>'id'
+    )
+WHERE provider IS NULL AND event_data ? 'resource' AND event_data ? 'event_type';
+
+CREATE INDEX IF NOT EXISTS ix_payment_history_provider_external_id
+    ON payment_history (provider, external_id);
+
+INSERT INTO schema_version (version) VALUES (1) ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,8 @@
+-- Keyset pagination index for per-user payment history listing.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0002_payment_history_user_keyset_index.sql
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_payment_history_user_created_id
+    ON payment_history (user_id, created_at, id);
+
+INSERT INTO schema_version (version) VALUES (2) ON CONFLICT DO NOTHING;
@@ -0,0 +1,59 @@
+-- Range-partition payment_history by month on created_at and compress event_data.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0003_payment_history_partitioning.sql
+-- Takes an ACCESS EXCLUSIVE lock on payment_history while rows are copied; run in a maintenance window.
+
+BEGIN;
+
+ALTER TABLE payment_history RENAME TO payment_history_unpartitioned;
+ALTER INDEX IF EXISTS ix_payment_history_provider_external_id RENAME TO ix_payment_history_unpartitioned_provider_external_id;
+ALTER INDEX IF EXISTS ix_payment_history_user_created_id RENAME TO ix_payment_history_unpartitioned_user_created_id;
+
+CREATE TABLE payment_history (
+    id integer NOT NULL DEFAULT nextval('payment_history_id_seq'),
+    user_id integer REFERENCES users (id),
+    event_type varchar NOT NULL,
+    provider varchar,
+    external_id varchar,
+    event_data jsonb COMPRESSION lz4,
+    created_at timestamp NOT NULL DEFAULT now(),
+    PRIMARY KEY (id, created_at)
+) PARTITION BY RANGE (created_at);
+
+ALTER SEQUENCE payment_history_id_seq OWNED BY payment_history.id;
+
+CREATE INDEX ix_payment_history_provider_external_id ON payment_history (provider, external_id);
+CREATE INDEX ix_payment_history_user_created_id ON payment_history (user_id, created_at, id);
+
+CREATE TABLE payment_history_default PARTITION OF payment_history DEFAULT;
+
+DO $$
+DECLARE
+    month_start date;
+    last_month date := date_trunc('month', now() + interval '2 months')::date;
+BEGIN
+    SELECT COALESCE(date_trunc('month', min(created_at)), date_trunc('month', now()))::date
+    INTO month_start
+    FROM payment_history_unpartitioned;
+
+    WHILE month_start <= last_month LOOP
+        EXECUTE format(
+            'CREATE TABLE IF NOT EXISTS %I PARTITION OF payment_history FOR VALUES FROM (%L) TO (%L) '
+            'WITH (toast_tuple_target = 256)',
+            'payment_history_' || to_char(month_start, 'YYYY_MM'),
+            month_start,
+            (month_start + interval '1 month')::date
+        );
+        month_start := (month_start + interval '1 month')::date;
+    END LOOP;
+END
+$$;
+
+INSERT INTO payment_history (id, user_id, event_type, provider, external_id, event_data, created_at)
+SELECT id, user_id, event_type, provider, external_id, event_data, COALESCE(created_at, now())
+FROM payment_history_unpartitioned;
+
+DROP TABLE payment_history_unpartitioned;
+
+INSERT INTO schema_version (version) VALUES (3) ON CONFLICT DO NOTHING;
+
+COMMIT;
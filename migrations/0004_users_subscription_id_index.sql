@@ -0,0 +1,7 @@
+-- Index users.subscription_id for webhook and subscription lookups.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0004_users_subscription_id_index.sql
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_subscription_id ON users (subscription_id);
+
+INSERT INTO schema_version (version) VALUES (4) ON CONFLICT DO NOTHING;
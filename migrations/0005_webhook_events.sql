@@ -0,0 +1,26 @@
+-- Durable inbox for provider webhooks, processed by the background worker pool.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0005_webhook_events.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS webhook_events (
+    id serial PRIMARY KEY,
+    provider varchar NOT NULL,
+    event_id varchar,
+    event_type varchar,
+    payload jsonb NOT NULL,
+    status varchar NOT NULL DEFAULT 'pending',
+    attempts integer NOT NULL DEFAULT 0,
+    last_error varchar,
+    next_attempt_at timestamp NOT NULL DEFAULT now(),
+    locked_at timestamp,
+    created_at timestamp DEFAULT now(),
+    processed_at timestamp
+);
+
+CREATE INDEX IF NOT EXISTS ix_webhook_events_status_next_attempt
+    ON webhook_events (status, next_attempt_at);
+
+INSERT INTO schema_version (version) VALUES (5) ON CONFLICT DO NOTHING;
+
+COMMIT;
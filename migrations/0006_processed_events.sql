@@ -0,0 +1,23 @@
+-- Provider event ids that have been handled, so redeliveries are skipped.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0006_processed_events.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS processed_events (
+    id serial PRIMARY KEY,
+    provider varchar NOT NULL,
+    event_id varchar NOT NULL,
+    processed_at timestamp DEFAULT now(),
+    CONSTRAINT uq_processed_events_provider_event_id UNIQUE (provider, event_id)
+);
+
+-- Events already handled through the webhook inbox
+INSERT INTO processed_events (provider, event_id, processed_at)
+SELECT provider, event_id, processed_at
+FROM webhook_events
+WHERE status = 'done' AND event_id IS NOT NULL
+ON CONFLICT DO NOTHING;
+
+INSERT INTO schema_version (version) VALUES (6) ON CONFLICT DO NOTHING;
+
+COMMIT;
@@ -0,0 +1,7 @@
+-- Index users.subscription_end_date so the renewal job finds due subscribers without a full scan.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0007_users_subscription_end_date_index.sql
+-- CREATE INDEX CONCURRENTLY cannot run inside a transaction block.
+
+CREATE INDEX CONCURRENTLY IF NOT EXISTS ix_users_subscription_end_date ON users (subscription_end_date);
+
+INSERT INTO schema_version (version) VALUES (7) ON CONFLICT DO NOTHING;
@@ -0,0 +1,23 @@
+-- Per-request usage records written in batches by the usage recorder.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0008_usage_records.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS usage_records (
+    id bigserial PRIMARY KEY,
+    user_id integer NOT NULL,
+    operation varchar NOT NULL,
+    voice_id varchar,
+    model varchar,
+    characters integer NOT NULL DEFAULT 0,
+    audio_bytes integer NOT NULL DEFAULT 0,
+    upstream_latency_ms integer,
+    cache_hit boolean NOT NULL DEFAULT false,
+    created_at timestamp NOT NULL DEFAULT now()
+);
+
+CREATE INDEX IF NOT EXISTS ix_usage_records_user_created ON usage_records (user_id, created_at);
+
+INSERT INTO schema_version (version) VALUES (8) ON CONFLICT DO NOTHING;
+
+COMMIT;
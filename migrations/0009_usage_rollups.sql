@@ -0,0 +1,46 @@
+-- Hourly and daily usage rollups maintained by the usage recorder, backfilled from usage_records.
+-- Apply with: psql "$DATABASE_URL" -v ON_ERROR_STOP=1 -f migrations/0009_usage_rollups.sql
+
+BEGIN;
+
+CREATE TABLE IF NOT EXISTS usage_hourly (
+    user_id integer NOT NULL,
+    bucket_start timestamp NOT NULL,
+    operation varchar NOT NULL,
+    voice_id varchar NOT NULL DEFAULT '',
+    model varchar NOT NULL DEFAULT '',
+    requests integer NOT NULL DEFAULT 0,
+    characters bigint NOT NULL DEFAULT 0,
+    audio_bytes bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket_start, operation, voice_id, model)
+);
+
+CREATE TABLE IF NOT EXISTS usage_daily (
+    user_id integer NOT NULL,
+    bucket_start date NOT NULL,
+    operation varchar NOT NULL,
+    voice_id varchar NOT NULL DEFAULT '',
+    model varchar NOT NULL DEFAULT '',
+    requests integer NOT NULL DEFAULT 0,
+    characters bigint NOT NULL DEFAULT 0,
+    audio_bytes bigint NOT NULL DEFAULT 0,
+    PRIMARY KEY (user_id, bucket_start, operation, voice_id, model)
+);
+
+INSERT INTO usage_hourly (user_id, bucket_start, operation, voice_id, model, requests, characters, audio_bytes)
+SELECT user_id, date_trunc('hour', created_at), operation, COALESCE(voice_id, ''), COALESCE(model, ''),
+       count(*), sum(characters), sum(audio_bytes)
+FROM usage_records
+GROUP BY 1, 2, 3, 4, 5
+ON CONFLICT DO NOTHING;
+
+INSERT INTO usage_daily (user_id, bucket_start, operation, voice_id, model, requests, characters, audio_bytes)
+SELECT user_id, created_at::date, operation, COALESCE(voice_id, ''), COALESCE(model, ''),
+       count(*), sum(characters), sum(audio_bytes)
+FROM usage_records
+GROUP BY 1, 2, 3, 4, 5
+ON CONFLICT DO NOTHING;
+
+INSERT INTO schema_version (version) VALUES (9) ON CONFLICT DO NOTHING;
+
+COMMIT;
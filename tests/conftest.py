@@ -0,0 +1,62 @@
+import asyncio
+import os
+import socket
+import threading
+import time
+import pytest
+import uvicorn
+
+# Database tests run against a disposable Postgres; the app reads DATABASE_URL at import time
+TEST_DATABASE_URL = os.environ.get("TEST_DATABASE_URL")
+if TEST_DATABASE_URL:
+    os.environ["DATABASE_URL"] = TEST_DATABASE_URL
+
+@pytest.fixture
+def database():
+    if not TEST_DATABASE_URL:
+        pytest.skip("TEST_DATABASE_URL is not set")
+
+    from app.database import Base, engine
+    from app.jobs.payment_history_partitions import ensure_partitions
+    import app.models.payment_history, app.models.processed_event, app.models.usage_rollup, app.models.user, app.models.webhook_event
+
+    async def setup():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+            await conn.run_sync(Base.metadata.create_all)
+            await ensure_partitions(conn)
+        await engine.dispose()
+
+    async def teardown():
+        async with engine.begin() as conn:
+            await conn.run_sync(Base.metadata.drop_all)
+        await engine.dispose()
+
+    asyncio.run(setup())
+    yield engine
+    asyncio.run(teardown())
+
+@pytest.fixture
+def serve():
+    # Runs ASGI stand-ins (e.g. benchmarks/fake_upstreams.py) on free local ports; returns the base URL
+    servers = []
+
+    def start(app):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        server = uvicorn.Server(uvicorn.Config(app, host="127.0.0.1", port=port, log_level="warning"))
+        thread = threading.Thread(target=server.run, daemon=True)
+        thread.start()
+        servers.append((server, thread))
+        deadline = time.monotonic() + 5
+        while not server.started:
+            if time.monotonic() > deadline:
+                pytest.fail("stand-in server did not start")
+            time.sleep(0.01)
+        return f"http://127.0.0.1:{port}"
+
+    yield start
+    for server, thread in servers:
+        server.should_exit = True
+        thread.join(timeout=5)
@@ -0,0 +1,105 @@
+import asyncio
+import httpx
+import pytest
+from fastapi import FastAPI
+from benchmarks.fake_upstreams import AUDIO_BYTES_PER_CHAR, Profile, audio, minimax_app
+from app.database import SessionLocal, engine
+from app.models.user import User
+from app.routers import api_integration, audio as audio_router
+from app.routers.security import create_access_token
+from app.services import audio_store, usage_recorder
+from app.services.object_store import FilesystemStore
+
+EMAIL = "speaker@example.com"
+TEXT = "Hello from the fake upstream"
+
+@pytest.fixture
+def api(database, serve, monkeypatch, tmp_path):
+    base = serve(minimax_app(Profile()))
+    monkeypatch.setattr(api_integration, "TTS_URL", f"{base}/v1/t2a_v2?GroupId=test")
+    monkeypatch.setattr(audio_store, "get_store", lambda: FilesystemStore(str(tmp_path)))
+    monkeypatch.setattr(usage_recorder, "_buffer", [])
+
+    app = FastAPI()
+    app.include_router(api_integration.router, prefix="/api/api_integration")
+    app.include_router(audio_router.router, prefix=audio_store.AUDIO_URL_PATH)
+    return app
+
+async def create_user():
+    async with SessionLocal() as db:
+        user = User(
+            email=EMAIL,
+            hashed_password="x",
+            auth_provider="local",
+            is_verified=True,
+            month_character_balance=1000
+        )
+        db.add(user)
+        await db.flush()
+        user_id = user.id
+        await db.commit()
+        return user_id
+
+def test_generate_records_usage_after_commit(api):
+    async def scenario():
+        user_id = await create_user()
+        headers = {"Authorization": f"Bearer {create_access_token({'email': EMAIL})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as http:
+            response = await http.post("/api/api_integration/generate", headers=headers, json={
+                "text": TEXT,
+                "voice_settings": {"voice_id": "Wise_Woman"}
+            })
+        await engine.dispose()
+        return user_id, response
+
+    user_id, response = asyncio.run(scenario())
+    assert response.status_code == 200
+    assert response.headers["content-type"] == "audio/mpeg"
+    assert len(usage_recorder._buffer) == 1
+    recorded = usage_recorder._buffer[0]
+    assert recorded[0] == user_id
+    assert recorded[1] == "tts"
+    assert recorded[4] == len(TEXT)
+
+def test_generate_serves_decoded_audio(api):
+    # The upstream answers with hex in a JSON envelope; clients and the stored file get the audio bytes
+    async def scenario():
+        await create_user()
+        headers = {"Authorization": f"Bearer {create_access_token({'email': EMAIL})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as http:
+            response = await http.post("/api/api_integration/generate", headers=headers, json={
+                "text": TEXT,
+                "voice_settings": {"voice_id": "Wise_Woman"}
+            })
+        await engine.dispose()
+        return response
+
+    response = asyncio.run(scenario())
+    expected = audio(len(TEXT) * AUDIO_BYTES_PER_CHAR)
+    assert response.status_code == 200
+    assert response.content == expected
+    audio_name = response.headers["ETag"].strip('"')
+    with open(audio_store.resolve(audio_name), "rb") as stored:
+        assert stored.read() == expected
+    assert usage_recorder._buffer[0][5] == len(expected)
+
+def test_signed_link_serves_ranges_of_the_stored_audio(api):
+    async def scenario():
+        await create_user()
+        headers = {"Authorization": f"Bearer {create_access_token({'email': EMAIL})}"}
+        async with httpx.AsyncClient(transport=httpx.ASGITransport(app=api), base_url="http://test") as http:
+            generated = await http.post("/api/api_integration/generate", headers=headers, json={
+                "text": TEXT,
+                "voice_settings": {"voice_id": "Wise_Woman"}
+            })
+            location = generated.headers["Content-Location"]
+            ranged = await http.get(location, headers={"Range": "bytes=100-199"})
+            revalidated = await http.get(location, headers={"If-None-Match": generated.headers["ETag"]})
+        await engine.dispose()
+        return ranged, revalidated
+
+    ranged, revalidated = asyncio.run(scenario())
+    assert ranged.status_code == 206
+    assert ranged.content == audio(len(TEXT) * AUDIO_BYTES_PER_CHAR)[100:200]
+    assert ranged.headers["content-type"] == "audio/mpeg"
+    assert revalidated.status_code == 304
@@ -0,0 +1,56 @@
+import asyncio
+from datetime import datetime, timedelta
+from app.database import SessionLocal, engine
+from app.models.payment_history import PaymentHistory
+from app.models.user import User
+from app.services import checkout_cache
+
+async def create_user(db):
+    user = User(email="checkout@example.com", hashed_password="x", auth_provider="local")
+    db.add(user)
+    await db.flush()
+    return user.id
+
+def history(user_id: int, event_type: str, external_id: str, created_at: datetime = None):
+    return PaymentHistory(
+        user_id=user_id,
+        event_type=event_type,
+        provider="stripe",
+        external_id=external_id,
+        event_data={},
+        created_at=created_at or datetime.utcnow()
+    )
+
+def test_idempotency_key_changes_only_when_a_checkout_ends(database):
+    async def scenario():
+        async with SessionLocal() as db:
+            user_id = await create_user(db)
+            key = checkout_cache.make_key("stripe", user_id, "character_pack", "small")
+            fingerprint = checkout_cache.fingerprint({"tier": "small"})
+
+            first = await checkout_cache.idempotency_key(db, key, fingerprint)
+            db.add(history(user_id, "checkout_session_created", "cs_1"))
+            await db.flush()
+            # A second submit while the first checkout is open reuses its key
+            resubmitted = await checkout_cache.idempotency_key(db, key, fingerprint)
+
+            db.add(history(user_id, "payment_succeeded", "cs_1"))
+            await db.flush()
+            after_payment = await checkout_cache.idempotency_key(db, key, fingerprint)
+
+            db.add(history(
+                user_id,
+                "checkout_session_created",
+                "cs_2",
+                datetime.utcnow() - timedelta(seconds=checkout_cache.MAX_TTL + 60)
+            ))
+            await db.flush()
+            after_abandoned = await checkout_cache.idempotency_key(db, key, fingerprint)
+            await db.rollback()
+        await engine.dispose()
+        return first, resubmitted, after_payment, after_abandoned
+
+    first, resubmitted, after_payment, after_abandoned = asyncio.run(scenario())
+    assert resubmitted == first
+    assert after_payment != first
+    assert after_abandoned not in (first, after_payment)
@@ -0,0 +1,119 @@
+import asyncio
+import base64
+import zlib
+from datetime import datetime, timedelta, timezone
+import pytest
+from cryptography import x509
+from cryptography.hazmat.primitives import hashes, serialization
+from cryptography.hazmat.primitives.asymmetric import padding, rsa
+from cryptography.x509.oid import NameOID
+from app.services import paypal_client, paypal_webhook_verifier
+from app.services.paypal_webhook_verifier import WebhookVerificationError, verify_webhook
+
+CERT_URL = "https://api.paypal.com/v1/notifications/certs/CERT-360caa42-fca2a594-test"
+WEBHOOK_ID = "WH-TEST"
+BODY = b'{"id":"WH-1","event_type":"PAYMENT.CAPTURE.COMPLETED","resource":{"id":"ORDER-1"}}'
+
+def make_certificate(key, not_before: datetime, not_after: datetime):
+    name = x509.Name([x509.NameAttribute(NameOID.COMMON_NAME, "messageverificationcerts.paypal.com")])
+    return (
+        x509.CertificateBuilder()
+        .subject_name(name)
+        .issuer_name(name)
+        .public_key(key.public_key())
+        .serial_number(x509.random_serial_number())
+        .not_valid_before(not_before)
+        .not_valid_after(not_after)
+        .sign(key, hashes.SHA256())
+    )
+
+def sign(key, body: bytes, crc: int = None, webhook_id: str = WEBHOOK_ID):
+    crc = zlib.crc32(body) & 0xFFFFFFFF if crc is None else crc
+    message = f"transmission-1|2026-10-19T00:00:00Z|{webhook_id}|{crc}".encode()
+    return base64.b64encode(key.sign(message, padding.PKCS1v15(), hashes.SHA256())).decode()
+
+def headers(signature: str, cert_url: str = CERT_URL):
+    return {
+        "PAYPAL-AUTH-ALGO": "SHA256withRSA",
+        "PAYPAL-TRANSMISSION-ID": "transmission-1",
+        "PAYPAL-TRANSMISSION-TIME": "2026-10-19T00:00:00Z",
+        "PAYPAL-TRANSMISSION-SIG": signature,
+        "PAYPAL-CERT-URL": cert_url,
+    }
+
+class CertResponse:
+    status_code = 200
+
+    def __init__(self, content: bytes):
+        self.content = content
+
+class CertClient:
+    def __init__(self, pem: bytes):
+        self.pem = pem
+        self.downloads = 0
+
+    async def get(self, url: str):
+        self.downloads += 1
+        return CertResponse(self.pem)
+
+@pytest.fixture
+def key():
+    return rsa.generate_private_key(public_exponent=65537, key_size=2048)
+
+@pytest.fixture
+def serve_certificate(monkeypatch):
+    monkeypatch.setattr(paypal_webhook_verifier, "PAYPAL_WEBHOOK_ID", WEBHOOK_ID)
+    monkeypatch.setattr(paypal_webhook_verifier, "VERIFICATION_MODE", "local")
+    paypal_webhook_verifier._cert_cache.clear()
+
+    def serve(cert: x509.Certificate):
+        client = CertClient(cert.public_bytes(serialization.Encoding.PEM))
+        monkeypatch.setattr(paypal_client, "get_client", lambda: client)
+        return client
+
+    yield serve
+    paypal_webhook_verifier._cert_cache.clear()
+
+def verify(request_headers: dict, body: bytes = BODY):
+    asyncio.run(verify_webhook(request_headers, body, {}))
+
+def valid_certificate(key):
+    now = datetime.now(timezone.utc)
+    return make_certificate(key, now - timedelta(days=1), now + timedelta(days=30))
+
+def test_valid_signature(key, serve_certificate):
+    client = serve_certificate(valid_certificate(key))
+    verify(headers(sign(key, BODY)))
+    verify(headers(sign(key, BODY)))
+    assert client.downloads == 1
+
+def test_tampered_body(key, serve_certificate):
+    serve_certificate(valid_certificate(key))
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(key, BODY)), BODY.replace(b"ORDER-1", b"ORDER-2"))
+
+def test_disallowed_cert_host(key, serve_certificate):
+    client = serve_certificate(valid_certificate(key))
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(key, BODY), "https://paypal.example.com/cert.pem"))
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(key, BODY), "http://api.paypal.com/cert.pem"))
+    assert client.downloads == 0
+
+def test_expired_certificate(key, serve_certificate):
+    now = datetime.now(timezone.utc)
+    serve_certificate(make_certificate(key, now - timedelta(days=60), now - timedelta(days=1)))
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(key, BODY)))
+
+def test_crc_mismatch(key, serve_certificate):
+    serve_certificate(valid_certificate(key))
+    wrong_crc = (zlib.crc32(BODY) + 1) & 0xFFFFFFFF
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(key, BODY, crc=wrong_crc)))
+
+def test_signature_from_another_key(key, serve_certificate):
+    serve_certificate(valid_certificate(key))
+    other = rsa.generate_private_key(public_exponent=65537, key_size=2048)
+    with pytest.raises(WebhookVerificationError):
+        verify(headers(sign(other, BODY)))
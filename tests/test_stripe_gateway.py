@@ -0,0 +1,42 @@
+import asyncio
+import time
+import pytest
+from fastapi import HTTPException
+from benchmarks.fake_upstreams import Profile, stripe_app
+from app.services import stripe_gateway
+
+@pytest.fixture
+def fake_stripe(serve, monkeypatch):
+    # The benchmark's Stripe stand-in; tests set its latency per case
+    profile = Profile()
+    monkeypatch.setattr(stripe_gateway, "STRIPE_API_BASE", serve(stripe_app(profile)))
+    monkeypatch.setattr(stripe_gateway, "STRIPE_API_KEY", "sk_test_fake")
+    monkeypatch.setattr(stripe_gateway, "_client", None)
+    monkeypatch.setattr(stripe_gateway, "_http_client", None)
+    return profile
+
+def test_retrieve_subscription(fake_stripe):
+    async def run():
+        try:
+            return await stripe_gateway.retrieve_subscription("sub_test")
+        finally:
+            await stripe_gateway.close()
+
+    subscription = asyncio.run(run())
+    assert subscription.id == "sub_test"
+    assert subscription.status == "active"
+
+def test_slow_upstream_becomes_gateway_timeout(fake_stripe):
+    fake_stripe.latency_ms = 500
+
+    async def run():
+        try:
+            await stripe_gateway.retrieve_subscription("sub_test", timeout=0.05)
+        finally:
+            await stripe_gateway.close()
+
+    started = time.monotonic()
+    with pytest.raises(HTTPException) as error:
+        asyncio.run(run())
+    assert error.value.status_code == 504
+    assert time.monotonic() - started < 0.5
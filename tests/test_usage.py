@@ -0,0 +1,40 @@
+import asyncio
+from datetime import date, datetime
+from types import SimpleNamespace
+from app.database import SessionLocal, engine
+from app.models.usage_rollup import UsageDaily, UsageHourly
+from app.routers.user import get_usage
+
+USER_ID = 7
+
+def bucket(rollup, bucket_start):
+    return rollup(
+        user_id=USER_ID,
+        bucket_start=bucket_start,
+        operation="tts",
+        voice_id="Wise_Woman",
+        model="speech-02-turbo",
+        requests=2,
+        characters=120,
+        audio_bytes=19200
+    )
+
+async def usage(granularity: str, start: datetime, end: datetime):
+    async with SessionLocal() as db:
+        db.add_all([
+            bucket(UsageDaily, date(2026, 10, 18)),
+            bucket(UsageHourly, datetime(2026, 10, 18, 9))
+        ])
+        await db.commit()
+        response = await get_usage(USER_ID, granularity, start, end, current_user=SimpleNamespace(id=USER_ID), db=db)
+    await engine.dispose()
+    return response
+
+def test_daily_usage_returns_date_buckets(database):
+    response = asyncio.run(usage("day", datetime(2026, 10, 1), datetime(2026, 10, 19)))
+    assert [item.bucket_start for item in response.items] == [date(2026, 10, 18)]
+    assert response.items[0].characters == 120
+
+def test_hourly_usage_includes_the_bucket_containing_start(database):
+    response = asyncio.run(usage("hour", datetime(2026, 10, 18, 9, 30), datetime(2026, 10, 18, 12)))
+    assert [item.bucket_start for item in response.items] == [datetime(2026, 10, 18, 9)]
@@ -0,0 +1,78 @@
+import asyncio
+from sqlalchemy.future import select
+from app.database import SessionLocal, engine
+from app.models.user import User
+from app.models.webhook_event import WebhookEvent
+from app.services import entitlements, webhook_queue
+
+SMALL_PACK_CREDITS = entitlements.PACKS[("character_pack", "small")].character_credits
+
+async def create_user():
+    async with SessionLocal() as db:
+        user = User(email="buyer@example.com", hashed_password="x", auth_provider="local", character_balance=0)
+        db.add(user)
+        await db.flush()
+        user_id = user.id
+        await db.commit()
+        return user_id
+
+async def character_balance(user_id: int):
+    async with SessionLocal() as db:
+        result = await db.execute(select(User.character_balance).where(User.id == user_id))
+        return result.scalar()
+
+async def event_status(event_id: int):
+    async with SessionLocal() as db:
+        result = await db.execute(select(WebhookEvent.status).where(WebhookEvent.id == event_id))
+        return result.scalar()
+
+def test_failure_after_grant_credits_once(database, monkeypatch):
+    async def scenario():
+        user_id = await create_user()
+        attempts = 0
+
+        async def grant_then_fail_once(db, payload):
+            nonlocal attempts
+            attempts += 1
+            await entitlements.grant_pack(db, user_id, "character_pack", "small", "stripe")
+            if attempts == 1:
+                raise RuntimeError("payment history write failed")
+
+        monkeypatch.setitem(webhook_queue._handlers, "test", grant_then_fail_once)
+        async with SessionLocal() as db:
+            event_id = await webhook_queue.record_event(db, "test", "evt_grant", "checkout.completed", {})
+
+        await webhook_queue.process_event(event_id)
+        assert await character_balance(user_id) == 0
+        assert await event_status(event_id) == "pending"
+
+        await webhook_queue.process_event(event_id)
+        assert await character_balance(user_id) == SMALL_PACK_CREDITS
+        assert await event_status(event_id) == "done"
+
+        async with SessionLocal() as db:
+            assert await webhook_queue.record_event(db, "test", "evt_grant", "checkout.completed", {}) is None
+        assert await character_balance(user_id) == SMALL_PACK_CREDITS
+        await engine.dispose()
+
+    asyncio.run(scenario())
+
+def test_redelivered_event_is_skipped(database, monkeypatch):
+    async def scenario():
+        user_id = await create_user()
+
+        async def grant(db, payload):
+            await entitlements.grant_pack(db, user_id, "character_pack", "small", "stripe")
+
+        monkeypatch.setitem(webhook_queue._handlers, "test", grant)
+        async with SessionLocal() as db:
+            first = await webhook_queue.record_event(db, "test", "evt_dup", "checkout.completed", {})
+            # Both deliveries are recorded before either is processed
+            second = await webhook_queue.record_event(db, "test", "evt_dup", "checkout.completed", {})
+
+        await asyncio.gather(webhook_queue.process_event(first), webhook_queue.process_event(second))
+        assert await character_balance(user_id) == SMALL_PACK_CREDITS
+        assert sorted([await event_status(first), await event_status(second)]) == ["done", "duplicate"]
+        await engine.dispose()
+
+    asyncio.run(scenario())